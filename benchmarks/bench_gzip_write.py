@@ -0,0 +1,82 @@
+"""
+Compare gzip compression throughput of the single threaded
+`omnio.lib.GzipFileWrapper` with `omnio.pgzip.ParallelGzipWriter` at
+several worker counts.
+
+The input is the uncompressed flights csv from the test data, repeated to
+the requested size, and the output is discarded.
+
+Usage:
+
+    python benchmarks/bench_gzip_write.py [--size BYTES] [--block-size BYTES]
+"""
+
+import argparse
+import gzip
+import io
+import os
+import sys
+import time
+
+from omnio.lib import GzipFileWrapper
+from omnio.pgzip import ParallelGzipWriter
+
+
+class _Null(io.RawIOBase):
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        return len(data)
+
+    def writable(self):
+        return True
+
+
+def _data(size):
+    with open('tests/data/flights-3m.csv.gz', 'rb') as fd:
+        sample = gzip.decompress(fd.read())
+    return (sample * (size // len(sample) + 1))[:size]
+
+
+def _bench(make_writer, data, write_size=64 * 1024):
+    sink = _Null()
+    start = time.perf_counter()
+    with make_writer(sink) as writer:
+        for i in range(0, len(data), write_size):
+            writer.write(data[i:][:write_size])
+    return time.perf_counter() - start, sink.size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=64 * 1024**2)
+    parser.add_argument('--block-size', type=int, default=128 * 1024)
+    parser.add_argument('--level', type=int, default=9)
+    args = parser.parse_args(argv)
+
+    data = _data(args.size)
+    cases = [('GzipFileWrapper', lambda fd: GzipFileWrapper(fd, 'w', args.level))]
+    for workers in sorted({2, 4, os.cpu_count() or 1}):
+        cases.append(
+            (
+                f'ParallelGzipWriter workers={workers}',
+                lambda fd, workers=workers: ParallelGzipWriter(
+                    fd, args.level, workers, args.block_size
+                ),
+            )
+        )
+
+    print(f'{"writer":<32} {"MB/s":>8} {"ratio":>7}')
+    for name, make_writer in cases:
+        elapsed, compressed = _bench(make_writer, data)
+        print(
+            f'{name:<32} {args.size / elapsed / 1e6:>8.1f} '
+            f'{compressed / args.size:>7.3f}'
+        )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
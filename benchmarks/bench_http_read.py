@@ -0,0 +1,71 @@
+"""
+Measure the per-byte cost of reading an HTTP response body through
+`omnio.http.HTTPReader` with `read()` and `readinto()` at decreasing read
+sizes. With at most one copy per byte the cost should stay roughly flat
+until per-call overhead dominates at very small sizes.
+
+No network is used: the response is a canned sequence of chunks.
+
+Usage:
+
+    python benchmarks/bench_http_read.py [--size BYTES] [--chunk-size BYTES]
+"""
+
+import argparse
+import sys
+import time
+
+from omnio.http import HTTPReader
+
+
+class _Response:
+    def __init__(self, data, chunk_size):
+        self.data = data
+        self.chunk_size = chunk_size
+
+    def iter_content(self, chunk_size=None, decode_unicode=False):
+        view = memoryview(self.data)
+        for i in range(0, len(view), self.chunk_size):
+            yield bytes(view[i:][: self.chunk_size])
+
+    def close(self):
+        pass
+
+
+def _bench_read(data, chunk_size, read_size):
+    reader = HTTPReader(_Response(data, chunk_size), chunk_size)
+    start = time.perf_counter()
+    while reader.read(read_size):
+        pass
+    return time.perf_counter() - start
+
+
+def _bench_readinto(data, chunk_size, read_size):
+    reader = HTTPReader(_Response(data, chunk_size), chunk_size)
+    buf = bytearray(read_size)
+    start = time.perf_counter()
+    while reader.readinto(buf):
+        pass
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=64 * 1024**2)
+    parser.add_argument('--chunk-size', type=int, default=64 * 1024)
+    args = parser.parse_args(argv)
+
+    data = bytes(args.size)
+    print(f'{"read size":>10} {"read ns/B":>10} {"readinto ns/B":>14}')
+    for read_size in [2**n for n in range(20, 8, -2)]:
+        read = _bench_read(data, args.chunk_size, read_size)
+        readinto = _bench_readinto(data, args.chunk_size, read_size)
+        print(
+            f'{read_size:>10} {read * 1e9 / args.size:>10.3f} '
+            f'{readinto * 1e9 / args.size:>14.3f}'
+        )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
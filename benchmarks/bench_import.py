@@ -0,0 +1,49 @@
+"""
+Measure how long `python -c "import omnio"` takes, and with `--budget`
+fail if it is over budget.
+
+The cost of starting the interpreter itself is measured the same way
+and subtracted, so the result is the time spent importing omnio. That
+still varies with the speed of the host, so the budget is generous.
+
+Usage:
+
+    python benchmarks/bench_import.py [--budget SECONDS] [--repeat N]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+
+def _run(code, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--budget', type=float, default=None)
+    parser.add_argument('--repeat', type=int, default=15)
+    args = parser.parse_args(argv)
+
+    baseline = _run('pass', args.repeat)
+    total = _run('import omnio', args.repeat)
+    elapsed = total - baseline
+
+    if args.budget is None:
+        print(f'import omnio: {elapsed * 1000:.1f} ms')
+        return 0
+
+    print(f'import omnio: {elapsed * 1000:.1f} ms (budget {args.budget * 1000:.0f} ms)')
+    return 0 if elapsed <= args.budget else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
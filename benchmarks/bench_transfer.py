@@ -0,0 +1,414 @@
+"""
+Measure end to end throughput and peak memory of `omnio.open` and
+`omnio.glob` against local stand-ins for HTTP and S3, and save the
+results as JSON for comparison across releases.
+
+HTTP objects are served by a threaded `http.server` in a child process,
+with range request support. S3 is a moto server in a child process when
+moto's server dependencies (flask) are installed, or else moto's
+in-process mock, in which case the peak memory of S3 cases includes the
+mock's own copies. The backend is recorded in the results.
+
+The suites are:
+
+    read   http and s3 reads by mode, object size, read size and, for
+           http streams, `iter_content_chunk_size`
+    write  s3 writes by mode, object size and `upload_part_size`
+    glob   s3 and local globs over a large synthetic listing
+
+Each case runs `--repeat` times for the median time, then once more
+under tracemalloc for its peak memory. Content is the flights csv from
+the test data, so compressed modes see realistic ratios.
+
+Usage:
+
+    python benchmarks/bench_transfer.py [--suite read,write,glob]
+        [--sizes 1M,16M] [--repeat N] [--keys N]
+        [--output results.json] [--compare baseline.json]
+"""
+
+import argparse
+import bz2
+import concurrent.futures
+import contextlib
+import datetime
+import gzip
+import http.server
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import boto3
+
+import omnio
+
+
+BUCKET = 'omnio-benchmark'
+
+# read modes, and the compressed variant of the object each one reads
+READ_MODES = {'rb': '', 'rt': '', 'rbz': '.gz', 'rtz': '.gz', 'rbj': '.bz2'}
+WRITE_MODES = ['wb', 'wbz', 'wtz', 'wbj']
+READ_SIZES = [64 * 1024, 1024**2]
+CHUNK_SIZES = [512, 64 * 1024]
+PART_SIZES = [5 * 1024**2, 8 * 1024**2]
+
+# glob patterns over the synthetic listing, with their recursive flag
+GLOB_PATTERNS = [
+    ('glob/*/*.gz', False),
+    ('glob/0[0-4]/*.gz', False),
+    ('glob/**/*.gz', True),
+]
+
+
+def _size(text):
+    """Parse a size such as 65536, 64K or 16M"""
+    units = {'K': 1024, 'M': 1024**2, 'G': 1024**3}
+    if text[-1:].upper() in units:
+        return int(text[:-1]) * units[text[-1].upper()]
+    return int(text)
+
+
+def _payload(size):
+    with open('tests/data/flights-3m.csv.gz', 'rb') as fd:
+        sample = gzip.decompress(fd.read())
+    return (sample * (size // len(sample) + 1))[:size]
+
+
+def _objects(sizes):
+    """Return {name: body} for every size and compression"""
+    objects = {}
+    for size in sizes:
+        data = _payload(size)
+        objects[f'{size}'] = data
+        objects[f'{size}.gz'] = gzip.compress(data, compresslevel=6)
+        objects[f'{size}.bz2'] = bz2.compress(data)
+    return objects
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    objects = {}
+
+    def do_GET(self):
+        body = self.objects.get(self.path.lstrip('/'))
+        if body is None:
+            self.send_error(404)
+            return
+
+        body = memoryview(body)
+        start, stop = 0, len(body)
+        range_ = self.headers.get('Range')
+        if range_ is None:
+            self.send_response(200)
+        else:
+            first, last = range_.partition('=')[2].split('-')
+            start, stop = int(first), min(int(last) + 1, len(body))
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{stop - 1}/{len(body)}')
+
+        self.send_header('Content-Length', str(stop - start))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', '"benchmark"')
+        self.end_headers()
+        self.wfile.write(body[start:stop])
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve_http(objects, conn):
+    _Handler.objects = objects
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    conn.send(server.server_address[1])
+    server.serve_forever()
+
+
+@contextlib.contextmanager
+def _http_server(objects):
+    """Serve the objects over HTTP from a child process, yielding the base URI"""
+    # fork, so that the objects are shared rather than pickled
+    context = multiprocessing.get_context('fork')
+    parent_conn, child_conn = context.Pipe()
+    process = context.Process(
+        target=_serve_http, args=(objects, child_conn), daemon=True
+    )
+    process.start()
+    try:
+        yield f'http://127.0.0.1:{parent_conn.recv()}'
+    finally:
+        process.terminate()
+        process.join()
+
+
+@contextlib.contextmanager
+def _s3_server():
+    """Run a moto S3 stand-in, yielding the name of the backend used"""
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+    try:
+        import moto.server  # noqa: F401 (needs flask)
+    except ImportError:
+        import moto
+
+        with moto.mock_s3():
+            omnio.s3.clear_client_cache()
+            yield 'moto in-process'
+        return
+
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'moto.server', '-H', '127.0.0.1', '-p', str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    os.environ['AWS_ENDPOINT_URL_S3'] = f'http://127.0.0.1:{port}'
+    try:
+        _wait_for_port(port)
+        omnio.s3.clear_client_cache()
+        yield 'moto server'
+    finally:
+        del os.environ['AWS_ENDPOINT_URL_S3']
+        process.terminate()
+        process.wait()
+        omnio.s3.clear_client_cache()
+
+
+def _measure(func, repeat):
+    """Return the median time of `func()` and its peak traced memory"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return statistics.median(timings), peak
+
+
+def _read_cases(sizes, http_base):
+    for scheme in ('http', 's3'):
+        for mode, suffix in READ_MODES.items():
+            for size in sizes:
+                for read_size in READ_SIZES:
+                    # chunk sizes only apply to streamed http responses
+                    chunk_sizes = CHUNK_SIZES if scheme == 'http' else [None]
+                    for chunk_size in chunk_sizes:
+                        config = omnio.default_config()
+                        params = dict(
+                            scheme=scheme, mode=mode, size=size, read_size=read_size
+                        )
+                        if scheme == 'http':
+                            uri = f'{http_base}/{size}{suffix}'
+                            config["http"]["seekable"] = False
+                            config["http"]["iter_content_chunk_size"] = chunk_size
+                            params['chunk_size'] = chunk_size
+                        else:
+                            uri = f's3://{BUCKET}/{size}{suffix}'
+
+                        def func(uri=uri, mode=mode, config=config, n=read_size):
+                            with omnio.open(uri, mode, config=config) as fd:
+                                while fd.read(n):
+                                    pass
+
+                        yield params, func, size, 'B/s'
+
+
+def _write_cases(sizes, write_size=1024**2):
+    for mode in WRITE_MODES:
+        for size in sizes:
+            data = _payload(size)
+            if 't' in mode:
+                data = data.decode('ascii')
+            pieces = [data[i:][:write_size] for i in range(0, size, write_size)]
+
+            for part_size in PART_SIZES:
+                config = omnio.default_config()
+                config["s3"]["upload_part_size"] = part_size
+                params = dict(scheme='s3', mode=mode, size=size, part_size=part_size)
+                uri = f's3://{BUCKET}/written-{mode}-{size}'
+
+                def func(uri=uri, mode=mode, config=config, pieces=pieces):
+                    with omnio.open(uri, mode, config=config) as fd:
+                        for piece in pieces:
+                            fd.write(piece)
+
+                yield params, func, size, 'B/s'
+
+
+def _synthetic_keys(count):
+    return [f'glob/{i % 100:02d}/{i:07d}.gz' for i in range(count)]
+
+
+def _glob_cases(keys, local_dir):
+    for pattern, recursive in GLOB_PATTERNS:
+        uri = f's3://{BUCKET}/{pattern}'
+        matches = len(omnio.glob.glob(uri, recursive=recursive))
+
+        def func(uri=uri, recursive=recursive):
+            for _ in omnio.glob.iglob(uri, recursive=recursive):
+                pass
+
+        params = dict(scheme='s3', pattern=pattern, keys=keys)
+        yield params, func, matches, 'matches/s'
+
+        for workers in (1, 4):
+            path = os.path.join(local_dir, pattern)
+            config = omnio.default_config()
+            config["file"]["glob_workers"] = workers
+            matches = len(omnio.glob.glob(path, recursive=recursive, config=config))
+
+            def func(path=path, recursive=recursive, config=config):
+                for _ in omnio.glob.iglob(path, recursive=recursive, config=config):
+                    pass
+
+            params = dict(scheme='file', pattern=pattern, keys=keys, workers=workers)
+            yield params, func, matches, 'matches/s'
+
+
+def _populate_s3(objects, keys):
+    s3 = boto3.client('s3')
+    s3.create_bucket(Bucket=BUCKET)
+    for name, body in objects.items():
+        s3.put_object(Bucket=BUCKET, Key=name, Body=body)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+        for _ in executor.map(
+            lambda key: s3.put_object(Bucket=BUCKET, Key=key, Body=b''), keys
+        ):
+            pass
+
+
+def _populate_local(directory, keys):
+    for key in keys:
+        path = os.path.join(directory, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'wb').close()
+
+
+def _format_rate(rate, unit):
+    if unit == 'B/s':
+        return f'{rate / 1e6:.1f} MB/s'
+    return f'{rate:.0f} {unit}'
+
+
+def _compare(results, baseline_path):
+    with open(baseline_path, encoding='utf-8') as fd:
+        baseline = {r['name']: r for r in json.load(fd)['results']}
+
+    print(f'\n{"case":<72} {"before":>18} {"after":>18} {"change":>8}')
+    for result in results:
+        before = baseline.get(result['name'])
+        if before is None:
+            continue
+        change = result['rate'] / before['rate'] - 1
+        print(
+            f'{result["name"]:<72} '
+            f'{_format_rate(before["rate"], before["unit"]):>18} '
+            f'{_format_rate(result["rate"], result["unit"]):>18} {change:>+8.1%}'
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--suite', default='read,write,glob')
+    parser.add_argument('--sizes', default='1M,16M')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--keys', type=int, default=10000)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON results to compare against')
+    args = parser.parse_args(argv)
+
+    suites = args.suite.split(',')
+    sizes = [_size(s) for s in args.sizes.split(',')]
+    keys = _synthetic_keys(args.keys) if 'glob' in suites else []
+    objects = _objects(sizes) if 'read' in suites else {}
+
+    results = []
+    with contextlib.ExitStack() as stack:
+        http_base = stack.enter_context(_http_server(objects))
+        backend = stack.enter_context(_s3_server())
+        local_dir = stack.enter_context(tempfile.TemporaryDirectory())
+        _populate_s3(objects, keys)
+        _populate_local(local_dir, keys)
+
+        cases = []
+        if 'read' in suites:
+            cases.append(('read', _read_cases(sizes, http_base)))
+        if 'write' in suites:
+            cases.append(('write', _write_cases(sizes)))
+        if 'glob' in suites:
+            cases.append(('glob', _glob_cases(args.keys, local_dir)))
+
+        print(f'{"case":<72} {"rate":>18} {"peak MiB":>9}')
+        for suite, suite_cases in cases:
+            for params, func, amount, unit in suite_cases:
+                name = ' '.join([suite] + [f'{k}={v}' for k, v in params.items()])
+                seconds, peak = _measure(func, args.repeat)
+                results.append(
+                    {
+                        'suite': suite,
+                        'name': name,
+                        'params': params,
+                        'seconds': seconds,
+                        'rate': amount / seconds,
+                        'unit': unit,
+                        'peak_memory': peak,
+                    }
+                )
+                rate = _format_rate(amount / seconds, unit)
+                print(f'{name:<72} {rate:>18} {peak / 2**20:>9.1f}')
+
+    if args.output:
+        report = {
+            'omnio': omnio.__version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            's3_backend': backend,
+            'repeat': args.repeat,
+            'results': results,
+        }
+        with open(args.output, 'w', encoding='utf-8') as fd:
+            json.dump(report, fd, indent=2)
+
+    if args.compare:
+        _compare(results, args.compare)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -18,9 +18,36 @@ be expanded to support additional schemes in the future.
 # help.
 from omnio.lib import open_ as open
 from omnio.config import default_config
-from . import glob
+from omnio.bulk import open_many, read_many
+from omnio.transfer import copy
+from . import glob, metrics
 
-__all__ = ['open', 'glob', 'default_config']
+__all__ = [
+    'open',
+    'aopen',
+    'open_many',
+    'read_many',
+    'copy',
+    'glob',
+    'metrics',
+    'default_config',
+]
 open.__name__ = 'open'
 
+
+def __getattr__(name):
+    # The scheme modules are imported lazily (see lib._import_scheme),
+    # but remain reachable as attributes, e.g. `omnio.s3.S3Reader`.
+    if name in ('http', 'path', 's3'):
+        import importlib
+
+        return importlib.import_module('.' + name, __name__)
+    if name == 'aopen':
+        # likewise, asyncio is only imported for the async API
+        from .aio import aopen
+
+        return aopen
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 __version__ = '1.3.0'
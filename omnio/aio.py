@@ -0,0 +1,284 @@
+"""
+asyncio interface to `omnio.open` and `omnio.glob`.
+
+The schemes are built on blocking clients (requests and boto3), so the
+blocking calls run on a thread pool shared by all async opens, sized by
+`config["aio"]["workers"]` rather than by the event loop's default
+executor. Opening, compression and text handling are exactly those of
+`omnio.open`.
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import io
+
+from . import cache, glob
+from .config import default_config
+from .lib import open_
+
+
+# the thread pools, keyed by their number of workers. An evicted pool
+# isn't shut down, as files opened with it may still be using it; its
+# idle threads exit once the last of them lets it go.
+_executors = cache.LRUCache(4)
+
+# iteration reads about this many bytes (or characters) of lines per call
+# on the thread pool, rather than making one call per line
+_BATCH_SIZE = 64 * 1024
+
+
+def _executor(config):
+    """Return the shared thread pool for the given omnio config"""
+    workers = config["aio"]["workers"]
+
+    def factory():
+        return concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='omnio-aio'
+        )
+
+    return _executors.get(workers, factory)
+
+
+async def _run(executor, func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+def _read_lines(fd, data, size):
+    """
+    Split `data` followed by reads of `size` bytes from a binary stream
+    into lines. Returns at least one whole line, unless the stream has
+    ended, and the start of the next line.
+    """
+    while True:
+        chunk = fd.read(size)
+        data += chunk
+        lines = data.split(b'\n')
+        tail = lines.pop()
+        if lines or not chunk:
+            lines = [line + b'\n' for line in lines]
+            if not chunk and tail:
+                lines.append(tail)
+                tail = data[:0]
+            return lines, tail
+
+
+class AsyncFile:
+    """
+    Async file-like object wrapping a stream returned by `omnio.open`,
+    whose blocking calls run on a thread pool.
+    """
+
+    def __init__(self, fd, executor):
+        self.fd = fd
+        self.executor = executor
+        self.text = isinstance(fd, io.TextIOBase)
+        # read by iteration but not yet returned, split into lines; in
+        # binary mode, the last may be the start of a line still to come
+        self.lines = collections.deque()
+        self.partial = False
+
+    @property
+    def closed(self):
+        return self.fd.closed
+
+    def _buffered_size(self):
+        return sum(len(line) for line in self.lines)
+
+    def _has_line(self):
+        return len(self.lines) > (1 if self.partial else 0)
+
+    async def _fill(self):
+        """Read the next batch of lines"""
+        if self.text:
+            lines = await _run(self.executor, self.fd.readlines, _BATCH_SIZE)
+            self.lines.extend(lines)
+            return
+
+        data = self.lines.pop() if self.partial else b''
+        lines, tail = await _run(self.executor, _read_lines, self.fd, data, _BATCH_SIZE)
+        self.lines.extend(lines)
+        self.partial = bool(tail)
+        if tail:
+            self.lines.append(tail)
+
+    async def read(self, size=-1):
+        if not self.lines or size == 0:
+            return await _run(self.executor, self.fd.read, size)
+
+        parts = []
+        while self.lines and size != 0:
+            line = self.lines.popleft()
+            if 0 <= size < len(line):
+                self.lines.appendleft(line[size:])
+                line = line[:size]
+            parts.append(line)
+            if size > 0:
+                size -= len(line)
+        self.partial = self.partial and bool(self.lines)
+
+        if size != 0:
+            parts.append(await _run(self.executor, self.fd.read, size))
+        return parts[0][:0].join(parts)
+
+    async def readline(self, size=-1):
+        if not self.lines:
+            return await _run(self.executor, self.fd.readline, size)
+
+        if not self._has_line():
+            await self._fill()
+        line = self.lines.popleft()
+        if 0 <= size < len(line):
+            self.lines.appendleft(line[size:])
+            line = line[:size]
+        return line
+
+    async def readlines(self, hint=-1):
+        if not self.lines:
+            return await _run(self.executor, self.fd.readlines, hint)
+
+        lines = []
+        total = 0
+        async for line in self:
+            lines.append(line)
+            total += len(line)
+            if 0 < hint <= total:
+                break
+        return lines
+
+    async def write(self, data):
+        return await _run(self.executor, self.fd.write, data)
+
+    def _check_tell(self):
+        # as TextIOWrapper does while it is iterated
+        if self.text and self.lines:
+            raise OSError('telling position disabled by iteration')
+
+    async def seek(self, offset, whence=0):
+        if whence == io.SEEK_CUR:
+            self._check_tell()
+            offset -= self._buffered_size()
+        self.lines.clear()
+        self.partial = False
+        return await _run(self.executor, self.fd.seek, offset, whence)
+
+    async def tell(self):
+        self._check_tell()
+        return await _run(self.executor, self.fd.tell) - self._buffered_size()
+
+    async def close(self):
+        self.lines.clear()
+        # closing flushes compressors and completes uploads
+        await _run(self.executor, self.fd.close)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._has_line():
+            await self._fill()
+        if not self.lines:
+            raise StopAsyncIteration
+        return self.lines.popleft()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+class _AsyncOpener:
+    """Result of `aopen()`, which is awaited or used with `async with`"""
+
+    def __init__(self, args, kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        self.file = None
+
+    async def _open(self):
+        config = self.kwargs.get('config')
+        if config is None:
+            config = self.kwargs['config'] = default_config()
+        executor = _executor(config)
+        fd = await _run(executor, open_, *self.args, **self.kwargs)
+        return AsyncFile(fd, executor)
+
+    def __await__(self):
+        return self._open().__await__()
+
+    async def __aenter__(self):
+        self.file = await self._open()
+        return self.file
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.file.close()
+
+
+def aopen(
+    uri,
+    mode='rb',
+    encoding=None,
+    errors=None,
+    newline=None,
+    config=None,
+    compression=None,
+):
+    """
+    Open URI and return an async file-like stream.
+
+    Takes the same arguments as `omnio.open()`. The result may be awaited,
+    or used directly as an async context manager:
+
+    async with omnio.aopen('s3://my-bucket/my-key.gz', 'rtz') as f:
+        async for line in f:
+            print(line)
+
+    The blocking calls of every async file run on one thread pool of
+    `config["aio"]["workers"]` threads, so no more transfers than that
+    make progress at once. Iteration reads lines in batches, so it only
+    takes a call on the pool every 64 KiB or so.
+    """
+    kwargs = dict(
+        mode=mode,
+        encoding=encoding,
+        errors=errors,
+        newline=newline,
+        config=config,
+        compression=compression,
+    )
+    return _AsyncOpener((uri,), kwargs)
+
+
+async def aiglob(uri, *, recursive=False, config=None, batch_size=1000):
+    """
+    Async generator version of `omnio.glob.iglob`. Matches are fetched on
+    the thread pool `batch_size` at a time.
+    """
+    if config is None:
+        config = default_config()
+
+    executor = _executor(config)
+    uris = glob.iglob(uri, recursive=recursive, config=config)
+
+    def next_batch():
+        batch = []
+        for match in uris:
+            batch.append(match)
+            if len(batch) == batch_size:
+                break
+        return batch
+
+    try:
+        while True:
+            batch = await _run(executor, next_batch)
+            for match in batch:
+                yield match
+            if len(batch) < batch_size:
+                break
+    finally:
+        await _run(executor, uris.close)
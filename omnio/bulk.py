@@ -0,0 +1,152 @@
+"""
+Opening and reading many URIs at once, so that the transfers of several
+objects overlap instead of running back to back.
+"""
+
+import collections
+import concurrent.futures
+import copy
+
+from .config import default_config
+from .lib import open_
+
+
+def _batch_config(config, max_workers):
+    """
+    Return a copy of the config whose connection pools fit `max_workers`
+    concurrent transfers. One config is used for a whole batch, so every
+    transfer shares the same boto3 client and requests sessions.
+    """
+    config = copy.deepcopy(default_config() if config is None else config)
+
+    http = config["http"]
+    http["pool_maxsize"] = max(http["pool_maxsize"], max_workers)
+
+    boto_kwargs = config["s3"]["boto_client_config_kwargs"]
+    boto_kwargs["max_pool_connections"] = max(
+        boto_kwargs.get("max_pool_connections", 10), max_workers
+    )
+    return config
+
+
+def _run_batch(func, uris, max_workers, ordered, release=None):
+    """
+    Yield (uri, func(uri)) for every uri, running up to `max_workers`
+    calls at once. `release` is called on the results which are never
+    yielded because the caller stopped early or a call failed.
+    """
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+    uris = iter(uris)
+    pending = collections.OrderedDict()  # future -> uri, in input order
+
+    def fill():
+        while len(pending) < max_workers:
+            uri = next(uris, None)
+            if uri is None:
+                return
+            pending[executor.submit(func, uri)] = uri
+
+    def discard(future):
+        if release is not None and not future.cancelled() and not future.exception():
+            release(future.result())
+
+    try:
+        fill()
+        while pending:
+            if ordered:
+                future = next(iter(pending))
+            else:
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                future = next(f for f in pending if f in done)
+
+            uri = pending.pop(future)
+            result = future.result()
+            fill()
+            yield uri, result
+    finally:
+        for future in pending:
+            future.cancel()
+            future.add_done_callback(discard)
+        executor.shutdown(wait=False)
+
+
+def open_many(
+    uris,
+    mode='rb',
+    encoding=None,
+    errors=None,
+    newline=None,
+    config=None,
+    compression=None,
+    *,
+    max_workers=8,
+    ordered=True,
+):
+    """
+    Open many URIs concurrently and return an iterator of (uri, file)
+    pairs.
+
+    Up to `max_workers` URIs are opened ahead of the consumer, so the
+    requests of later objects are made while earlier ones are read. The
+    files are yielded in the order of `uris` if `ordered` is true, or
+    else as soon as each is open. The caller closes each file it
+    receives, and files opened ahead are closed when the iterator is
+    closed. The other arguments are those of `omnio.open()`.
+
+    for uri, fd in omnio.open_many(omnio.glob.iglob('s3://bucket/*.gz'), 'rbz'):
+        with fd:
+            process(fd)
+    """
+    config = _batch_config(config, max_workers)
+
+    def func(uri):
+        return open_(
+            uri,
+            mode,
+            encoding=encoding,
+            errors=errors,
+            newline=newline,
+            config=config,
+            compression=compression,
+        )
+
+    return _run_batch(func, uris, max_workers, ordered, release=lambda fd: fd.close())
+
+
+def read_many(
+    uris,
+    mode='rb',
+    encoding=None,
+    errors=None,
+    newline=None,
+    config=None,
+    compression=None,
+    *,
+    max_workers=8,
+    ordered=True,
+):
+    """
+    Read many URIs concurrently and return an iterator of (uri, content)
+    pairs.
+
+    Works like `open_many()`, but each object is read whole on a worker
+    thread. At most `max_workers` objects are held in memory ahead of
+    the consumer.
+    """
+    config = _batch_config(config, max_workers)
+
+    def func(uri):
+        with open_(
+            uri,
+            mode,
+            encoding=encoding,
+            errors=errors,
+            newline=newline,
+            config=config,
+            compression=compression,
+        ) as fd:
+            return fd.read()
+
+    return _run_batch(func, uris, max_workers, ordered)
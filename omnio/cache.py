@@ -0,0 +1,152 @@
+"""
+Process-wide caches for expensive, reusable objects such as boto3
+clients.
+"""
+
+import collections
+import os
+import threading
+import time
+import weakref
+
+
+# every live cache, so that they can all be reset in a forked child
+_caches = weakref.WeakSet()
+
+
+def make_key(obj):
+    """
+    Return a hashable cache key for a config value made up of dicts,
+    lists, tuples and scalars.
+    """
+    if isinstance(obj, dict):
+        return tuple(sorted((k, make_key(v)) for k, v in obj.items()))
+    if isinstance(obj, (list, tuple)):
+        return tuple(make_key(v) for v in obj)
+    return obj
+
+
+class LRUCache:
+    """
+    Thread-safe mapping which creates values on demand and evicts the
+    least recently used entry once it holds more than `maxsize` values.
+
+    Values stored with `put()` may be given a time to live, after which
+    they count as missing. Evicted, expired and cleared values are passed
+    to `on_evict` so that they may release their resources. A forked
+    child process starts with an empty cache rather than sharing the
+    parent's connections.
+    """
+
+    def __init__(self, maxsize, on_evict=None):
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self._reset()
+        _caches.add(self)
+
+    def _reset(self):
+        self._lock = threading.RLock()
+        self._data = collections.OrderedDict()
+        self._deadlines = {}  # expiry times of the values put with a ttl
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data and not self._expired(key)
+
+    def _expired(self, key):
+        deadline = self._deadlines.get(key)
+        return deadline is not None and time.monotonic() >= deadline
+
+    def _pop(self, key):
+        self._deadlines.pop(key, None)
+        return self._data.pop(key)
+
+    def _trim(self):
+        """Remove expired values and then the least recently used ones"""
+        evicted = [
+            self._pop(key) for key in list(self._deadlines) if self._expired(key)
+        ]
+        while len(self._data) > self.maxsize:
+            key = next(iter(self._data))
+            evicted.append(self._pop(key))
+        return evicted
+
+    def get(self, key, factory):
+        """
+        Return the value cached under `key`, calling `factory()` to
+        create it if it is missing.
+        """
+        with self._lock:
+            if key in self._data and not self._expired(key):
+                self._data.move_to_end(key)
+                return self._data[key]
+
+            value = factory()
+            # an expired value is replaced
+            evicted = [self._pop(key)] if key in self._data else []
+            self._data[key] = value
+            evicted.extend(self._trim())
+
+        for old in evicted:
+            self._evict(old)
+
+        return value
+
+    def lookup(self, key, default=None):
+        """Return the value cached under `key`, or `default` if it is missing."""
+        with self._lock:
+            if key in self._data and not self._expired(key):
+                self._data.move_to_end(key)
+                return self._data[key]
+        return default
+
+    def put(self, key, value, ttl=None):
+        """
+        Cache `value` under `key`, replacing any value already there. With
+        a `ttl`, the value expires after that many seconds.
+        """
+        with self._lock:
+            evicted = [self._pop(key)] if key in self._data else []
+            self._data[key] = value
+            if ttl is not None:
+                self._deadlines[key] = time.monotonic() + ttl
+            evicted.extend(self._trim())
+
+        for old in evicted:
+            self._evict(old)
+
+    def discard_if(self, predicate):
+        """Remove and release the values whose keys satisfy `predicate(key)`."""
+        with self._lock:
+            evicted = [self._pop(key) for key in list(self._data) if predicate(key)]
+
+        for old in evicted:
+            self._evict(old)
+
+    def clear(self):
+        """Remove every value from the cache, releasing each of them."""
+        with self._lock:
+            values = list(self._data.values())
+            self._data.clear()
+            self._deadlines.clear()
+
+        for value in values:
+            self._evict(value)
+
+    def _evict(self, value):
+        if self.on_evict is not None:
+            self.on_evict(value)
+
+
+def _after_fork_in_child():  # pragma: no cover (runs in the forked child)
+    # The child must not reuse (or close) sockets owned by the parent,
+    # and the locks may have been held by a thread that no longer exists.
+    for cache in list(_caches):
+        cache._reset()
+
+
+if hasattr(os, 'register_at_fork'):  # pragma: no branch
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,83 @@
+"""
+Base class for forward-only readers which produce their data in chunks.
+"""
+
+import io
+
+
+class ChunkedReader(io.RawIOBase):
+    """
+    Forward-only reader over a sequence of chunks of bytes.
+
+    Subclasses implement `_next_chunk()` to return the next bytes-like
+    chunk, or None at the end of the data. Reads are served from views
+    of the chunks, so every byte is copied only once, into the caller's
+    buffer or the returned bytes.
+    """
+
+    def __init__(self):
+        self.current = memoryview(b'')  # unread part of the current chunk
+        self.position = 0
+        self.finished = False
+
+    def _next_chunk(self):  # pragma: no cover
+        raise NotImplementedError
+
+    def _check_closed(self):
+        if self.closed:
+            msg = 'I/O operation on a closed file'
+            raise ValueError(msg)
+
+    def _advance(self):
+        """Make the next chunk current, returning False at the end"""
+        if self.finished:
+            return False
+
+        chunk = self._next_chunk()
+        if chunk is None:
+            self.finished = True
+            return False
+
+        self.current = memoryview(chunk).cast('B')
+        return True
+
+    def _views(self, size):
+        """Consume and return up to `size` bytes (all if negative) as views"""
+        views = []
+        while size != 0:
+            if not self.current and not self._advance():
+                break
+            n = len(self.current) if size < 0 else min(size, len(self.current))
+            views.append(self.current[:n])
+            self.current = self.current[n:]
+            self.position += n
+            size -= n
+        return views
+
+    def read(self, size=-1):
+        self._check_closed()
+
+        if size is None:
+            size = -1
+        return b''.join(self._views(size))
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, b):
+        self._check_closed()
+
+        view = memoryview(b).cast('B')
+        n = 0
+        for part in self._views(len(view)):
+            end = n + len(part)
+            view[n:end] = part
+            n = end
+        return n
+
+    def tell(self):
+        self._check_closed()
+        return self.position
+
+    def readable(self):
+        return True
@@ -1,10 +1,41 @@
 def default_config():
     return {
-        "file": {},
-        "http": {"iter_content_chunk_size": 512},
+        "file": {"glob_workers": 1, "mmap": False, "madvise": None},
+        "http": {
+            "iter_content_chunk_size": 512,
+            "pool_connections": 10,
+            "pool_maxsize": 10,
+            "keep_alive": True,
+            "seekable": True,
+            "block_size": 1024**2,
+            "block_cache_size": 32 * 1024**2,
+            "read_retries": 3,
+            "read_retry_backoff": 0.5,
+        },
         "s3": {
             "upload_part_size": 5 * 1024**2,
+            "upload_concurrency": 4,
+            "max_inflight_parts": 8,
             "boto_client_config_args": [],
             "boto_client_config_kwargs": {},
+            "seekable": False,
+            "block_size": 1024**2,
+            "block_cache_size": 32 * 1024**2,
+            "download_concurrency": 1,
+            "download_range_size": 8 * 1024**2,
+            "download_max_buffer": 64 * 1024**2,
+            "list_cache_ttl": 0,
+            "copy_part_size": 64 * 1024**2,
+            "read_retries": 3,
+            "read_retry_backoff": 0.5,
         },
+        "disk_cache": {"directory": None, "max_size": 1024**3},
+        "aio": {"workers": 64},
+        "copy": {"buffer_size": 8 * 1024**2},
+        "readahead": {"depth": 0, "buffer_size": 1024**2},
+        "gzip": {"compresslevel": 9, "workers": 1, "block_size": 128 * 1024},
+        "bz2": {"compresslevel": 9, "workers": 1},
+        "zstd": {"level": 3, "threads": 0, "long": False, "window_log": 27},
+        "lz4": {"compression_level": 0},
+        "xz": {"preset": 6},
     }
@@ -0,0 +1,168 @@
+"""
+Opt-in local disk cache for the content of remote objects.
+
+Each cached object is a data file holding its content and a small JSON
+file recording the data file's name and the object's ETag and
+Last-Modified validators. Every open asks the origin for the object only
+if it changed since it was cached, so a hit costs one conditional request
+and returns a plain local file. Files are filled under temporary names
+and renamed into place, so several processes may share one directory.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+
+
+_COPY_SIZE = 1024**2
+
+
+def _key(uri):
+    return hashlib.sha256(uri.encode('utf-8')).hexdigest()
+
+
+def _read_meta(meta_path):
+    """Return the metadata of a cached object, or None if there is none"""
+    try:
+        with open(meta_path, encoding='utf-8') as fd:
+            return json.load(fd)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(meta_path, meta):
+    """Replace the metadata of a cached object in one step"""
+    directory, name = os.path.split(meta_path)
+    handle, temp_path = tempfile.mkstemp(dir=directory, prefix=name, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'w', encoding='utf-8') as fd:
+            json.dump(meta, fd)
+        os.replace(temp_path, meta_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+
+
+def _fill(directory, key, src):
+    """Copy a reader's content to a new data file, returning it open and its name"""
+    handle, temp_path = tempfile.mkstemp(
+        dir=directory, prefix=key + '-', suffix='.data.tmp'
+    )
+    try:
+        with os.fdopen(handle, 'wb') as fd:
+            while True:
+                data = src.read(_COPY_SIZE)
+                if not data:
+                    break
+                fd.write(data)
+        data_path, _ = os.path.splitext(temp_path)
+        os.replace(temp_path, data_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+
+    # other processes only evict the newest files when a single one is
+    # larger than the whole cache
+    return open(data_path, 'rb'), os.path.basename(data_path)
+
+
+def _evict(directory, max_size, keep):
+    """Remove the least recently used data files beyond `max_size` bytes"""
+    files = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.name.endswith('.data') or entry.name == keep:
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:  # pragma: no cover (a race with another process)
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.name))
+
+    total = sum(size for _, size, _ in files)
+    with contextlib.suppress(FileNotFoundError):
+        total += os.stat(os.path.join(directory, keep)).st_size
+
+    for _, size, name in sorted(files):
+        if total <= max_size:
+            break
+        meta_path = os.path.join(directory, name.split('-')[0] + '.json')
+        with contextlib.suppress(OSError):
+            os.remove(os.path.join(directory, name))
+        meta = _read_meta(meta_path)
+        if meta is not None and meta['data'] == name:
+            with contextlib.suppress(OSError):
+                os.remove(meta_path)
+        total -= size
+
+
+def open_(uri, open_if_changed, config):
+    """
+    Open a remote object for reading through the disk cache.
+
+    `open_if_changed(uri, config, etag, last_modified)` is the scheme's
+    conditional open. It returns None if the object still matches the
+    given validators, or else a reader for its content along with its
+    current ETag and Last-Modified, either of which may be None.
+    """
+    directory = config["disk_cache"]["directory"]
+    max_size = config["disk_cache"]["max_size"]
+    os.makedirs(directory, exist_ok=True)
+
+    key = _key(uri)
+    meta_path = os.path.join(directory, key + '.json')
+
+    meta = _read_meta(meta_path)
+    cached = None
+    if meta is not None:
+        data_path = os.path.join(directory, meta['data'])
+        try:
+            cached = open(data_path, 'rb')
+        except FileNotFoundError:
+            meta = None  # evicted
+
+    try:
+        if meta is None:
+            result = open_if_changed(uri, config, None, None)
+        else:
+            result = open_if_changed(uri, config, meta['etag'], meta['last_modified'])
+    except BaseException:
+        if cached is not None:
+            cached.close()
+        raise
+
+    if result is None:
+        # mark the data as recently used
+        with contextlib.suppress(FileNotFoundError):
+            os.utime(data_path)
+        return cached
+
+    if cached is not None:
+        cached.close()
+
+    fd, etag, last_modified = result
+    if etag is None and last_modified is None:
+        # a copy couldn't be validated later, so don't keep one
+        return fd
+
+    with fd:
+        cached, data_name = _fill(directory, key, fd)
+
+    old_meta = meta
+    meta = {
+        'uri': uri,
+        'data': data_name,
+        'etag': etag,
+        'last_modified': last_modified,
+    }
+    _write_meta(meta_path, meta)
+    if old_meta is not None:
+        with contextlib.suppress(OSError):
+            os.remove(os.path.join(directory, old_meta['data']))
+
+    _evict(directory, max_size, keep=data_name)
+    return cached
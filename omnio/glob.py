@@ -13,10 +13,10 @@ Example usage:
                 print(line)
 """
 
-import urllib
+import urllib.parse
 
-from . import path, s3
 from .config import default_config
+from .lib import _import_scheme
 
 # make the escape function available so omnio.glob
 # is a true drop in replacement for stdlib glob
@@ -25,11 +25,12 @@ from glob import escape
 assert escape
 
 
-# map uri schemes to the appropriate iglob functions
+# map uri schemes to the modules providing their iglob functions,
+# which are imported on first use
 _scheme_iglobs = {
-    '': path._iglob,
-    'file': path._iglob,
-    's3': s3._iglob,
+    '': 'path',
+    'file': 'path',
+    's3': 's3',
 }
 
 
@@ -61,9 +62,67 @@ def iglob(uri, *, recursive=False, config=None):
     zero or more directories and subdirectories.
     """
     parsed_uri = urllib.parse.urlparse(uri)
-    scheme_glob = _scheme_iglobs[parsed_uri.scheme]
+    scheme_glob = _import_scheme(_scheme_iglobs[parsed_uri.scheme])._iglob
 
     if config is None:
         config = default_config()
 
     yield from scheme_glob(uri, recursive=recursive, config=config)
+
+
+def aiglob(uri, *, recursive=False, config=None):
+    """
+    Return an async iterator which yields the paths matching a pathname
+    pattern, like `iglob()`. The listing runs on the thread pool of
+    `omnio.aopen`.
+    """
+    # asyncio is only imported once it is needed
+    from . import aio
+
+    return aio.aiglob(uri, recursive=recursive, config=config)
+
+
+class GlobEntry:
+    """
+    A path matched by `iglob_info()`, with the metadata found while
+    matching it.
+
+    uri -- the matching path or URI, as `iglob()` would return it
+    size -- size in bytes
+    mtime -- last modification time, in seconds since the epoch
+    etag -- the S3 ETag, including its quotes, or None for local files
+    """
+
+    __slots__ = ('uri', 'size', 'mtime', 'etag')
+
+    def __init__(self, uri, size, mtime, etag=None):
+        self.uri = uri
+        self.size = size
+        self.mtime = mtime
+        self.etag = etag
+
+    def __repr__(self):
+        return (
+            f'GlobEntry(uri={self.uri!r}, size={self.size!r}, '
+            f'mtime={self.mtime!r}, etag={self.etag!r})'
+        )
+
+
+def iglob_info(uri, *, recursive=False, config=None):
+    """
+    Return an iterator which yields a `GlobEntry` for each path matching
+    a pathname pattern, in the same order as `iglob()`.
+
+    For S3, the size, modification time and ETag come from the list
+    responses made for the match, so they cost no requests beyond those
+    of `iglob()`. Local files are stat'ed through the `os.DirEntry` of
+    their directory listing where there is one.
+    """
+    parsed_uri = urllib.parse.urlparse(uri)
+    scheme_glob = _import_scheme(_scheme_iglobs[parsed_uri.scheme])._iglob_info
+
+    if config is None:
+        config = default_config()
+
+    for info in scheme_glob(uri, recursive=recursive, config=config):
+        yield GlobEntry(*info)
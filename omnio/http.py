@@ -1,41 +1,386 @@
+import collections
+import functools
 import io
+import time
+import urllib.parse
+
 import requests
+import requests.adapters
+import urllib3.exceptions
+
+from . import cache, metrics, ranged, retry
+
+
+# requests sessions hold the connection pools, so one is shared
+# process-wide for each host and set of pool settings
+SESSION_CACHE_SIZE = 32
+
+_bytes_read = metrics.counter('http', 'bytes_read')
+_requests = metrics.counter('http', 'requests')
+_retries = metrics.counter('http', 'retries')
+_request_seconds = metrics.histogram('http', 'request_seconds')
+_first_byte_seconds = metrics.histogram('http', 'first_byte_seconds')
 
+# errors of a response body after which the rest may be requested again;
+# iter_content wraps urllib3's errors, while raw reads raise them as is
+_STREAM_ERRORS = (
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.ConnectionError,
+    urllib3.exceptions.IncompleteRead,
+    urllib3.exceptions.ProtocolError,
+    urllib3.exceptions.ReadTimeoutError,
+)
 
-class HTTPReader(io.IOBase):
-    """Reader for HTTP response content"""
 
-    def __init__(self, resp, chunk_size):
+class HTTPReader(io.RawIOBase):
+    """Reader for HTTP response content
+
+    Response chunks are queued as they arrive and copied straight into
+    the caller's buffer, so every byte is copied at most once no matter
+    how small the reads are.
+
+    Given `resume(offset)`, which returns a response with the content
+    from `offset` on, a response failing with a transient error is
+    replaced up to `retries` times, continuing from the last byte
+    received.
+    """
+
+    def __init__(
+        self, resp, chunk_size, opened_at=None, resume=None, retries=0, backoff=0.0
+    ):
+        self.resp = resp
+        self.chunk_size = chunk_size
+        # the time.perf_counter() of the open, until the first byte arrives
+        self.opened_at = opened_at
+        self.resume = resume
+        self.retries = retries
+        self.backoff = backoff
+        self.received = 0  # number of content bytes received so far
         self.content_iter = resp.iter_content(
             chunk_size=chunk_size, decode_unicode=False
         )
-        self.buffer = bytearray()
+        self.chunks = collections.deque()  # received chunks, oldest first
+        self.offset = 0  # number of bytes already consumed from chunks[0]
+        self.available = 0  # number of unconsumed bytes in chunks
+
+    def close(self):
+        if self.closed:
+            return
 
-    def read(self, size=None):
+        super(HTTPReader, self).close()
+        self.chunks.clear()
+
+        # hand the connection back to the session's pool, or discard it
+        # if the body wasn't read to the end
+        self.resp.close()
+
+    def _check_closed(self):
         if self.closed:
             msg = 'I/O operation on a closed file'
             raise ValueError(msg)
 
+    def _fetch(self):
+        """Queue the next chunk of the response, returning False at EOF"""
+        attempt = 0
         while True:
-            if size is not None and len(self.buffer) >= size:
+            try:
+                if self.content_iter is None:
+                    # requesting the rest is retried like reading it
+                    self.resp = self.resume(self.received)
+                    self.content_iter = self.resp.iter_content(
+                        chunk_size=self.chunk_size, decode_unicode=False
+                    )
+                chunk = next(self.content_iter, None)
+            except _STREAM_ERRORS:
+                if self.resume is None or attempt >= self.retries:
+                    raise
+                self._resume(attempt)
+                attempt += 1
+                continue
+
+            if chunk is None:
+                return False
+            if chunk:
                 break
 
-            try:
-                chunk = next(self.content_iter)
-            except StopIteration:
+        self.chunks.append(chunk)
+        self.available += len(chunk)
+        self.received += len(chunk)
+        _bytes_read.add(len(chunk))
+        if self.opened_at is not None:
+            _first_byte_seconds.time_since(self.opened_at)
+            self.opened_at = None
+        return True
+
+    def _resume(self, attempt):
+        """Drop the failed response, for one starting at the last byte"""
+        self.resp.close()
+        self.content_iter = None
+        _retries.add()
+        retry.backoff(attempt, self.backoff)
+
+    def _consume(self, size):
+        """Remove and return up to `size` bytes as a list of views"""
+        views = []
+        while size > 0 and self.chunks:
+            chunk = self.chunks[0]
+            start = self.offset
+            end = min(start + size, len(chunk))
+            views.append(memoryview(chunk)[start:end])
+            self.offset = end
+            self.available -= end - start
+            size -= end - start
+            if end == len(chunk):
+                self.chunks.popleft()
+                self.offset = 0
+        return views
+
+    def _copy_into(self, view):
+        """Copy buffered bytes into `view`, returning the number copied"""
+        n = 0
+        for part in self._consume(len(view)):
+            end = n + len(part)
+            view[n:end] = part
+            n = end
+        return n
+
+    def read(self, size=-1):
+        self._check_closed()
+
+        if size is None or size < 0:
+            while self._fetch():
+                pass
+            size = self.available
+        else:
+            while self.available < size and self._fetch():
+                pass
+
+        # a read lined up with a whole chunk can return it without copying
+        if self.offset == 0 and self.chunks and len(self.chunks[0]) == size:
+            self.available -= size
+            return self.chunks.popleft()
+
+        return b''.join(self._consume(size))
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, b):
+        self._check_closed()
+
+        view = memoryview(b).cast('B')
+        n = 0
+        while n < len(view):
+            if not self.available and not self._fetch():
                 break
-            else:
-                self.buffer.extend(chunk)
+            n += self._copy_into(view[n:])
+        return n
+
+    def readinto1(self, b):
+        self._check_closed()
 
-        data = self.buffer[:size]
-        self.buffer = self.buffer[size:]
+        if not self.available:
+            self._fetch()
+        return self._copy_into(memoryview(b).cast('B'))
 
-        return bytes(data)
+    def peek(self, size=0):
+        self._check_closed()
+
+        if not self.available:
+            self._fetch()
+        if not self.chunks:
+            return b''
+        offset = self.offset
+        return self.chunks[0][offset:]
 
     def readable(self):
         return True
 
 
+class HTTPRangeReader(ranged.RangeReader):
+    """Seekable reader for HTTP resources using range requests
+
+    Reads start out being served from the initial response, so reading
+    from the beginning costs no extra requests. The first read anywhere
+    else closes it, and from then on blocks are fetched with range
+    requests. A failed block is requested again up to `retries` times,
+    and so is the block being read when the initial response fails.
+    """
+
+    def __init__(
+        self,
+        session,
+        resp,
+        size,
+        block_size,
+        cache_size,
+        opened_at=None,
+        retries=0,
+        backoff=0.0,
+    ):
+        super(HTTPRangeReader, self).__init__(size, block_size, cache_size)
+        self.session = session
+        self.uri = resp.url
+        self.resp = resp
+        self.resp_position = 0
+        self.opened_at = opened_at
+        self.retries = retries
+        self.backoff = backoff
+
+        # make sure every block comes from the same version of the resource
+        self.headers = _validators(resp)
+
+    def _close_resp(self):
+        if self.resp is not None:
+            self.resp.close()
+            self.resp = None
+
+    def _read_resp(self, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.resp.raw.read(size - len(data))
+            if not chunk:
+                # the response ended before its Content-Length
+                raise urllib3.exceptions.IncompleteRead(len(data), size - len(data))
+            data.extend(chunk)
+        self.resp_position += len(data)
+        if data and self.opened_at is not None:
+            _first_byte_seconds.time_since(self.opened_at)
+            self.opened_at = None
+        return data
+
+    def _get(self, start, stop):
+        headers = dict(self.headers, Range=f'bytes={start}-{stop - 1}')
+        with self.session.get(self.uri, headers=headers, stream=True) as resp:
+            resp.raise_for_status()
+            if resp.status_code != 206:
+                msg = f'server ignored range request for {self.uri}'
+                raise OSError(msg)
+            data = resp.content
+        if len(data) != stop - start:
+            raise urllib3.exceptions.IncompleteRead(len(data), stop - start - len(data))
+        return data
+
+    def _fetch_range(self, start, stop):
+        retries = self.retries
+        if self.resp is not None and start == self.resp_position:
+            try:
+                data = self._read_resp(stop - start)
+            except _STREAM_ERRORS:
+                if not retries:
+                    raise
+                # request the block instead, as its first retry
+                retries -= 1
+                _retries.add()
+                retry.backoff(0, self.backoff)
+            else:
+                _bytes_read.add(len(data))
+                return data
+
+        self._close_resp()
+        self.opened_at = None
+
+        data = retry.call(
+            functools.partial(self._get, start, stop),
+            _STREAM_ERRORS,
+            retries,
+            self.backoff,
+            _retries,
+        )
+        _bytes_read.add(len(data))
+        return data
+
+    def close(self):
+        if self.closed:
+            return
+
+        super(HTTPRangeReader, self).close()
+        self._close_resp()
+
+
+def _supports_ranges(resp):
+    """Return true if byte ranges of the response body can be requested"""
+    headers = resp.headers
+    return (
+        resp.status_code == 200
+        and headers.get('Accept-Ranges') == 'bytes'
+        and 'Content-Length' in headers
+        # ranges would apply to the encoded bytes, not the content
+        and headers.get('Content-Encoding', 'identity') == 'identity'
+    )
+
+
+def _validators(resp):
+    """
+    Return the headers which make a request fail unless the resource is
+    still the version `resp` came from
+    """
+    if 'ETag' in resp.headers:
+        return {'If-Match': resp.headers['ETag']}
+    if 'Last-Modified' in resp.headers:
+        return {'If-Unmodified-Since': resp.headers['Last-Modified']}
+    return {}
+
+
+def _get_rest(session, uri, validators, start):
+    """Return a response with the content of a resource from `start` on"""
+    headers = dict(validators, Range=f'bytes={start}-')
+    resp = session.get(uri, headers=headers, stream=True)
+    if resp.status_code != 206:
+        resp.close()
+        resp.raise_for_status()
+        msg = f'server ignored range request for {uri}'
+        raise OSError(msg)
+    return resp
+
+
+def _count_response(resp, *args, **kwargs):
+    """requests response hook, timing every request to its response headers"""
+    _requests.add()
+    _request_seconds.observe(resp.elapsed.total_seconds())
+
+
+def _close_session(session):
+    session.close()
+
+
+_sessions = cache.LRUCache(SESSION_CACHE_SIZE, on_evict=_close_session)
+
+
+def _session(uri, config):
+    """Return a shared requests session for the host of the given uri"""
+    parsed_uri = urllib.parse.urlparse(uri)
+    pool_connections = config["http"]["pool_connections"]
+    pool_maxsize = config["http"]["pool_maxsize"]
+    keep_alive = config["http"]["keep_alive"]
+
+    def factory():
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.hooks['response'].append(_count_response)
+        if not keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    key = (
+        parsed_uri.scheme,
+        parsed_uri.netloc,
+        pool_connections,
+        pool_maxsize,
+        keep_alive,
+    )
+    return _sessions.get(key, factory)
+
+
+def clear_session_cache():
+    """Close and forget all of the shared http sessions"""
+    _sessions.clear()
+
+
 def _open(uri, mode, config):
 
     if any(c in mode for c in 'wax+'):  # pragma: no cover
@@ -43,6 +388,72 @@ def _open(uri, mode, config):
         raise NotImplementedError(msg)
 
     if 'r' in mode:
+        opened_at = time.perf_counter()
+        session = _session(uri, config)
+        resp = session.get(uri, stream=True)
+
+        retries = config["http"]["read_retries"]
+        backoff = config["http"]["read_retry_backoff"]
+
+        # blocks can only be requested if they are pinned to this version,
+        # and so can the rest of a stream
+        validators = _validators(resp)
+        ranges = _supports_ranges(resp) and bool(validators)
+
+        if config["http"]["seekable"] and ranges:
+            size = int(resp.headers['Content-Length'])
+            block_size = config["http"]["block_size"]
+            cache_size = config["http"]["block_cache_size"]
+            return HTTPRangeReader(
+                session,
+                resp,
+                size,
+                block_size,
+                cache_size,
+                opened_at=opened_at,
+                retries=retries,
+                backoff=backoff,
+            )
+
+        resume = None
+        if ranges:
+            resume = functools.partial(_get_rest, session, resp.url, validators)
+
         chunk_size = config["http"]["iter_content_chunk_size"]
-        resp = requests.get(uri, stream=True)
-        return HTTPReader(resp, chunk_size)
+        return HTTPReader(
+            resp,
+            chunk_size,
+            opened_at=opened_at,
+            resume=resume,
+            retries=retries,
+            backoff=backoff,
+        )
+
+
+def _open_if_changed(uri, config, etag, last_modified):
+    """
+    Open a resource for the disk cache, returning None if the server
+    reports it unchanged since `etag` or `last_modified`, or else a
+    reader for it along with its ETag and Last-Modified headers.
+    """
+    headers = {}
+    if etag is not None:
+        headers['If-None-Match'] = etag
+    if last_modified is not None:
+        headers['If-Modified-Since'] = last_modified
+
+    session = _session(uri, config)
+    resp = session.get(uri, headers=headers, stream=True)
+
+    if resp.status_code == 304:
+        resp.close()
+        return None
+
+    # an error page must not be cached as the content
+    if not resp.ok:
+        resp.close()
+        resp.raise_for_status()
+
+    chunk_size = config["http"]["iter_content_chunk_size"]
+    reader = HTTPReader(resp, chunk_size)
+    return reader, resp.headers.get('ETag'), resp.headers.get('Last-Modified')
@@ -1,22 +1,78 @@
 import bz2
+import functools
 import gzip
+import importlib
 import io
-import urllib
+import lzma
+import urllib.parse
 
-from . import http, path, s3
+from . import diskcache, pbz2, pgzip, readahead
 from .config import default_config
 
 
+# Map uri schemes to the modules providing their open functions. The
+# modules are imported on first use so that `import omnio` doesn't pay
+# for loading requests and boto3 when only local files are used.
 _scheme_opens = {
-    '': path._open,
-    'file': path._open,
-    'http': http._open,
-    'https': http._open,
-    's3': s3._open,
+    '': 'path',
+    'file': 'path',
+    'http': 'http',
+    'https': 'http',
+    's3': 's3',
 }
 
 
-def open_(uri, mode='rb', encoding=None, errors=None, newline=None, config=None):
+# map the compression mode characters to compression names
+_mode_compressions = {
+    'z': 'gzip',
+    'j': 'bz2',
+}
+
+
+# leading bytes identifying each compression format
+_compression_magics = [
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+    (b'\x04\x22\x4d\x18', 'lz4'),
+    (b'\xfd7zXZ\x00', 'xz'),
+]
+
+# filename extensions of each compression format
+_compression_suffixes = {
+    '.gz': 'gzip',
+    '.gzip': 'gzip',
+    '.bz2': 'bz2',
+    '.zst': 'zstd',
+    '.zstd': 'zstd',
+    '.lz4': 'lz4',
+    '.xz': 'xz',
+}
+
+
+def _import_scheme(name):
+    """Import and return the omnio scheme module with the given name"""
+    return importlib.import_module('.' + name, __package__)
+
+
+def _import_optional(name, package, compression):
+    """Import a module which is only needed for some compressions"""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        msg = f"{compression} compression requires the {package} package"
+        raise ImportError(msg) from None
+
+
+def open_(
+    uri,
+    mode='rb',
+    encoding=None,
+    errors=None,
+    newline=None,
+    config=None,
+    compression=None,
+):
     """
     Open URI and return a file-like stream.
 
@@ -35,8 +91,8 @@ def open_(uri, mode='rb', encoding=None, errors=None, newline=None, config=None)
     'w'       open for writing, truncating the file first
     'b'       binary mode (default)
     't'       text mode
-    'z'       use gzip compression
-    'j'       use bzip2 compression
+    'z'       use gzip compression, same as compression='gzip'
+    'j'       use bzip2 compression, same as compression='bz2'
     ========= =======================================================
 
     These characters can be composed into valid modes. Binary mode is
@@ -60,6 +116,16 @@ def open_(uri, mode='rb', encoding=None, errors=None, newline=None, config=None)
     'wtj'         write unicode, encode to bytes, compress with bzip2
     ========= =======================================================
 
+    compression -- Optional name of the compression to use, as an
+    alternative to the 'z' and 'j' mode characters. Supported values are
+    'gzip', 'bz2', 'zstd', 'lz4' and 'xz'. The 'zstd' and 'lz4'
+    compressions require the `zstandard` and `lz4` packages respectively.
+    Compression settings are taken from the config section of the same
+    name. With 'infer', reads detect the compression from the first bytes
+    of the content, and writes choose it from the extension of the URI,
+    e.g. '.gz' or '.zst'. Content or URIs which don't match any
+    compression are read or written uncompressed.
+
     * Some keyword arguments may be applicable to only certain modes.
     For example, `encoding` only applies to 't' (text) modes.
 
@@ -119,12 +185,20 @@ def open_(uri, mode='rb', encoding=None, errors=None, newline=None, config=None)
         msg = "binary mode doesn't take an newline argument"
         raise ValueError(msg)
 
-    if 'j' in mode and 'z' in mode:
+    mode_compressions = [_mode_compressions[c] for c in mode if c in 'jz']
+    if len(mode_compressions) + (compression is not None) > 1:
         msg = "can't use more than one compression argument"
         raise ValueError(msg)
 
+    if mode_compressions:
+        compression = mode_compressions[0]
+
+    if compression not in (None, 'infer') and compression not in _compressions:
+        msg = 'invalid compression: {}'.format(compression)
+        raise ValueError(msg)
+
     parsed_uri = urllib.parse.urlparse(uri)
-    scheme_open = _scheme_opens[parsed_uri.scheme]
+    scheme = _import_scheme(_scheme_opens[parsed_uri.scheme])
 
     # Text encoding and compression are handled with wrapper
     # classes. We always do the underlying open in binary mode.
@@ -135,13 +209,33 @@ def open_(uri, mode='rb', encoding=None, errors=None, newline=None, config=None)
     if config is None:
         config = default_config()
 
-    fd = scheme_open(uri, rw_mode + 'b', config=config)
-
-    if 'j' in mode:
-        fd = BZ2FileWrapper(fd, rw_mode)
-
-    if 'z' in mode:
-        fd = GzipFileWrapper(fd, rw_mode)
+    # schemes with conditional requests can be read through the disk cache
+    cache_reads = (
+        rw_mode == 'r'
+        and config["disk_cache"]["directory"] is not None
+        and hasattr(scheme, '_open_if_changed')
+    )
+    if cache_reads:
+        fd = diskcache.open_(uri, scheme._open_if_changed, config)
+    else:
+        fd = scheme._open(uri, rw_mode + 'b', config=config)
+
+    if 'r' in rw_mode and config["readahead"]["depth"] > 0:
+        depth = config["readahead"]["depth"]
+        buffer_size = config["readahead"]["buffer_size"]
+        fd = readahead.ReadAheadReader(fd, depth, buffer_size)
+
+    if compression == 'infer' and 'r' in rw_mode:
+        fd, compression = _infer_from_content(fd)
+    elif compression == 'infer':
+        compression = _infer_from_suffix(parsed_uri.path)
+
+    if compression is not None:
+        try:
+            fd = _compressions[compression](fd, rw_mode, config)
+        except Exception:
+            fd.close()
+            raise
 
     if 't' in mode:
         fd = io.TextIOWrapper(fd, encoding=encoding, errors=errors, newline=newline)
@@ -150,9 +244,9 @@ def open_(uri, mode='rb', encoding=None, errors=None, newline=None, config=None)
 
 
 class BZ2FileWrapper(bz2.BZ2File):
-    def __init__(self, fd, mode):
+    def __init__(self, fd, mode, compresslevel=9):
         self._fileobj = fd
-        super(BZ2FileWrapper, self).__init__(fd, mode=mode)
+        super(BZ2FileWrapper, self).__init__(fd, mode=mode, compresslevel=compresslevel)
 
     def close(self):
         super(BZ2FileWrapper, self).close()
@@ -160,10 +254,180 @@ class BZ2FileWrapper(bz2.BZ2File):
 
 
 class GzipFileWrapper(gzip.GzipFile):
-    def __init__(self, fd, mode):
+    def __init__(self, fd, mode, compresslevel=9):
         self._fileobj = fd
-        super(GzipFileWrapper, self).__init__(fileobj=fd, mode=mode)
+        super(GzipFileWrapper, self).__init__(
+            fileobj=fd, mode=mode, compresslevel=compresslevel
+        )
 
     def close(self):
         super(GzipFileWrapper, self).close()
         self._fileobj.close()
+
+
+class PushbackReader(io.RawIOBase):
+    """Reader which returns some already read bytes before the rest of a stream"""
+
+    def __init__(self, fd, head):
+        self.fd = fd
+        self.head = memoryview(head)
+
+    def read(self, size=-1):
+        if self.closed:
+            msg = 'I/O operation on a closed file'
+            raise ValueError(msg)
+
+        if not self.head:
+            return self.fd.read(size)
+
+        if size is None or size < 0:
+            data = bytes(self.head) + self.fd.read()
+            self.head = memoryview(b'')
+            return data
+
+        data = bytes(self.head[:size])
+        self.head = self.head[size:]
+        if len(data) < size:
+            data += self.fd.read(size - len(data))
+        return data
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, b):
+        view = memoryview(b).cast('B')
+        data = self.read(len(view))
+        n = len(data)
+        view[:n] = data
+        return n
+
+    def close(self):
+        if self.closed:
+            return
+
+        super(PushbackReader, self).close()
+        self.fd.close()
+
+    def readable(self):
+        return True
+
+
+def _infer_from_content(fd):
+    """
+    Return the compression of a stream, detected from its first bytes,
+    along with a stream which still includes those bytes.
+    """
+    size = max(len(magic) for magic, _ in _compression_magics)
+    head = b''
+    while len(head) < size:
+        data = fd.read(size - len(head))
+        if not data:
+            break
+        head += data
+
+    compression = None
+    for magic, name in _compression_magics:
+        if head.startswith(magic):
+            compression = name
+            break
+
+    if fd.seekable():
+        fd.seek(0)
+        return fd, compression
+    return PushbackReader(fd, head), compression
+
+
+def _infer_from_suffix(path):
+    """Return the compression implied by the extension of a path"""
+    for suffix, name in _compression_suffixes.items():
+        if path.endswith(suffix):
+            return name
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def _lz4_frame_file_wrapper():
+    # lz4 is optional, so the wrapper class is only defined on first use
+    lz4_frame = _import_optional('lz4.frame', 'lz4', 'lz4')
+
+    class LZ4FrameFileWrapper(lz4_frame.LZ4FrameFile):
+        def __init__(self, fd, mode, compression_level=0):
+            self._fileobj = fd
+            kwargs = {} if 'r' in mode else {'compression_level': compression_level}
+            super(LZ4FrameFileWrapper, self).__init__(fd, mode=mode, **kwargs)
+
+        def close(self):
+            super(LZ4FrameFileWrapper, self).close()
+            self._fileobj.close()
+
+    return LZ4FrameFileWrapper
+
+
+class LZMAFileWrapper(lzma.LZMAFile):
+    def __init__(self, fd, mode, preset=None):
+        self._fileobj = fd
+        super(LZMAFileWrapper, self).__init__(fd, mode=mode, preset=preset)
+
+    def close(self):
+        super(LZMAFileWrapper, self).close()
+        self._fileobj.close()
+
+
+def _open_gzip(fd, mode, config):
+    compresslevel = config["gzip"]["compresslevel"]
+    workers = config["gzip"]["workers"]
+    if 'r' not in mode and workers > 1:
+        block_size = config["gzip"]["block_size"]
+        return pgzip.ParallelGzipWriter(fd, compresslevel, workers, block_size)
+    return GzipFileWrapper(fd, mode, compresslevel)
+
+
+def _open_bz2(fd, mode, config):
+    compresslevel = config["bz2"]["compresslevel"]
+    workers = config["bz2"]["workers"]
+    if 'r' in mode and workers > 1:
+        return pbz2.ParallelBZ2Reader(fd, workers)
+    if workers > 1:
+        return pbz2.ParallelBZ2Writer(fd, compresslevel, workers)
+    return BZ2FileWrapper(fd, mode, compresslevel)
+
+
+def _open_zstd(fd, mode, config):
+    zstandard = _import_optional('zstandard', 'zstandard', 'zstd')
+    long = config["zstd"]["long"]
+    window_log = config["zstd"]["window_log"]
+
+    if 'r' in mode:
+        kwargs = {'max_window_size': 2**window_log} if long else {}
+        dctx = zstandard.ZstdDecompressor(**kwargs)
+        reader = dctx.stream_reader(fd, read_across_frames=True, closefd=True)
+        # the reader has no readline or line iteration of its own
+        return io.BufferedReader(reader)
+
+    kwargs = {'enable_ldm': True, 'window_log': window_log} if long else {}
+    params = zstandard.ZstdCompressionParameters.from_level(
+        config["zstd"]["level"], threads=config["zstd"]["threads"], **kwargs
+    )
+    cctx = zstandard.ZstdCompressor(compression_params=params)
+    return cctx.stream_writer(fd, closefd=True, write_return_read=True)
+
+
+def _open_lz4(fd, mode, config):
+    compression_level = config["lz4"]["compression_level"]
+    return _lz4_frame_file_wrapper()(fd, mode, compression_level)
+
+
+def _open_xz(fd, mode, config):
+    preset = None if 'r' in mode else config["xz"]["preset"]
+    return LZMAFileWrapper(fd, mode, preset)
+
+
+# map compression names to functions wrapping a binary stream
+# in a compressing or decompressing stream
+_compressions = {
+    'gzip': _open_gzip,
+    'bz2': _open_bz2,
+    'zstd': _open_zstd,
+    'lz4': _open_lz4,
+    'xz': _open_xz,
+}
@@ -0,0 +1,187 @@
+"""
+Process-wide transfer metrics, kept per URI scheme.
+
+Counters:
+
+    bytes_read      content bytes received
+    bytes_written   content bytes written
+    requests        requests sent (for S3, API calls)
+    retries         requests retried by the client
+    parts_uploaded  multipart upload parts sent
+
+Histograms, in seconds:
+
+    request_seconds      time from sending a request to its response headers
+    part_upload_seconds  time to upload one multipart part
+    first_byte_seconds   time from opening a stream to its first content byte
+
+Read-ahead buffers (see `omnio.readahead`) are kept under the `readahead`
+scheme:
+
+    buffers_read    buffers handed to consumers
+    buffers_queued  buffers queued at each of those reads, summed
+    stalls          reads which had to wait for data
+    stall_seconds   histogram of the time those reads waited
+
+`snapshot()` returns the current values as plain dicts, for logging or
+exporting, and `prometheus_text()` renders them in the Prometheus text
+exposition format.
+"""
+
+import bisect
+import os
+import threading
+import time
+
+
+# upper bounds of the histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Counter:
+    """Monotonically increasing count"""
+
+    __slots__ = ('_lock', 'value')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def add(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+
+class Histogram:
+    """Distribution of observed durations over the fixed `BUCKETS`"""
+
+    __slots__ = ('_lock', 'counts', 'sum', 'count')
+
+    def __init__(self):
+        self._reset()
+
+    def observe(self, value):
+        index = bisect.bisect_left(BUCKETS, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time_since(self, start):
+        """Observe the time elapsed since `start`, a `time.perf_counter()`"""
+        self.observe(time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+
+        # cumulative counts, as in prometheus, ending with +Inf
+        buckets = []
+        cumulative = 0
+        for bound, n in zip(BUCKETS + (float('inf'),), counts):
+            cumulative += n
+            buckets.append((bound, cumulative))
+        return {'count': count, 'sum': total, 'buckets': buckets}
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+class Registry:
+    """
+    The counters and histograms of every scheme, created on first use.
+    Hot paths look their metrics up once and keep them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}  # (scheme, name) -> Counter or Histogram
+
+    def _get(self, scheme, name, cls):
+        metric = self._metrics.get((scheme, name))
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.setdefault((scheme, name), cls())
+        if not isinstance(metric, cls):
+            raise TypeError(f'{scheme} metric {name} is not a {cls.__name__}')
+        return metric
+
+    def counter(self, scheme, name):
+        return self._get(scheme, name, Counter)
+
+    def histogram(self, scheme, name):
+        return self._get(scheme, name, Histogram)
+
+    def snapshot(self):
+        """
+        Return {scheme: {name: value}}, where the value of a counter is
+        its count and that of a histogram a dict of its `count`, `sum`
+        and cumulative `buckets` as (upper bound, count) pairs.
+        """
+        result = {}
+        for (scheme, name), metric in sorted(self._metrics.items()):
+            if isinstance(metric, Counter):
+                value = metric.value
+            else:
+                value = metric.snapshot()
+            result.setdefault(scheme, {})[name] = value
+        return result
+
+    def prometheus_text(self, prefix='omnio'):
+        """Return the metrics in the Prometheus text exposition format"""
+        by_name = {}
+        for scheme, metrics in self.snapshot().items():
+            for name, value in metrics.items():
+                by_name.setdefault(name, []).append((scheme, value))
+
+        lines = []
+        for name, values in sorted(by_name.items()):
+            if isinstance(values[0][1], dict):
+                lines.append(f'# TYPE {prefix}_{name} histogram')
+                for scheme, value in values:
+                    for bound, count in value['buckets']:
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        labels = f'scheme="{scheme}",le="{le}"'
+                        lines.append(f'{prefix}_{name}_bucket{{{labels}}} {count}')
+                    labels = f'scheme="{scheme}"'
+                    lines.append(f'{prefix}_{name}_sum{{{labels}}} {value["sum"]}')
+                    lines.append(f'{prefix}_{name}_count{{{labels}}} {value["count"]}')
+            else:
+                lines.append(f'# TYPE {prefix}_{name}_total counter')
+                for scheme, value in values:
+                    lines.append(f'{prefix}_{name}_total{{scheme="{scheme}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        """Set every metric back to zero"""
+        with self._lock:
+            for metric in self._metrics.values():
+                metric._reset()
+
+
+registry = Registry()
+
+counter = registry.counter
+histogram = registry.histogram
+snapshot = registry.snapshot
+prometheus_text = registry.prometheus_text
+reset = registry.reset
+
+
+def _after_fork_in_child():  # pragma: no cover (runs in the forked child)
+    # the child counts its own transfers, and the locks may have been held
+    # by a thread that no longer exists
+    registry._lock = threading.Lock()
+    registry.reset()
+
+
+if hasattr(os, 'register_at_fork'):  # pragma: no branch
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -1,12 +1,376 @@
-import glob
-import urllib
+import collections
+import concurrent.futures
+import errno
+import fnmatch
+import io
+import mmap
+import os
+import re
+import shutil
+import urllib.parse
+
+
+_magic_check = re.compile('[*?[]')
+
+
+# madvise hints by name, where the platform has them
+_advice = {
+    name: getattr(mmap, 'MADV_' + name.upper())
+    for name in ('normal', 'sequential', 'random', 'willneed')
+    if hasattr(mmap, 'MADV_' + name.upper())
+}
+
+
+class MappedFile(io.RawIOBase):
+    """
+    Seekable reader over a read-only memory map of a local file.
+
+    `view` is a memoryview of the whole file, for indexing it or handing
+    it to e.g. `numpy.frombuffer` without reading it into the heap. The
+    mapping is only unmapped on close once no exports of `view` remain.
+    `advise()` tells the kernel how the file will be accessed, where the
+    platform supports `madvise`.
+    """
+
+    def __init__(self, path, advice=None):
+        self.name = path
+        with open(path, 'rb') as fd:
+            # an empty file can't be mapped
+            if os.fstat(fd.fileno()).st_size:
+                self.mmap = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.mmap = None
+
+        self.view = memoryview(self.mmap if self.mmap is not None else b'')
+        self.size = len(self.view)
+        self.position = 0
+
+        if advice is not None:
+            self.advise(advice)
+
+    def _check_closed(self):
+        if self.closed:
+            msg = 'I/O operation on a closed file'
+            raise ValueError(msg)
+
+    def advise(self, advice):
+        """Hint 'normal', 'sequential', 'random' or 'willneed' access"""
+        if advice not in ('normal', 'sequential', 'random', 'willneed'):
+            raise ValueError(f'invalid advice: {advice}')
+        self._check_closed()
+        if self.mmap is not None and advice in _advice:
+            self.mmap.madvise(_advice[advice])
+
+    def _consume(self, size):
+        """Return a view of the next `size` bytes (all if negative)"""
+        start = min(self.position, self.size)
+        stop = self.size if size is None or size < 0 else min(start + size, self.size)
+        self.position = max(self.position, stop)
+        return self.view[start:stop]
+
+    def read(self, size=-1):
+        self._check_closed()
+        return bytes(self._consume(size))
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, b):
+        self._check_closed()
+        view = memoryview(b).cast('B')
+        part = self._consume(len(view))
+        n = len(part)
+        view[:n] = part
+        return n
+
+    def readline(self, size=-1):
+        self._check_closed()
+        if self.mmap is None or self.position >= self.size:
+            return b''
+        end = self.mmap.find(b'\n', self.position)
+        length = self.size - self.position if end < 0 else end + 1 - self.position
+        if size is not None and size >= 0:
+            length = min(length, size)
+        return self.read(length)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._check_closed()
+
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f'invalid whence ({whence}, should be 0, 1 or 2)')
+
+        if position < 0:
+            raise ValueError(f'negative seek position {position}')
+
+        self.position = position
+        return position
+
+    def tell(self):
+        self._check_closed()
+        return self.position
+
+    def close(self):
+        if self.closed:
+            return
+
+        super(MappedFile, self).close()
+        try:
+            self.view.release()
+            if self.mmap is not None:
+                self.mmap.close()
+        except BufferError:
+            # views of the mapping are still in use, so it is unmapped
+            # once they are garbage collected instead
+            pass
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
 
 
 def _open(uri, mode, *, config=None):
     parsed_uri = urllib.parse.urlparse(uri)
+    if mode == 'rb' and config["file"]["mmap"]:
+        return MappedFile(parsed_uri.path, config["file"]["madvise"])
     return open(parsed_uri.path, mode)
 
 
+def _copy(src_uri, dst_uri, config):
+    """
+    Copy a local file inside the kernel, which lets filesystems that
+    support it share the data (reflinks) or copy it server-side (NFS).
+    """
+    src = urllib.parse.urlparse(src_uri).path
+    dst = urllib.parse.urlparse(dst_uri).path
+
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        raise shutil.SameFileError(f'{src!r} and {dst!r} are the same file')
+
+    if hasattr(os, 'copy_file_range'):
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            try:
+                while os.copy_file_range(fsrc.fileno(), fdst.fileno(), 1024**3):
+                    pass
+                return
+            except OSError as e:
+                # e.g. across filesystems on older kernels
+                if e.errno not in (
+                    errno.EXDEV,
+                    errno.ENOSYS,
+                    errno.EINVAL,
+                    errno.EOPNOTSUPP,
+                ):
+                    raise
+
+    # shutil copies with sendfile on linux and fcopyfile on macos
+    shutil.copyfile(src, dst)
+
+
+def _has_magic(pattern):
+    return _magic_check.search(pattern) is not None
+
+
+def _is_hidden(name):
+    return name[0] == '.'
+
+
+def _scandir(dirname):
+    """Return (DirEntry, is_dir) pairs for the entries of a directory"""
+    entries = []
+    try:
+        with os.scandir(dirname or os.curdir) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                entries.append((entry, is_dir))
+    except OSError:
+        pass
+    return entries
+
+
+class _GlobWalker:
+    """
+    Local glob built on `os.scandir`, with the results, their order and
+    the handling of hidden files matching the stdlib `glob.iglob`.
+
+    The pattern is expanded one path segment at a time, so only the
+    directories matching each segment are listed. With more than one
+    worker, the listings of the next few directories which the walk is
+    about to enter are started on a thread pool ahead of time, which
+    hides the latency of network filesystems.
+    """
+
+    def __init__(self, workers=1):
+        self.executor = None
+        if workers > 1:
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self.max_prefetched = 2 * workers
+        self.prefetched = {}  # dirname -> future of the listing
+        self.to_prefetch = collections.deque()  # dirnames, in the order of the walk
+        self.queued = set()  # dirnames in to_prefetch which haven't been listed
+
+    def _prefetch(self, dirnames):
+        if self.executor is None:
+            return
+        # the walk enters these before any directory queued earlier
+        self.to_prefetch.extendleft(reversed(dirnames))
+        self.queued.update(dirnames)
+        self._submit_prefetches()
+
+    def _submit_prefetches(self):
+        """Start the next listings, holding at most `max_prefetched` at a time"""
+        while self.to_prefetch and len(self.prefetched) < self.max_prefetched:
+            dirname = self.to_prefetch.popleft()
+            if dirname in self.queued:
+                self.queued.discard(dirname)
+                if dirname not in self.prefetched:
+                    future = self.executor.submit(_scandir, dirname)
+                    self.prefetched[dirname] = future
+
+    def _listdir(self, dirname, dironly):
+        """Return the entries of a directory, or only its subdirectories"""
+        future = self.prefetched.pop(dirname, None)
+        if future is not None:
+            self._submit_prefetches()
+            entries = future.result()
+        else:
+            # listed before its turn came, so it isn't prefetched after all
+            self.queued.discard(dirname)
+            entries = _scandir(dirname)
+        if dironly:
+            entries = [entry for entry in entries if entry[1]]
+        return entries
+
+    def iglob(self, pathname, recursive=False):
+        """
+        Yield (path, entry) pairs for the paths matching a pattern, where
+        entry is the `os.DirEntry` of the path if it was listed, or None.
+        """
+        results = self._iglob(pathname, recursive, dironly=False, prefetch=False)
+        if recursive and pathname[:2] == '**':
+            # the directory itself matches '**' as an empty path, which
+            # isn't a result of its own
+            first = next(results, ('', None))
+            if first[0]:
+                yield first
+        yield from results
+
+    def _iglob(self, pathname, recursive, dironly, prefetch):
+        dirname, basename = os.path.split(pathname)
+        if not _has_magic(pathname):
+            if basename:
+                if os.path.lexists(pathname):
+                    yield pathname, None
+            elif os.path.isdir(dirname):
+                # a pattern ending with a slash only matches directories
+                yield pathname, None
+            return
+
+        recursive_basename = recursive and basename == '**'
+        if recursive_basename:
+            glob_in_dir = self._glob_recursive
+        elif _has_magic(basename):
+            glob_in_dir = self._glob_magic
+        else:
+            glob_in_dir = self._glob_literal
+
+        if not dirname:
+            yield from glob_in_dir(dirname, basename, dironly, prefetch)
+            return
+
+        # os.path.split returns a drive or UNC path as its own dirname
+        if dirname != pathname and _has_magic(dirname):
+            # the directories will be listed, unless the basename is literal
+            dirs = self._iglob(
+                dirname, recursive, dironly=True, prefetch=_has_magic(basename)
+            )
+        else:
+            dirs = [(dirname, None)]
+
+        for dirname, _ in dirs:
+            for name, entry in glob_in_dir(dirname, basename, dironly, prefetch):
+                yield os.path.join(dirname, name), entry
+
+    def _glob_literal(self, dirname, basename, dironly, prefetch):
+        if basename:
+            if os.path.lexists(os.path.join(dirname, basename)):
+                yield basename, None
+        elif os.path.isdir(dirname):
+            yield basename, None
+
+    def _glob_magic(self, dirname, pattern, dironly, prefetch):
+        entries = {entry.name: entry for entry, _ in self._listdir(dirname, dironly)}
+        names = list(entries)
+        if not _is_hidden(pattern):
+            names = [name for name in names if not _is_hidden(name)]
+        names = fnmatch.filter(names, pattern)
+        if prefetch:
+            self._prefetch([os.path.join(dirname, name) for name in names])
+        for name in names:
+            yield name, entries[name]
+
+    def _glob_recursive(self, dirname, pattern, dironly, prefetch):
+        yield pattern[:0], None
+        yield from self._walk(dirname, dironly)
+
+    def _walk(self, dirname, dironly):
+        """Yield the paths below a directory, relative to it, depth first"""
+        entries = [
+            (entry, os.path.join(dirname, entry.name), is_dir)
+            for entry, is_dir in self._listdir(dirname, dironly)
+            if not _is_hidden(entry.name)
+        ]
+        self._prefetch([path for _, path, is_dir in entries if is_dir])
+        for entry, path, is_dir in entries:
+            yield entry.name, entry
+            # unlike the stdlib, files aren't scanned as if they might be
+            # directories
+            if is_dir:
+                for subpath, subentry in self._walk(path, dironly):
+                    yield os.path.join(entry.name, subpath), subentry
+
+    def close(self):
+        for future in self.prefetched.values():
+            future.cancel()
+        self.prefetched.clear()
+        self.to_prefetch.clear()
+        self.queued.clear()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+
 def _iglob(uri, *, recursive=False, config=None):
+    for path, _ in _iglob_entries(uri, recursive, config):
+        yield path
+
+
+def _iglob_info(uri, *, recursive=False, config=None):
+    for path, entry in _iglob_entries(uri, recursive, config):
+        try:
+            # a listed entry can usually stat without resolving the path
+            stat = entry.stat() if entry is not None else os.stat(path)
+        except FileNotFoundError:
+            try:
+                stat = os.lstat(path)  # a broken symlink
+            except FileNotFoundError:
+                continue  # removed since it was listed
+        yield path, stat.st_size, stat.st_mtime, None
+
+
+def _iglob_entries(uri, recursive, config):
     parsed_uri = urllib.parse.urlparse(uri)
-    yield from glob.iglob(parsed_uri.path, recursive=False)
+    walker = _GlobWalker(workers=config["file"]["glob_workers"])
+    try:
+        yield from walker.iglob(parsed_uri.path, recursive=recursive)
+    finally:
+        walker.close()
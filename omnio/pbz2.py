@@ -0,0 +1,261 @@
+"""
+Parallel bzip2 compression and decompression in the style of pbzip2.
+
+Writing compresses each block of input into its own bzip2 stream on a
+thread pool, producing a multi-stream file which bzip2 and the `bz2`
+module read as one. Reading splits the input at stream boundaries and
+decompresses the streams on a thread pool, so files written this way
+(or by pbzip2) decompress in parallel. A file made of one large stream,
+as written by bzip2 itself, is decompressed serially.
+"""
+
+import bz2
+import collections
+import concurrent.futures
+import io
+import re
+
+from . import chunked
+
+
+# the start of a stream: the header followed by either the magic number
+# of the first block or that of the end of an empty stream
+_STREAM_START = re.compile(
+    rb'BZh[1-9](?:\x31\x41\x59\x26\x53\x59|\x17\x72\x45\x38\x50\x90)'
+)
+_STREAM_START_SIZE = 10
+
+
+def _decompress_streams(data):
+    """
+    Decompress a run of bzip2 streams.
+
+    Returns the output, the compressed bytes of an unfinished last
+    stream (normally empty) and whether the streams are followed by
+    trailing data which isn't a stream, or None if the data isn't valid.
+    """
+    output = []
+    while data:
+        decompressor = bz2.BZ2Decompressor()
+        try:
+            output.append(decompressor.decompress(data))
+        except OSError:
+            if not output:
+                return None
+            return b''.join(output), b'', True
+        if not decompressor.eof:
+            return b''.join(output), data, False
+        data = decompressor.unused_data
+    return b''.join(output), b'', False
+
+
+class ParallelBZ2Writer(io.IOBase):
+    """Writer which compresses blocks of data into bzip2 streams on a thread pool"""
+
+    def __init__(self, fd, compresslevel=9, workers=4):
+        self.fd = fd
+        self.compresslevel = compresslevel
+        # match the block size of bzip2, so each stream is a single block
+        self.block_size = compresslevel * 100 * 1000
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self.max_pending = 2 * workers
+        self.pending = collections.deque()  # futures of compressed streams
+        self.buffer = bytearray()
+
+    def _submit(self, data):
+        future = self.executor.submit(bz2.compress, data, self.compresslevel)
+        self.pending.append(future)
+
+    def _drain(self, wait):
+        """Write finished streams in order, waiting for all if `wait`"""
+        while self.pending and (
+            wait or self.pending[0].done() or len(self.pending) > self.max_pending
+        ):
+            self.fd.write(self.pending.popleft().result())
+
+    def write(self, data):
+        if self.closed:
+            msg = 'I/O operation on a closed file'
+            raise ValueError(msg)
+
+        data = memoryview(data).cast('B')
+        self.buffer.extend(data)
+
+        size = self.block_size
+        while len(self.buffer) >= size:
+            block = bytes(self.buffer[:size])
+            del self.buffer[:size]
+            self._submit(block)
+
+        self._drain(wait=False)
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+
+        super(ParallelBZ2Writer, self).close()
+
+        try:
+            # an empty input still makes one (empty) stream
+            if self.buffer or not self.pending:
+                self._submit(bytes(self.buffer))
+                self.buffer = bytearray()
+            self._drain(wait=True)
+        finally:
+            self.executor.shutdown(wait=False)
+            self.fd.close()
+
+    def writable(self):
+        return True
+
+
+class ParallelBZ2Reader(chunked.ChunkedReader):
+    """
+    Reader which decompresses the bzip2 streams of its input on a thread
+    pool, returning the output in order.
+
+    The input is read `read_size` bytes at a time and cut into segments
+    of whole streams. A stream too large to fit in `max_segment_size`
+    bytes, such as a multi-block stream written by bzip2, is decompressed
+    serially as it arrives instead.
+    """
+
+    def __init__(
+        self, fd, workers=4, read_size=1024**2, max_segment_size=2 * 1024**2
+    ):
+        super(ParallelBZ2Reader, self).__init__()
+        self.fd = fd
+        self.read_size = read_size
+        self.max_segment_size = max_segment_size
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self.max_pending = 2 * workers
+        self.pending = collections.deque()  # (segment, future), in order
+        self.segments = self._segments()
+        self.decompressor = None  # for a stream being decompressed serially
+        self.stream_ended = False  # whether any stream has been decompressed
+        self.trailing = False  # whether trailing data after the streams was found
+
+    def _segments(self):
+        """
+        Yield segments of the input, each with a flag which is true if the
+        segment ends at the start of a stream or at the end of the input.
+        """
+        buffer = bytearray()
+        scan = 1  # where to look for the start of the next stream
+        while True:
+            data = self.fd.read(self.read_size)
+            if not data:
+                break
+            buffer.extend(data)
+
+            cut = None
+            for match in _STREAM_START.finditer(buffer, scan):
+                cut = match.start()
+            scan = max(scan, len(buffer) - _STREAM_START_SIZE + 1)
+
+            if cut is not None:
+                yield bytes(buffer[:cut]), True
+            elif len(buffer) >= self.max_segment_size:
+                cut = len(buffer)
+                yield bytes(buffer), False
+            else:
+                continue
+
+            del buffer[:cut]
+            scan = max(1, scan - cut)
+
+        if buffer:
+            yield bytes(buffer), True
+
+    def _feed(self, data):
+        """Decompress data serially, continuing any unfinished stream"""
+        output = []
+        while data:
+            new = self.decompressor is None
+            if new:
+                self.decompressor = bz2.BZ2Decompressor()
+            try:
+                output.append(self.decompressor.decompress(data))
+            except OSError:
+                if not (new and self.stream_ended):
+                    raise
+                self._trail()
+                break
+            if not self.decompressor.eof:
+                break
+            data = self.decompressor.unused_data
+            self.decompressor = None
+            self.stream_ended = True
+        return b''.join(output)
+
+    def _trail(self):
+        """
+        Ignore the rest of the input, as trailing data (such as padding)
+        after a complete stream is by bzip2 and the bz2 module
+        """
+        self.decompressor = None
+        self.trailing = True
+        self._cancel_pending()
+
+    def _settle(self, segment, future):
+        """Return the output of a segment, in input order"""
+        if future is None or self.decompressor is not None:
+            # the segment is part of a large stream, or continues one begun
+            # in an earlier segment after a false stream start was found
+            if future is not None:
+                future.cancel()
+            return self._feed(segment)
+
+        result = future.result()
+        if result is None:
+            if not self.stream_ended:
+                raise OSError('Invalid data stream')
+            self._trail()
+            return b''
+
+        output, unfinished, trailing = result
+        if len(unfinished) < len(segment):  # a stream of the segment is complete
+            self.stream_ended = True
+        if trailing:
+            self._trail()
+        return output + self._feed(unfinished)
+
+    def _next_chunk(self):
+        while not self.trailing:
+            for segment, whole in self.segments:
+                future = None
+                if whole and _STREAM_START.match(segment):
+                    future = self.executor.submit(_decompress_streams, segment)
+                self.pending.append((segment, future))
+                if len(self.pending) > self.max_pending:
+                    break
+
+            if not self.pending:
+                if self.decompressor is not None:
+                    msg = (
+                        'Compressed file ended before the end-of-stream '
+                        'marker was reached'
+                    )
+                    raise EOFError(msg)
+                return None
+
+            output = self._settle(*self.pending.popleft())
+            if output:
+                return output
+        return None
+
+    def _cancel_pending(self):
+        for _, future in self.pending:
+            if future is not None:
+                future.cancel()
+        self.pending.clear()
+
+    def close(self):
+        if self.closed:
+            return
+
+        super(ParallelBZ2Reader, self).close()
+        self._cancel_pending()
+        self.executor.shutdown(wait=False)
+        self.fd.close()
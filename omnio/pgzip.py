@@ -0,0 +1,122 @@
+"""
+Parallel gzip compression in the style of pigz.
+
+The input is cut into blocks which are deflated independently on a
+thread pool (zlib releases the GIL while compressing). Each block is
+primed with the last 32 KiB of the block before it, so compression is
+nearly as good as for a single stream, and all but the last block end
+with a sync flush. The compressed blocks are therefore concatenated into
+one standard deflate stream, and the output is an ordinary single-member
+gzip file.
+"""
+
+import collections
+import concurrent.futures
+import io
+import struct
+import time
+import zlib
+
+
+# deflate can refer back at most this many bytes
+_WINDOW_SIZE = 32 * 1024
+
+
+def _compress_block(data, zdict, compresslevel, last):
+    args = [
+        compresslevel,
+        zlib.DEFLATED,
+        -zlib.MAX_WBITS,  # raw deflate, without a zlib header
+        zlib.DEF_MEM_LEVEL,
+        zlib.Z_DEFAULT_STRATEGY,
+    ]
+    if zdict:
+        args.append(zdict)
+    compressor = zlib.compressobj(*args)
+
+    flush_mode = zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH
+    return compressor.compress(data) + compressor.flush(flush_mode)
+
+
+def _header(compresslevel):
+    if compresslevel == 9:
+        xfl = 2  # maximum compression
+    elif compresslevel == 1:
+        xfl = 4  # fastest compression
+    else:
+        xfl = 0
+
+    # magic, deflate, no flags, mtime, extra flags, unknown OS
+    return struct.pack('<BBBBLBB', 0x1F, 0x8B, 8, 0, int(time.time()), xfl, 255)
+
+
+class ParallelGzipWriter(io.IOBase):
+    """Writer which gzip compresses blocks of data on a thread pool"""
+
+    def __init__(self, fd, compresslevel=9, workers=4, block_size=128 * 1024):
+        self.fd = fd
+        self.compresslevel = compresslevel
+        self.block_size = block_size
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self.max_pending = 2 * workers
+        self.pending = collections.deque()  # futures of compressed blocks
+        self.buffer = bytearray()
+        self.zdict = b''  # tail of the previous block
+        self.crc = 0
+        self.size = 0
+
+        self.fd.write(_header(compresslevel))
+
+    def _submit(self, data, last):
+        # the checksum has to be computed in order, but is much cheaper
+        # than compression
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+
+        future = self.executor.submit(
+            _compress_block, data, self.zdict, self.compresslevel, last
+        )
+        self.pending.append(future)
+        self.zdict = bytes(data[-_WINDOW_SIZE:])
+
+    def _drain(self, wait):
+        """Write finished blocks in order, waiting for all if `wait`"""
+        while self.pending and (
+            wait or self.pending[0].done() or len(self.pending) > self.max_pending
+        ):
+            self.fd.write(self.pending.popleft().result())
+
+    def write(self, data):
+        if self.closed:
+            msg = 'I/O operation on a closed file'
+            raise ValueError(msg)
+
+        data = memoryview(data).cast('B')
+        self.buffer.extend(data)
+
+        size = self.block_size
+        while len(self.buffer) > size:
+            block = bytes(self.buffer[:size])
+            del self.buffer[:size]
+            self._submit(block, last=False)
+
+        self._drain(wait=False)
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+
+        super(ParallelGzipWriter, self).close()
+
+        try:
+            self._submit(bytes(self.buffer), last=True)
+            self.buffer = bytearray()
+            self._drain(wait=True)
+            self.fd.write(struct.pack('<LL', self.crc, self.size & 0xFFFFFFFF))
+        finally:
+            self.executor.shutdown(wait=False)
+            self.fd.close()
+
+    def writable(self):
+        return True
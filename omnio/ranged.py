@@ -0,0 +1,239 @@
+"""
+Seekable readers for remote objects which support byte range requests.
+"""
+
+import collections
+import concurrent.futures
+import io
+
+from . import cache, chunked
+
+
+class RangeReader(io.RawIOBase):
+    """
+    Seekable reader which fetches fixed size blocks of a remote object
+    on demand and keeps the most recently used blocks in memory.
+
+    Subclasses implement `_fetch_range(start, stop)` to return the bytes
+    of the half-open range [start, stop) of the object.
+    """
+
+    def __init__(self, size, block_size, cache_size):
+        self.size = size
+        self.block_size = block_size
+        self.blocks = cache.LRUCache(max(1, cache_size // block_size))
+        self.position = 0
+
+    def _fetch_range(self, start, stop):  # pragma: no cover
+        raise NotImplementedError
+
+    def _check_closed(self):
+        if self.closed:
+            msg = 'I/O operation on a closed file'
+            raise ValueError(msg)
+
+    def _blocks(self, first, last):
+        """Return the blocks numbered first through last, inclusive"""
+        blocks = {}
+        missing = []
+        for index in range(first, last + 1):
+            if index in self.blocks:
+                blocks[index] = self.blocks.get(index, None)
+            else:
+                missing.append(index)
+
+        # fetch each contiguous run of missing blocks with one request,
+        # but never more than the cache can hold at once
+        while missing:
+            run = 1
+            while (
+                run < len(missing)
+                and run < self.blocks.maxsize
+                and missing[run] == missing[0] + run
+            ):
+                run += 1
+
+            start = missing[0] * self.block_size
+            stop = min(start + run * self.block_size, self.size)
+            data = self._fetch_range(start, stop)
+            if len(data) != stop - start:
+                # never cache a short block, which would truncate every read
+                msg = f'expected {stop - start} bytes at {start}, got {len(data)}'
+                raise OSError(msg)
+            view = memoryview(data)
+
+            for i, index in enumerate(missing[:run]):
+                if run == 1:
+                    block = data
+                else:
+                    # copied, as a view would keep the whole run alive as
+                    # long as any of its blocks is cached
+                    offset = i * self.block_size
+                    block = bytes(view[offset:][: self.block_size])
+                blocks[index] = self.blocks.get(index, lambda: block)
+
+            missing = missing[run:]
+
+        return [blocks[index] for index in range(first, last + 1)]
+
+    def _block_at(self, position):
+        """Return the block holding `position` and the offset of it there"""
+        index = position // self.block_size
+        (block,) = self._blocks(index, index)
+        return block, position - index * self.block_size
+
+    def _views(self, size):
+        """Consume and return up to `size` bytes as a list of views"""
+        size = min(size, self.size - self.position)
+        if size <= 0:
+            return []
+
+        start = self.position
+        stop = start + size
+        first = start // self.block_size
+        last = (stop - 1) // self.block_size
+
+        views = []
+        for index, block in zip(range(first, last + 1), self._blocks(first, last)):
+            offset = index * self.block_size
+            begin = max(start - offset, 0)
+            end = stop - offset
+            views.append(memoryview(block)[begin:end])
+
+        self.position = stop
+        return views
+
+    def read(self, size=-1):
+        self._check_closed()
+
+        if size is None or size < 0:
+            size = self.size - self.position
+        return b''.join(self._views(size))
+
+    def readall(self):
+        return self.read()
+
+    def readline(self, size=-1):
+        self._check_closed()
+
+        if size is None or size < 0:
+            size = self.size
+        parts = []
+        while size > 0 and self.position < self.size:
+            # search each block in place, rather than reading byte by byte
+            block, begin = self._block_at(self.position)
+            end = min(len(block), begin + size)
+            newline = block.find(b'\n', begin, end)
+            if newline >= 0:
+                end = newline + 1
+
+            parts.append(block[begin:end])
+            self.position += end - begin
+            size -= end - begin
+            if newline >= 0:
+                break
+        return b''.join(parts)
+
+    def peek(self, size=0):
+        self._check_closed()
+
+        if self.position >= self.size:
+            return b''
+        block, begin = self._block_at(self.position)
+        return block[begin:]
+
+    def readinto(self, b):
+        self._check_closed()
+
+        view = memoryview(b).cast('B')
+        n = 0
+        for part in self._views(len(view)):
+            end = n + len(part)
+            view[n:end] = part
+            n = end
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._check_closed()
+
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f'invalid whence ({whence}, should be 0, 1 or 2)')
+
+        if position < 0:
+            raise ValueError(f'negative seek position {position}')
+
+        self.position = position
+        return position
+
+    def tell(self):
+        self._check_closed()
+        return self.position
+
+    def close(self):
+        if self.closed:
+            return
+
+        super(RangeReader, self).close()
+        self.blocks.clear()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+
+class ParallelRangeReader(chunked.ChunkedReader):
+    """
+    Forward-only reader which downloads consecutive ranges of a remote
+    object on several threads at once and returns them in order.
+
+    At most `max_buffer` bytes of ranges are downloaded ahead of the
+    range being read. Subclasses implement `_fetch_range(start, stop)`
+    to return the bytes of the half-open range [start, stop).
+    """
+
+    def __init__(self, size, range_size, concurrency, max_buffer):
+        super(ParallelRangeReader, self).__init__()
+        self.size = size
+        self.range_size = range_size
+        self.window = max(1, max_buffer // range_size)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+        self.pending = collections.deque()  # futures of upcoming ranges, in order
+        self.next_start = 0  # start of the first range not yet scheduled
+
+    def _fetch_range(self, start, stop):  # pragma: no cover
+        raise NotImplementedError
+
+    def _schedule(self):
+        while len(self.pending) < self.window and self.next_start < self.size:
+            start = self.next_start
+            stop = min(start + self.range_size, self.size)
+            future = self.executor.submit(self._fetch_range, start, stop)
+            self.pending.append(future)
+            self.next_start = stop
+
+    def _next_chunk(self):
+        self._schedule()
+        if not self.pending:
+            return None
+
+        chunk = self.pending.popleft().result()
+        self._schedule()
+        return chunk
+
+    def close(self):
+        if self.closed:
+            return
+
+        super(ParallelRangeReader, self).close()
+        for future in self.pending:
+            future.cancel()
+        self.pending.clear()
+        self.executor.shutdown(wait=False)
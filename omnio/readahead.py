@@ -0,0 +1,112 @@
+"""
+Background read-ahead for streaming readers, so that network transfers
+overlap with the consumer's decompression and parsing.
+"""
+
+import queue
+import threading
+import time
+
+from . import chunked, metrics
+
+
+_buffers_read = metrics.counter('readahead', 'buffers_read')
+_buffers_queued = metrics.counter('readahead', 'buffers_queued')
+_stalls = metrics.counter('readahead', 'stalls')
+_stall_seconds = metrics.histogram('readahead', 'stall_seconds')
+
+
+# marks the end of the underlying stream in the queue
+_EOF = object()
+
+
+class ReadAheadReader(chunked.ChunkedReader):
+    """
+    Forward-only reader which keeps up to `depth` buffers of
+    `buffer_size` bytes read ahead of the consumer on a background thread.
+
+    `stalls` counts the reads which had to wait for the background thread,
+    and `queued` is the number of buffers currently read ahead. A reader
+    which stalls often with a low `queued` count is network bound, while
+    one which rarely stalls with a full queue is consumer bound.
+
+    As the reader is usually hidden under decompression and text
+    wrappers, the same figures for all readers are kept in
+    `omnio.metrics` under the `readahead` scheme: `buffers_read`,
+    `stalls` and `stall_seconds`, and `buffers_queued`, the sum of the
+    number of buffers queued at each read, which divided by
+    `buffers_read` gives the mean queue depth.
+    """
+
+    def __init__(self, fd, depth, buffer_size):
+        super(ReadAheadReader, self).__init__()
+        self.fd = fd
+        self.depth = depth
+        self.buffer_size = buffer_size
+        self.stalls = 0
+        self.queue = queue.Queue(maxsize=depth)
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(
+            target=self._fill, name='omnio-readahead', daemon=True
+        )
+        self.thread.start()
+
+    @property
+    def queued(self):
+        return self.queue.qsize()
+
+    def _put(self, item):
+        """Queue an item, giving up if the reader is closed meanwhile"""
+        while not self.stopping.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+            return True
+        return False
+
+    def _fill(self):
+        try:
+            while True:
+                data = self.fd.read(self.buffer_size)
+                if not data:
+                    break
+                if not self._put(data):
+                    return
+        except Exception as e:
+            # hand the error to the consumer, who raises it on read
+            self._put(e)
+        else:
+            self._put(_EOF)
+
+    def _next_chunk(self):
+        queued = self.queue.qsize()
+        try:
+            item = self.queue.get_nowait()
+        except queue.Empty:
+            self.stalls += 1
+            _stalls.add()
+            waited_from = time.perf_counter()
+            item = self.queue.get()
+            _stall_seconds.time_since(waited_from)
+
+        if item is _EOF:
+            return None
+        if isinstance(item, Exception):
+            self.finished = True
+            raise item
+        _buffers_read.add()
+        _buffers_queued.add(queued)
+        return item
+
+    def close(self):
+        if self.closed:
+            return
+
+        super(ReadAheadReader, self).close()
+
+        # stop the background thread and wait for its current read to end
+        # before closing the stream it is reading from
+        self.stopping.set()
+        self.thread.join()
+        self.fd.close()
@@ -0,0 +1,32 @@
+"""
+Retrying remote reads after transient failures, with exponential backoff.
+"""
+
+import random
+import time
+
+
+def backoff(attempt, base):
+    """
+    Sleep before retry number `attempt`, counting from 0, for between half
+    of and all of `base * 2**attempt` seconds. The jitter keeps readers
+    which failed together from retrying in lockstep.
+    """
+    time.sleep(base * 2**attempt * random.uniform(0.5, 1.0))
+
+
+def call(func, errors, retries, base, counter):
+    """
+    Return `func()`, calling it again up to `retries` times if it raises
+    one of `errors`. Each retry is added to the metrics `counter`.
+    """
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except errors:
+            if attempt >= retries:
+                raise
+        counter.add()
+        backoff(attempt, base)
+        attempt += 1
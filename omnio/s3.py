@@ -1,85 +1,372 @@
+import concurrent.futures
+import contextlib
 import fnmatch
+import functools
 import io
-import urllib
+import threading
+import time
+import urllib.parse
 
 import boto3
 import botocore
 import botocore.exceptions
+import urllib3.exceptions
+
+from . import cache, metrics, ranged, retry
+
+
+# boto3 clients are thread-safe and expensive to build, so they are
+# shared process-wide, keyed by the botocore config they were made with
+CLIENT_CACHE_SIZE = 16
+
+# the most prefix listings kept for globs when `list_cache_ttl` is set
+LIST_CACHE_SIZE = 256
+
+_bytes_read = metrics.counter('s3', 'bytes_read')
+_bytes_written = metrics.counter('s3', 'bytes_written')
+_requests = metrics.counter('s3', 'requests')
+_retries = metrics.counter('s3', 'retries')
+_parts_uploaded = metrics.counter('s3', 'parts_uploaded')
+_request_seconds = metrics.histogram('s3', 'request_seconds')
+_part_upload_seconds = metrics.histogram('s3', 'part_upload_seconds')
+_first_byte_seconds = metrics.histogram('s3', 'first_byte_seconds')
+
+# errors of a response stream after which the rest may be requested again;
+# older botocore releases let urllib3's ProtocolError through unwrapped
+_STREAM_ERRORS = (
+    botocore.exceptions.ReadTimeoutError,
+    botocore.exceptions.IncompleteReadError,
+    getattr(
+        botocore.exceptions,
+        'ResponseStreamingError',
+        urllib3.exceptions.ProtocolError,
+    ),
+)
 
 
 class S3Reader(io.IOBase):
-    """Reader for streaming content from Amazon S3"""
+    """Reader for streaming content from Amazon S3
 
-    def __init__(self, stream):
+    Given `resume(offset)`, which returns a stream of the object's bytes
+    from `offset` on, a read failing with a transient error is retried up
+    to `retries` times from the last byte returned, so the failure is
+    invisible to the decompressors and text wrappers above.
+    """
+
+    def __init__(self, stream, opened_at=None, resume=None, retries=0, backoff=0.0):
         self.stream = stream
+        # the time.perf_counter() of the open, until the first byte arrives
+        self.opened_at = opened_at
+        self.resume = resume
+        self.retries = retries
+        self.backoff = backoff
+        self.offset = 0  # number of bytes returned so far
 
     def read(self, size=None):
         if self.closed:
             msg = 'I/O operation on a closed file'
             raise ValueError(msg)
 
-        try:
-            return self.stream.read(size)
-        except botocore.exceptions.ReadTimeoutError as e:
-            raise TimeoutError(e)
+        attempt = 0
+        while True:
+            try:
+                if self.stream is None:
+                    # requesting the rest is retried like reading it
+                    self.stream = self.resume(self.offset)
+                data = self.stream.read(size)
+                break
+            except _STREAM_ERRORS as e:
+                if self.resume is None or attempt >= self.retries:
+                    if isinstance(e, botocore.exceptions.ReadTimeoutError):
+                        raise TimeoutError(e)
+                    raise
+            self._resume(attempt)
+            attempt += 1
+
+        self.offset += len(data)
+        if data:
+            _bytes_read.add(len(data))
+            if self.opened_at is not None:
+                _first_byte_seconds.time_since(self.opened_at)
+                self.opened_at = None
+        return data
+
+    def _resume(self, attempt):
+        """Drop the failed stream, for one starting at the current offset"""
+        if self.stream is not None:
+            with contextlib.suppress(Exception):
+                self.stream.close()
+            self.stream = None
+        _retries.add()
+        retry.backoff(attempt, self.backoff)
 
     def readable(self):  # pragma: no cover
         return True
 
 
-class S3Writer(io.IOBase):
-    """Writer for streaming content to Amazon S3"""
+def _get_rest(s3, bucket, key, etag, size, start):
+    """Return a stream of the bytes of an s3 object from `start` on"""
+    if start >= size:
+        # a range starting past the end is unsatisfiable
+        return io.BytesIO()
+
+    # If-Match makes sure the rest comes from the same version of the
+    # object as the start
+    with _translate_errors():
+        resp = s3.get_object(
+            Bucket=bucket, Key=key, Range=f'bytes={start}-', IfMatch=etag
+        )
+    return resp['Body']
+
+
+def _get_first_range(s3, bucket, key, range_size):
+    """Return the get_object response for the first `range_size` bytes"""
+    try:
+        return s3.get_object(Bucket=bucket, Key=key, Range=f'bytes=0-{range_size - 1}')
+    except botocore.exceptions.ClientError as client_error:
+        # no range of an empty object is satisfiable
+        if client_error.response['Error']['Code'] != 'InvalidRange':
+            raise
+    return s3.get_object(Bucket=bucket, Key=key)
+
 
-    def __init__(self, s3, bucket, key, upload_part_size):
+def _object_size(resp):
+    """Return the size of the whole object from a get_object response"""
+    if 'ContentRange' in resp:
+        return int(resp['ContentRange'].rpartition('/')[2])
+    return resp['ContentLength']
+
+
+def _get_range(s3, bucket, key, etag, start, stop, retries=0, backoff=0.0):
+    """Return the bytes [start, stop) of an s3 object"""
+
+    def get():
+        # If-Match makes sure every range comes from the same version of
+        # the object, even if it is overwritten while being read
+        resp = s3.get_object(
+            Bucket=bucket,
+            Key=key,
+            Range=f'bytes={start}-{stop - 1}',
+            IfMatch=etag,
+        )
+        return resp['Body'].read()
+
+    try:
+        data = retry.call(get, _STREAM_ERRORS, retries, backoff, _retries)
+    except botocore.exceptions.ReadTimeoutError as e:
+        raise TimeoutError(e)
+
+    _bytes_read.add(len(data))
+    return data
+
+
+class S3RangeReader(ranged.RangeReader):
+    """Seekable reader for Amazon S3 objects using ranged GET requests"""
+
+    def __init__(
+        self,
+        s3,
+        bucket,
+        key,
+        size,
+        etag,
+        block_size,
+        cache_size,
+        retries=0,
+        backoff=0.0,
+    ):
+        super(S3RangeReader, self).__init__(size, block_size, cache_size)
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.etag = etag
+        self.retries = retries
+        self.backoff = backoff
+
+    def _fetch_range(self, start, stop):
+        return _get_range(
+            self.s3,
+            self.bucket,
+            self.key,
+            self.etag,
+            start,
+            stop,
+            self.retries,
+            self.backoff,
+        )
+
+
+class S3ParallelReader(ranged.ParallelRangeReader):
+    """Reader for Amazon S3 objects which downloads several ranges at once
+
+    `first` is an optional stream of the first range, already requested.
+    """
+
+    def __init__(
+        self,
+        s3,
+        bucket,
+        key,
+        size,
+        etag,
+        range_size,
+        concurrency,
+        max_buffer,
+        retries=0,
+        backoff=0.0,
+        first=None,
+    ):
+        super(S3ParallelReader, self).__init__(
+            size, range_size, concurrency, max_buffer
+        )
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.etag = etag
+        self.retries = retries
+        self.backoff = backoff
+        self.first = first
+
+    def _read_first(self, stop):
+        """Return the first range from `first`, or None if that fails"""
+        first, self.first = self.first, None
+        try:
+            data = first.read()
+        except _STREAM_ERRORS:
+            return None
+        finally:
+            first.close()
+        return data if len(data) == stop else None
+
+    def _fetch_range(self, start, stop):
+        if start == 0 and self.first is not None:
+            data = self._read_first(stop)
+            if data is not None:
+                _bytes_read.add(len(data))
+                return data
+            # request the range again
+            _retries.add()
+
+        return _get_range(
+            self.s3,
+            self.bucket,
+            self.key,
+            self.etag,
+            start,
+            stop,
+            self.retries,
+            self.backoff,
+        )
+
+    def close(self):
+        if self.closed:
+            return
+
+        super(S3ParallelReader, self).close()
+        first = self.first
+        if first is not None:
+            first.close()
+
+
+class S3Writer(io.IOBase):
+    """Writer for streaming content to Amazon S3
+
+    Once more than `upload_part_size` bytes have been written, the content
+    is sent as a multipart upload. Parts are uploaded by a pool of
+    `upload_concurrency` threads while the caller keeps writing, and
+    `write()` blocks while `max_inflight_parts` parts are waiting to be
+    sent, which bounds memory use.
+    """
+
+    def __init__(
+        self,
+        s3,
+        bucket,
+        key,
+        upload_part_size,
+        upload_concurrency=1,
+        max_inflight_parts=2,
+    ):
         self.s3 = s3
         self.bucket = bucket
         self.key = key
         self.upload_part_size = upload_part_size
         self.buffer = bytearray()
         self.multipart = None
-        self.parts = []
+        self.parts = []  # futures of the uploaded parts, in part number order
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=upload_concurrency
+        )
+        self.inflight = threading.BoundedSemaphore(max_inflight_parts)
+        self.error = None
 
-    def _upload_part(self):  # pragma: no cover
-        if not self.buffer:
-            return
+    def _send_part(self, part_number, data):
+        start = time.perf_counter()
+        part = self.s3.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            PartNumber=part_number,
+            UploadId=self.multipart['UploadId'],
+            Body=data,
+        )
+        _part_upload_seconds.time_since(start)
+        _parts_uploaded.add()
+        return {'PartNumber': part_number, 'ETag': part['ETag']}
+
+    def _part_done(self, future):
+        self.inflight.release()
+        if self.error is None and not future.cancelled():
+            self.error = future.exception()
 
+    def _upload_part(self):
         size = self.upload_part_size
         data = self.buffer[:size]
+        del self.buffer[:size]
 
-        part = self.s3.upload_part(
+        self.inflight.acquire()
+        future = self.executor.submit(self._send_part, len(self.parts) + 1, data)
+        future.add_done_callback(self._part_done)
+        self.parts.append(future)
+
+    def _abort(self):
+        """Abort the multipart upload and raise the error of a failed part"""
+        for future in self.parts:
+            future.cancel()
+        self.executor.shutdown(wait=True)
+
+        self.s3.abort_multipart_upload(
             Bucket=self.bucket,
             Key=self.key,
-            PartNumber=len(self.parts) + 1,
             UploadId=self.multipart['UploadId'],
-            Body=data,
         )
-        self.parts.append(part)
-
-        self.buffer = self.buffer[size:]
+        raise self.error
 
-    def close(self):  # pragma: no cover
+    def close(self):
         if self.closed:
             return
 
         super(S3Writer, self).close()
 
         if not self.multipart:
+            self.executor.shutdown(wait=False)
             self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=self.buffer)
+            invalidate_list_cache(f"s3://{self.bucket}/{self.key}")
             return
 
         self._upload_part()
-        part_info = {
-            'Parts': [
-                {'PartNumber': i + 1, 'ETag': part['ETag']}
-                for i, part in enumerate(self.parts)
-            ]
-        }
+        concurrent.futures.wait(self.parts)
+        if self.error is not None:
+            self._abort()
+        self.executor.shutdown(wait=True)
+
+        part_info = {'Parts': [future.result() for future in self.parts]}
         self.s3.complete_multipart_upload(
             Bucket=self.bucket,
             Key=self.key,
             UploadId=self.multipart['UploadId'],
             MultipartUpload=part_info,
         )
+        invalidate_list_cache(f"s3://{self.bucket}/{self.key}")
 
     def write(self, data):
         if self.closed:
@@ -88,15 +375,22 @@ class S3Writer(io.IOBase):
 
         # ensure that data is bytes-like
         try:
-            memoryview(data)
+            nbytes = memoryview(data).nbytes
         except TypeError:
             raise TypeError(
                 f"a bytes-like object is required, not '{type(data).__name__}'"
             ) from None
 
         self.buffer.extend(data)
+        _bytes_written.add(nbytes)
 
-        if len(self.buffer) > self.upload_part_size:  # pragma: no cover
+        # a failed part dooms the whole upload, so stop as soon as possible
+        if self.error is not None:
+            super(S3Writer, self).close()
+            self._abort()
+
+        # always keep some data back, so the last part is never empty
+        while len(self.buffer) > self.upload_part_size:
             if self.multipart is None:
                 self.multipart = self.s3.create_multipart_upload(
                     Bucket=self.bucket, Key=self.key
@@ -108,62 +402,401 @@ class S3Writer(io.IOBase):
         return True
 
 
+def _close_client(client):
+    # BaseClient.close() only exists in newer botocore releases
+    close = getattr(client, 'close', None)
+    if close is not None:
+        close()
+
+
+_clients = cache.LRUCache(CLIENT_CACHE_SIZE, on_evict=_close_client)
+
+
+# boto3 events timing every API call, including those which fail
+def _before_call(context, **kwargs):
+    context['omnio_start'] = time.perf_counter()
+
+
+def _after_call(context, parsed=None, **kwargs):
+    start = context.get('omnio_start')
+    if start is not None:
+        _request_seconds.time_since(start)
+    _requests.add()
+    if parsed:
+        _retries.add(parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0))
+
+
+def _client_key(config):
+    args = config["s3"]["boto_client_config_args"]
+    kwargs = config["s3"]["boto_client_config_kwargs"]
+    return cache.make_key([args, kwargs])
+
+
+def _client(config):
+    """Return a shared boto3 s3 client for the given omnio config"""
+    args = config["s3"]["boto_client_config_args"]
+    kwargs = config["s3"]["boto_client_config_kwargs"]
+
+    def factory():
+        boto_config = botocore.client.Config(*args, **kwargs)
+        client = boto3.client('s3', config=boto_config)
+        client.meta.events.register('before-call.s3', _before_call)
+        client.meta.events.register('after-call.s3', _after_call)
+        client.meta.events.register('after-call-error.s3', _after_call)
+        return client
+
+    return _clients.get(_client_key(config), factory)
+
+
+def clear_client_cache():
+    """Close and forget all of the shared s3 clients"""
+    _clients.clear()
+
+
+# listings by (bucket, prefix, delimiter, client key), each a list of pages
+_listings = cache.LRUCache(LIST_CACHE_SIZE)
+
+# counts the invalidations of the listing cache, so that a listing which
+# overlapped a write isn't cached
+_list_cache_generation = 0
+_list_cache_lock = threading.Lock()
+
+
+def _list_pages(s3, bucket_name, prefix, delimiter, config):
+    """
+    Return the list_objects_v2 pages for a prefix, which are cached for
+    `list_cache_ttl` seconds if that is set.
+    """
+    kwargs = {'Bucket': bucket_name, 'Prefix': prefix}
+    if delimiter is not None:
+        kwargs['Delimiter'] = delimiter
+    pages = s3.get_paginator('list_objects_v2').paginate(**kwargs)
+
+    ttl = config["s3"]["list_cache_ttl"]
+    if not ttl:
+        return pages
+
+    key = (bucket_name, prefix, delimiter, _client_key(config))
+    cached = _listings.lookup(key)
+    if cached is not None:
+        return cached
+
+    generation = _list_cache_generation
+    pages = [
+        {
+            'CommonPrefixes': page.get('CommonPrefixes', []),
+            'Contents': page.get('Contents', []),
+        }
+        for page in pages
+    ]
+    with _list_cache_lock:
+        if generation == _list_cache_generation:
+            _listings.put(key, pages, ttl)
+    return pages
+
+
+def invalidate_list_cache(uri=None):
+    """
+    Forget the cached listings of the prefixes overlapping an s3 URI, such
+    as a key which was just written, or every cached listing.
+    """
+    global _list_cache_generation
+
+    if uri is None:
+        predicate = None
+    else:
+        parsed_uri = urllib.parse.urlparse(uri)
+        bucket_name = parsed_uri.netloc
+        path = parsed_uri.path.lstrip('/')
+
+        def predicate(key):
+            return key[0] == bucket_name and (
+                path.startswith(key[1]) or key[1].startswith(path)
+            )
+
+    with _list_cache_lock:
+        _list_cache_generation += 1
+        if predicate is None:
+            _listings.clear()
+        else:
+            _listings.discard_if(predicate)
+
+
+@contextlib.contextmanager
+def _translate_errors():
+    """Raise boto errors as the builtin exceptions callers of open expect"""
+    try:
+        yield
+    except botocore.exceptions.ClientError as client_error:
+        # get_object reports NoSuchKey, while head_object only has a status
+        if client_error.response['Error']['Code'] in ('NoSuchKey', '404'):
+            raise FileNotFoundError(client_error)
+        raise
+    except botocore.exceptions.EndpointConnectionError as e:
+        raise ConnectionError(e)
+
+
 def _open(uri, mode, *, config=None):  # pragma: no cover
     parsed_uri = urllib.parse.urlparse(uri)
     bucket = parsed_uri.netloc
     key = parsed_uri.path.lstrip('/')
 
-    args = config["s3"]["boto_client_config_args"]
-    kwargs = config["s3"]["boto_client_config_kwargs"]
-    boto_config = botocore.client.Config(*args, **kwargs)
-    s3 = boto3.client('s3', config=boto_config)
+    opened_at = time.perf_counter()
+    s3 = _client(config)
 
     if any(c in mode for c in 'ax+'):
         msg = "s3 scheme doesn't support '{}' mode".format(mode)
         raise ValueError(msg)
 
+    seekable = config["s3"]["seekable"]
+    parallel = config["s3"]["download_concurrency"] > 1
+    retries = config["s3"]["read_retries"]
+    backoff = config["s3"]["read_retry_backoff"]
+
+    if 'r' in mode and seekable:
+        with _translate_errors():
+            head = s3.head_object(Bucket=bucket, Key=key)
+        size = head['ContentLength']
+        etag = head['ETag']
+        block_size = config["s3"]["block_size"]
+        cache_size = config["s3"]["block_cache_size"]
+        return S3RangeReader(
+            s3,
+            bucket,
+            key,
+            size,
+            etag,
+            block_size,
+            cache_size,
+            retries=retries,
+            backoff=backoff,
+        )
+
+    resp = None
+    if 'r' in mode and parallel:
+        # the first range tells the size, so small objects are read with
+        # this one request, and large ones in parallel ranges after it
+        range_size = config["s3"]["download_range_size"]
+        with _translate_errors():
+            resp = _get_first_range(s3, bucket, key, range_size)
+        size = _object_size(resp)
+
+        if size > range_size:
+            return S3ParallelReader(
+                s3,
+                bucket,
+                key,
+                size,
+                resp['ETag'],
+                range_size,
+                config["s3"]["download_concurrency"],
+                config["s3"]["download_max_buffer"],
+                retries=retries,
+                backoff=backoff,
+                first=resp['Body'],
+            )
+
     if 'r' in mode:
-        try:
-            resp = s3.get_object(Bucket=bucket, Key=key)
-        except botocore.errorfactory.ClientError as client_error:
-            if client_error.response['Error']['Code'] == 'NoSuchKey':
-                raise FileNotFoundError(client_error)
-            raise
-        except botocore.exceptions.EndpointConnectionError as e:
-            raise ConnectionError(e)
+        if resp is None:
+            with _translate_errors():
+                resp = s3.get_object(Bucket=bucket, Key=key)
 
         stream = resp['Body']
-        return S3Reader(stream)
+        resume = functools.partial(
+            _get_rest, s3, bucket, key, resp['ETag'], _object_size(resp)
+        )
+        return S3Reader(
+            stream,
+            opened_at=opened_at,
+            resume=resume,
+            retries=retries,
+            backoff=backoff,
+        )
 
     if 'w' in mode:
-        upload_part_size = config["s3"]["upload_part_size"]
-        return S3Writer(s3, bucket, key, upload_part_size)
+        return S3Writer(
+            s3,
+            bucket,
+            key,
+            config["s3"]["upload_part_size"],
+            upload_concurrency=config["s3"]["upload_concurrency"],
+            max_inflight_parts=config["s3"]["max_inflight_parts"],
+        )
 
 
-def _iglob(uri, *, recursive=False, config=None):
+def _open_if_changed(uri, config, etag, last_modified):
+    """
+    Open an object for the disk cache, returning None if its ETag is still
+    `etag`, or else a reader for it along with its ETag.
+    """
     parsed_uri = urllib.parse.urlparse(uri)
-    bucket_name = parsed_uri.netloc
-    pattern = parsed_uri.path.lstrip('/')
+    bucket = parsed_uri.netloc
+    key = parsed_uri.path.lstrip('/')
+
+    s3 = _client(config)
+
+    kwargs = {}
+    if etag is not None:
+        kwargs['IfNoneMatch'] = etag
+
+    try:
+        with _translate_errors():
+            resp = s3.get_object(Bucket=bucket, Key=key, **kwargs)
+    except botocore.exceptions.ClientError as client_error:
+        if client_error.response['Error']['Code'] == '304':
+            return None
+        raise
+
+    return S3Reader(resp['Body']), resp['ETag'], None
+
+
+def _copy(src_uri, dst_uri, config):
+    """
+    Copy an object within S3 without downloading it. Objects larger than
+    `copy_part_size` are copied as a multipart upload of ranges copied
+    concurrently.
+    """
+    src = urllib.parse.urlparse(src_uri)
+    dst = urllib.parse.urlparse(dst_uri)
+    src_bucket, src_key = src.netloc, src.path.lstrip('/')
+    dst_bucket, dst_key = dst.netloc, dst.path.lstrip('/')
+
+    s3 = _client(config)
+
+    with _translate_errors():
+        head = s3.head_object(Bucket=src_bucket, Key=src_key)
+    size = head['ContentLength']
+
+    # every request copies exactly the version which was measured
+    source = {'Bucket': src_bucket, 'Key': src_key}
+    etag = head['ETag']
+    part_size = config["s3"]["copy_part_size"]
+
+    if size <= part_size:
+        with _translate_errors():
+            s3.copy_object(
+                Bucket=dst_bucket,
+                Key=dst_key,
+                CopySource=source,
+                CopySourceIfMatch=etag,
+            )
+        invalidate_list_cache(dst_uri)
+        return
+
+    # a multipart upload doesn't copy the source's headers by itself
+    kwargs = {'Metadata': head.get('Metadata', {})}
+    if 'ContentType' in head:
+        kwargs['ContentType'] = head['ContentType']
+    multipart = s3.create_multipart_upload(Bucket=dst_bucket, Key=dst_key, **kwargs)
+    upload_id = multipart['UploadId']
+
+    def copy_part(number, start, stop):
+        resp = s3.upload_part_copy(
+            Bucket=dst_bucket,
+            Key=dst_key,
+            UploadId=upload_id,
+            PartNumber=number,
+            CopySource=source,
+            CopySourceRange=f'bytes={start}-{stop - 1}',
+            CopySourceIfMatch=etag,
+        )
+        return {'PartNumber': number, 'ETag': resp['CopyPartResult']['ETag']}
+
+    concurrency = config["s3"]["upload_concurrency"]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            executor.submit(copy_part, number, start, min(start + part_size, size))
+            for number, start in enumerate(range(0, size, part_size), start=1)
+        ]
+        try:
+            parts = [future.result() for future in futures]
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            s3.abort_multipart_upload(
+                Bucket=dst_bucket, Key=dst_key, UploadId=upload_id
+            )
+            raise
+
+    s3.complete_multipart_upload(
+        Bucket=dst_bucket,
+        Key=dst_key,
+        UploadId=upload_id,
+        MultipartUpload={'Parts': parts},
+    )
+    invalidate_list_cache(dst_uri)
 
-    # anything before the first wildcard character can be
-    # treated as the Prefix for the s3 objects filter
+
+def _literal_prefix(pattern):
+    """Return the part of a pattern before its first wildcard character"""
     idx = min((pattern.index(c) for c in "*?[" if c in pattern), default=len(pattern))
-    prefix = pattern[:idx]
+    return pattern[:idx]
+
+
+def _iglob_level(s3, bucket_name, prefix, segments, config):
+    """
+    Yield the listed objects below `prefix` whose keys match the remaining
+    path segments of a pattern, listing one level of the bucket at a time.
+    """
+    segment, rest = segments[0], segments[1:]
+    literal = _literal_prefix(segment)
+
+    # a literal directory needs no request of its own
+    if rest and literal == segment:
+        subprefix = f"{prefix}{segment}/"
+        yield from _iglob_level(s3, bucket_name, subprefix, rest, config)
+        return
+
+    start = len(prefix)
+    pages = _list_pages(s3, bucket_name, prefix + literal, '/', config)
+    for page in pages:
+        if rest:
+            # directories are the common prefixes, each ending with '/'
+            for common_prefix in page.get('CommonPrefixes', []):
+                subprefix = common_prefix['Prefix']
+                name = subprefix[start:-1]
+                if fnmatch.fnmatchcase(name, segment):
+                    yield from _iglob_level(s3, bucket_name, subprefix, rest, config)
+        else:
+            for obj in page.get('Contents', []):
+                if fnmatch.fnmatchcase(obj['Key'][start:], segment):
+                    yield obj
+
+
+def _iglob_objects(uri, recursive, config):
+    """Yield the objects of the list responses whose keys match a pattern"""
+    parsed_uri = urllib.parse.urlparse(uri)
+    bucket_name = parsed_uri.netloc
+    pattern = parsed_uri.path.lstrip('/')
 
-    args = config["s3"]["boto_client_config_args"]
-    kwargs = config["s3"]["boto_client_config_kwargs"]
-    boto_config = botocore.client.Config(*args, **kwargs)
+    s3 = _client(config)
 
-    s3 = boto3.resource('s3', config=boto_config)
-    bucket = s3.Bucket(bucket_name)
+    if recursive:
+        # wildcards match across '/', so list everything below the
+        # literal start of the pattern
+        prefix = _literal_prefix(pattern)
+        for page in _list_pages(s3, bucket_name, prefix, None, config):
+            for obj in page.get('Contents', []):
+                if fnmatch.fnmatch(obj['Key'], pattern):
+                    yield obj
+    else:
+        # walk the pattern one segment at a time, so only the directories
+        # matching each wildcard segment are listed
+        yield from _iglob_level(s3, bucket_name, '', pattern.split('/'), config)
 
-    for obj in bucket.objects.filter(Prefix=prefix):
-        suffix = obj.key.lstrip(prefix)
 
-        if recursive is False and "/" in suffix:
-            continue
+def _iglob(uri, *, recursive=False, config=None):
+    parsed_uri = urllib.parse.urlparse(uri)
+    for obj in _iglob_objects(uri, recursive, config):
+        yield f"{parsed_uri.scheme}://{parsed_uri.netloc}/{obj['Key']}"
 
-        if not fnmatch.fnmatch(obj.key, pattern):
-            continue
 
-        yield f"{parsed_uri.scheme}://{bucket_name}/{obj.key}"
+def _iglob_info(uri, *, recursive=False, config=None):
+    parsed_uri = urllib.parse.urlparse(uri)
+    for obj in _iglob_objects(uri, recursive, config):
+        yield (
+            f"{parsed_uri.scheme}://{parsed_uri.netloc}/{obj['Key']}",
+            obj['Size'],
+            obj['LastModified'].timestamp(),
+            obj['ETag'],
+        )
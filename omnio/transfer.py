@@ -0,0 +1,61 @@
+"""
+Copying between URIs by the cheapest route available.
+"""
+
+import urllib.parse
+
+from .config import default_config
+from .lib import _import_scheme, _scheme_opens, open_
+
+
+def _stream_copy(src, dst, config, src_compression, dst_compression):
+    """Copy through this process, reusing one buffer for every read"""
+    buffer_size = config["copy"]["buffer_size"]
+    buffer = memoryview(bytearray(buffer_size))
+
+    with open_(src, 'rb', config=config, compression=src_compression) as fsrc:
+        with open_(dst, 'wb', config=config, compression=dst_compression) as fdst:
+            readinto = getattr(fsrc, 'readinto', None)
+            while True:
+                if readinto is not None:
+                    n = readinto(buffer)
+                    data = buffer[:n]
+                else:
+                    data = fsrc.read(buffer_size)
+                if not data:
+                    break
+                fdst.write(data)
+
+
+def copy(src, dst, *, config=None, src_compression=None, dst_compression=None):
+    """
+    Copy the content of URI `src` to URI `dst` and return `dst`.
+
+    Copies within one scheme avoid passing the data through Python where
+    the scheme allows it: S3 objects are copied server-side, with
+    `copy_object` or, beyond `copy_part_size`, with concurrent
+    `upload_part_copy` requests, and local files are copied by the kernel.
+    Anything else is streamed through a reusable buffer of
+    `config["copy"]["buffer_size"]` bytes.
+
+    src_compression, dst_compression -- Optional compressions to read
+    `src` and write `dst` with, as for the `compression` argument of
+    `omnio.open()`. Giving either transcodes the data through this
+    process, e.g. `copy(src, dst, src_compression='gzip',
+    dst_compression='zstd')`.
+    """
+    if config is None:
+        config = default_config()
+
+    src_scheme = _scheme_opens[urllib.parse.urlparse(src).scheme]
+    dst_scheme = _scheme_opens[urllib.parse.urlparse(dst).scheme]
+    transcode = src_compression is not None or dst_compression is not None
+
+    if not transcode and src_scheme == dst_scheme:
+        scheme = _import_scheme(src_scheme)
+        if hasattr(scheme, '_copy'):
+            scheme._copy(src, dst, config)
+            return dst
+
+    _stream_copy(src, dst, config, src_compression, dst_compression)
+    return dst
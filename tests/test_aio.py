@@ -0,0 +1,242 @@
+import asyncio
+import io
+import os
+
+import pytest
+
+import omnio
+from omnio import aio, glob
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_aopen_read():
+    async def main():
+        async with omnio.aopen('tests/data/one.txt.gz', 'rtz') as fd:
+            assert not fd.closed
+            lines = [line async for line in fd]
+        assert fd.closed
+        return lines
+
+    assert [line.strip() for line in run(main())] == ['one', 'two', 'three']
+
+
+def test_aopen_await():
+    async def main():
+        fd = await omnio.aopen('tests/data/ascii.txt', 'rb')
+        try:
+            head = await fd.read(10)
+            assert await fd.tell() == 10
+            await fd.seek(0)
+            return head, await fd.read()
+        finally:
+            await fd.close()
+
+    head, data = run(main())
+    with open('tests/data/ascii.txt', 'rb') as fd:
+        expected = fd.read()
+    assert head == expected[:10]
+    assert data == expected
+
+
+def test_aopen_write(tmp_path):
+    path = str(tmp_path / 'out.txt.bz2')
+
+    async def main():
+        async with omnio.aopen(path, 'wt', compression='bz2') as fd:
+            await fd.write('hello\n')
+        async with omnio.aopen(path, 'rtj') as fd:
+            return await fd.readlines()
+
+    assert run(main()) == ['hello\n']
+
+
+def test_aopen_many_concurrent():
+    config = omnio.default_config()
+    config['aio']['workers'] = 8
+
+    async def read(path):
+        async with omnio.aopen(path, 'rb', config=config) as fd:
+            return await fd.read()
+
+    async def main():
+        return await asyncio.gather(*[read('tests/data/ascii.txt')] * 100)
+
+    results = run(main())
+    assert len(set(results)) == 1
+
+
+def test_aopen_evicted_executor():
+    async def main():
+        fd = await omnio.aopen('tests/data/ascii.txt')
+        # more pool sizes than are cached evict the pool of the open file
+        for workers in range(2, 8):
+            config = omnio.default_config()
+            config['aio']['workers'] = workers
+            async with omnio.aopen('tests/data/ascii.txt', config=config) as other:
+                await other.read(1)
+        async with fd:
+            return await fd.read()
+
+    with open('tests/data/ascii.txt', 'rb') as fd:
+        assert run(main()) == fd.read()
+
+
+class RawReader(io.RawIOBase):
+    """Stream with only the byte at a time readline of IOBase"""
+
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        return self.data.readinto(b)
+
+    def seek(self, offset, whence=0):
+        return self.data.seek(offset, whence)
+
+    def tell(self):
+        return self.data.tell()
+
+
+def test_async_file_lines(monkeypatch):
+    data = b''.join(b'line %d\n' % i for i in range(20000)) + b'no newline'
+    lines = io.BytesIO(data).readlines()
+    calls = []
+    run_in_executor = aio._run
+
+    def counting_run(executor, func, *args):
+        calls.append(func)
+        return run_in_executor(executor, func, *args)
+
+    monkeypatch.setattr(aio, '_run', counting_run)
+    executor = aio._executor(omnio.default_config())
+
+    async def iterate():
+        fd = aio.AsyncFile(RawReader(data), executor)
+        return [line async for line in fd]
+
+    # lines are read in batches rather than one call per line
+    assert run(iterate()) == lines
+    assert len(calls) < 10
+
+    async def mixed():
+        fd = aio.AsyncFile(RawReader(data), executor)
+        assert await fd.readline() == lines[0]
+        assert await fd.__anext__() == lines[1]
+        assert await fd.tell() == len(lines[0] + lines[1])
+        await fd.seek(0)
+        assert await fd.__anext__() == lines[0]
+        assert await fd.readline(3) == lines[1][:3]
+        assert await fd.readline() == lines[1][3:]
+        assert await fd.read(0) == b''
+        assert await fd.read(10) == (lines[2] + lines[3])[:10]
+        position = await fd.tell()
+        assert position == len(b''.join(lines[:3])) + 3
+        assert await fd.readlines(1) == [lines[3][3:]]
+        assert await fd.readlines() == lines[4:]
+
+        await fd.seek(position)
+        assert await fd.__anext__() == lines[3][3:]
+        await fd.seek(-10, io.SEEK_CUR)
+        start = len(b''.join(lines[:4])) - 10
+        assert await fd.read(10) == data[start:][:10]
+        assert await fd.__anext__() == lines[4]
+        start = await fd.tell()
+        assert await fd.read() == data[start:]
+
+    run(mixed())
+
+    async def partial():
+        fd = aio.AsyncFile(RawReader(b'ab\ncd\nef'), executor)
+        assert await fd.__anext__() == b'ab\n'
+        assert await fd.readline() == b'cd\n'
+        return await fd.read()
+
+    monkeypatch.setattr(aio, '_BATCH_SIZE', 4)
+    assert run(partial()) == b'ef'
+
+
+def test_async_file_text_lines():
+    async def main():
+        fd = await omnio.aopen('tests/data/one.txt.gz', 'rtz')
+        async with fd:
+            assert (await fd.__anext__()).strip() == 'one'
+            # the position of lines read ahead is unknown
+            with pytest.raises(OSError):
+                await fd.tell()
+            with pytest.raises(OSError):
+                await fd.seek(0, io.SEEK_CUR)
+            assert (await fd.read()).split() == ['two', 'three']
+            await fd.seek(0)
+            assert await fd.tell() == 0
+            return await fd.readlines()
+
+    assert [line.strip() for line in run(main())] == ['one', 'two', 'three']
+
+
+def test_async_file_context():
+    async def main():
+        async with await omnio.aopen('tests/data/ascii.txt') as fd:
+            await fd.read(1)
+        return fd
+
+    assert run(main()).closed
+
+
+def test_aopen_error():
+    async def main():
+        await omnio.aopen('tests/data/missing.txt')
+
+    with pytest.raises(FileNotFoundError):
+        run(main())
+
+
+def test_aiglob():
+    from omnio import aio
+
+    async def main():
+        return [uri async for uri in glob.aiglob('tests/data/*.txt')]
+
+    async def batched():
+        pattern = 'tests/data/*.txt'
+        return [uri async for uri in aio.aiglob(pattern, batch_size=2)]
+
+    expected = glob.glob('tests/data/*.txt')
+    assert run(main()) == expected
+
+    # several batches, ending on a partial one
+    assert run(batched()) == expected
+
+
+def test_aiglob_exact_batches(tmp_path):
+    from omnio import aio
+
+    for name in ['a', 'b', 'c', 'd']:
+        (tmp_path / name).write_text('')
+
+    async def main():
+        pattern = f'{tmp_path}/*'
+        return [uri async for uri in aio.aiglob(pattern, batch_size=2)]
+
+    assert sorted(os.path.basename(uri) for uri in run(main())) == list('abcd')
+
+
+def test_aiglob_break():
+    async def main():
+        uris = glob.aiglob('tests/data/*.txt')
+        async for uri in uris:
+            break
+        await uris.aclose()
+        return uri
+
+    assert run(main()).endswith('.txt')
+
+
+def test_attribute_error():
+    with pytest.raises(AttributeError):
+        omnio.nonexistent
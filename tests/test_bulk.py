@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+
+import omnio
+from omnio import bulk
+
+
+PATHS = ['tests/data/one.txt.gz', 'tests/data/two.txt.gz', 'tests/data/three.txt.gz']
+
+
+def expected(path):
+    with omnio.open(path, 'rtz') as fd:
+        return fd.read()
+
+
+def test_read_many():
+    results = list(omnio.read_many(PATHS, 'rtz', max_workers=2))
+    assert results == [(path, expected(path)) for path in PATHS]
+
+
+def test_open_many():
+    for path, fd in omnio.open_many(iter(PATHS), 'rtz'):
+        with fd:
+            assert fd.read() == expected(path)
+
+
+def test_unordered():
+    first_consumed = threading.Event()
+
+    def func(uri):
+        # the first uri finishes only after the second was yielded
+        if uri == 0:
+            first_consumed.wait(5)
+        return uri * 10
+
+    results = bulk._run_batch(func, range(2), 2, ordered=False)
+    assert next(results) == (1, 10)
+    first_consumed.set()
+    assert list(results) == [(0, 0)]
+
+
+def test_bounded():
+    started = []
+
+    def func(uri):
+        started.append(uri)
+        return uri
+
+    results = bulk._run_batch(func, range(100), 3, ordered=True)
+    assert next(results) == (0, 0)
+    time.sleep(0.1)
+    assert len(started) <= 4
+    results.close()
+
+
+def test_close_early_releases_files():
+    opened = []
+
+    def func(uri):
+        opened.append(uri)
+        return uri
+
+    released = []
+    results = bulk._run_batch(func, range(10), 4, True, release=released.append)
+    assert next(results) == (0, 0)
+    results.close()
+
+    # everything opened but never yielded is released
+    deadline = time.monotonic() + 5
+    while sorted(released + [0]) != sorted(opened) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sorted(released + [0]) == sorted(opened)
+
+
+def test_error():
+    def func(uri):
+        if uri == 1:
+            raise ValueError(uri)
+        return uri
+
+    released = []
+    results = bulk._run_batch(func, range(3), 3, True, release=released.append)
+    assert next(results) == (0, 0)
+    with pytest.raises(ValueError):
+        next(results)
+
+
+def test_open_many_missing():
+    with pytest.raises(FileNotFoundError):
+        list(omnio.open_many(['tests/data/missing.txt']))
+
+
+def test_batch_config():
+    config = omnio.default_config()
+    batch_config = bulk._batch_config(config, 32)
+    assert batch_config['http']['pool_maxsize'] == 32
+    assert batch_config['s3']['boto_client_config_kwargs'] == {
+        'max_pool_connections': 32
+    }
+    # the caller's config is left alone
+    assert config == omnio.default_config()
@@ -0,0 +1,121 @@
+import os
+import threading
+
+import pytest
+
+from omnio import cache
+
+
+def test_make_key():
+    a = cache.make_key([[1, 2], {"b": {"c": [3]}, "a": 1}])
+    b = cache.make_key([[1, 2], {"a": 1, "b": {"c": [3]}}])
+    assert a == b
+    assert hash(a) == hash(b)
+
+
+def test_get():
+    lru = cache.LRUCache(2)
+    assert lru.get("a", lambda: 1) == 1
+    assert lru.get("a", lambda: 2) == 1
+    assert len(lru) == 1
+    assert "a" in lru
+
+
+def test_eviction():
+    evicted = []
+    lru = cache.LRUCache(2, on_evict=evicted.append)
+    lru.get("a", lambda: 1)
+    lru.get("b", lambda: 2)
+    lru.get("a", lambda: 1)  # "b" is now least recently used
+    lru.get("c", lambda: 3)
+
+    assert evicted == [2]
+    assert "a" in lru and "c" in lru and "b" not in lru
+
+
+def test_clear():
+    evicted = []
+    lru = cache.LRUCache(2, on_evict=evicted.append)
+    lru.get("a", lambda: 1)
+    lru.get("b", lambda: 2)
+    lru.clear()
+
+    assert sorted(evicted) == [1, 2]
+    assert len(lru) == 0
+
+
+def test_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+
+    evicted = []
+    lru = cache.LRUCache(2, on_evict=evicted.append)
+    lru.put("a", 1, ttl=10)
+    lru.put("b", 2)
+    assert lru.lookup("a") == 1
+    assert "a" in lru
+
+    now[0] = 110.0
+    assert lru.lookup("a") is None
+    assert lru.lookup("a", 0) == 0
+    assert "a" not in lru
+    assert lru.lookup("b") == 2  # no ttl
+
+    # an expired value is recreated, releasing the old one
+    assert lru.get("a", lambda: 3) == 3
+    assert evicted == [1]
+    now[0] = 200.0
+    assert lru.get("a", lambda: 4) == 3
+
+
+def test_put_replaces():
+    evicted = []
+    lru = cache.LRUCache(2, on_evict=evicted.append)
+    lru.put("a", 1)
+    lru.put("a", 2)
+    lru.put("b", 3)
+    lru.put("c", 4)
+    assert evicted == [1, 2]
+    assert lru.lookup("b") == 3 and lru.lookup("c") == 4
+
+
+def test_discard_if():
+    evicted = []
+    lru = cache.LRUCache(3, on_evict=evicted.append)
+    for key, value in [("a1", 1), ("b", 2), ("a2", 3)]:
+        lru.put(key, value)
+    lru.discard_if(lambda key: key.startswith("a"))
+    assert evicted == [1, 3]
+    assert len(lru) == 1
+
+
+def test_threads_share_value():
+    lru = cache.LRUCache(2)
+    results = []
+
+    def get():
+        results.append(lru.get("a", object))
+
+    threads = [threading.Thread(target=get) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(set(map(id, results))) == 1
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires fork')
+def test_fork():
+    evicted = []
+    lru = cache.LRUCache(2, on_evict=evicted.append)
+    lru.get("a", lambda: 1)
+
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover
+        # the child must start empty without closing the parent's values
+        os._exit(0 if len(lru) == 0 and not evicted else 1)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert "a" in lru
@@ -0,0 +1,141 @@
+import io
+import os
+
+import pytest
+
+import omnio
+from omnio import diskcache
+
+
+class Origin:
+    """Stand-in for a scheme's conditional open"""
+
+    def __init__(self, data, etag='"1"', last_modified=None):
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.calls = []
+
+    def __call__(self, uri, config, etag, last_modified):
+        self.calls.append((etag, last_modified))
+        if etag is not None and etag == self.etag:
+            return None
+        return io.BytesIO(self.data), self.etag, self.last_modified
+
+
+@pytest.fixture
+def config(tmp_path):
+    config = omnio.default_config()
+    config['disk_cache']['directory'] = str(tmp_path / 'cache')
+    return config
+
+
+def data_files(config):
+    directory = config['disk_cache']['directory']
+    return sorted(n for n in os.listdir(directory) if n.endswith('.data'))
+
+
+def test_miss_then_hit(config):
+    origin = Origin(b'content')
+
+    with diskcache.open_('s3://bucket/key', origin, config) as fd:
+        assert isinstance(fd, io.BufferedReader)
+        assert fd.read() == b'content'
+
+    with diskcache.open_('s3://bucket/key', origin, config) as fd:
+        assert isinstance(fd, io.BufferedReader)
+        assert fd.read() == b'content'
+
+    assert origin.calls == [(None, None), ('"1"', None)]
+    assert len(data_files(config)) == 1
+
+
+def test_changed(config):
+    origin = Origin(b'old')
+    diskcache.open_('s3://bucket/key', origin, config).close()
+    (old,) = data_files(config)
+
+    origin.data, origin.etag = b'new', '"2"'
+    with diskcache.open_('s3://bucket/key', origin, config) as fd:
+        assert fd.read() == b'new'
+
+    (new,) = data_files(config)
+    assert new != old
+
+
+def test_last_modified(config):
+    origin = Origin(b'content', etag=None, last_modified='yesterday')
+    diskcache.open_('http://example.com/a', origin, config).close()
+    diskcache.open_('http://example.com/a', origin, config).close()
+    assert origin.calls == [(None, None), (None, 'yesterday')]
+
+
+def test_no_validators(config):
+    origin = Origin(b'content', etag=None)
+    with diskcache.open_('http://example.com/a', origin, config) as fd:
+        assert isinstance(fd, io.BytesIO)
+    assert data_files(config) == []
+
+
+def test_eviction(config):
+    config['disk_cache']['max_size'] = 25
+    for i, name in enumerate('abc'):
+        origin = Origin(name.encode() * 10)
+        with diskcache.open_(f's3://bucket/{name}', origin, config) as fd:
+            # make the order of use unambiguous
+            os.utime(fd.name, (i, i))
+
+    # "a" was evicted along with its metadata, so it is fetched again
+    assert len(data_files(config)) == 2
+    origin = Origin(b'a' * 10)
+    diskcache.open_('s3://bucket/a', origin, config).close()
+    assert origin.calls == [(None, None)]
+
+
+def test_evicted_data(config):
+    origin = Origin(b'content')
+    diskcache.open_('s3://bucket/key', origin, config).close()
+    for data_file in data_files(config):
+        os.remove(os.path.join(config['disk_cache']['directory'], data_file))
+
+    with diskcache.open_('s3://bucket/key', origin, config) as fd:
+        assert fd.read() == b'content'
+    assert origin.calls == [(None, None), (None, None)]
+
+
+def test_origin_error(config):
+    origin = Origin(b'content')
+    diskcache.open_('s3://bucket/key', origin, config).close()
+
+    def fail(uri, config, etag, last_modified):
+        raise ConnectionError
+
+    with pytest.raises(ConnectionError):
+        diskcache.open_('s3://bucket/key', fail, config)
+
+
+def test_fill_error(config):
+    class Broken(io.RawIOBase):
+        def readinto(self, b):
+            raise TimeoutError
+
+    def origin(uri, config, etag, last_modified):
+        return Broken(), '"1"', None
+
+    with pytest.raises(TimeoutError):
+        diskcache.open_('s3://bucket/key', origin, config)
+
+    assert os.listdir(config['disk_cache']['directory']) == []
+
+
+def test_meta_error(config, monkeypatch):
+    def dump(meta, fd):
+        raise OSError
+
+    monkeypatch.setattr(diskcache.json, 'dump', dump)
+    with pytest.raises(OSError):
+        diskcache.open_('s3://bucket/key', Origin(b'content'), config)
+
+    assert not any(
+        n.endswith('.tmp') for n in os.listdir(config['disk_cache']['directory'])
+    )
@@ -1,7 +1,11 @@
+import gzip
+import io
 import os
 import responses
 
 import pytest
+import requests
+import urllib3.exceptions
 
 import omnio
 
@@ -113,3 +117,588 @@ def test_closed():
         next(f)
     with pytest.raises(ValueError):
         iter(f)
+
+
+def test_session_cache():
+    config = omnio.default_config()
+    session = omnio.http._session('http://example.com/one', config)
+    assert omnio.http._session('http://example.com/two', config) is session
+    assert omnio.http._session('http://example.org/one', config) is not session
+
+    config["http"]["pool_maxsize"] = 2
+    other = omnio.http._session('http://example.com/one', config)
+    assert other is not session
+    assert other.get_adapter('http://example.com/')._pool_maxsize == 2
+
+    omnio.http.clear_session_cache()
+    assert omnio.http._session('http://example.com/one', config) is not other
+
+
+def test_session_no_keep_alive():
+    config = omnio.default_config()
+    config["http"]["keep_alive"] = False
+    session = omnio.http._session('http://example.com/', config)
+    assert session.headers['Connection'] == 'close'
+
+
+@responses.activate
+def test_close_early_releases_response():
+    uri = 'http://example.com/example'
+    responses.add(responses.GET, uri, body=os.urandom(4096), status=200)
+
+    f = omnio.open(uri, 'rb')
+    assert len(f.read(10)) == 10
+    f.close()
+    assert f.resp.raw.closed
+
+    # closing again is a no-op
+    f.close()
+
+
+class FakeResponse:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def iter_content(self, chunk_size=None, decode_unicode=False):
+        return iter(self.chunks)
+
+    def close(self):
+        pass
+
+
+def test_read_sizes():
+    chunks = [b'abc', b'', b'defgh', b'ij']
+    with omnio.http.HTTPReader(FakeResponse(chunks), 512) as reader:
+        assert reader.read(0) == b''
+        assert reader.read(2) == b'ab'
+        assert reader.read(4) == b'cdef'
+        assert reader.read() == b'ghij'
+        assert reader.read(1) == b''
+
+
+def test_read_whole_chunk_without_copy():
+    chunks = [b'abc', b'def']
+    with omnio.http.HTTPReader(FakeResponse(chunks), 512) as reader:
+        assert reader.read(3) is chunks[0]
+
+
+def test_readinto():
+    chunks = [b'abc', b'defgh', b'ij']
+    with omnio.http.HTTPReader(FakeResponse(chunks), 512) as reader:
+        buf = bytearray(4)
+        assert reader.readinto(buf) == 4
+        assert buf == b'abcd'
+        assert reader.readinto(buf) == 4
+        assert buf == b'efgh'
+        assert reader.readinto(buf) == 2
+        assert buf[:2] == b'ij'
+        assert reader.readinto(buf) == 0
+
+
+def test_readinto1():
+    chunks = [b'abc', b'defgh']
+    with omnio.http.HTTPReader(FakeResponse(chunks), 512) as reader:
+        buf = bytearray(8)
+        # only what is already received (or one new chunk) is returned
+        assert reader.readinto1(buf) == 3
+        assert buf[:3] == b'abc'
+        assert reader.peek() == b'defgh'
+        assert reader.readinto1(buf) == 5
+        assert reader.readinto1(buf) == 0
+        assert reader.peek() == b''
+
+
+def test_buffered_reader():
+    data = os.urandom(100000)
+    chunks = [data[i:][:777] for i in range(0, len(data), 777)]
+    reader = omnio.http.HTTPReader(FakeResponse(chunks), 777)
+    with io.BufferedReader(reader, buffer_size=4096) as buffered:
+        assert buffered.read(10) == data[:10]
+        assert buffered.read() == data[10:]
+
+
+@responses.activate
+def test_open_rbz():
+    uri = 'http://example.com/example.csv.gz'
+    with open('tests/data/flights-3m.csv.gz', 'rb') as fd:
+        data = fd.read()
+    responses.add(responses.GET, uri, body=data, status=200)
+
+    with omnio.open(uri, 'rbz') as infile:
+        assert len(infile.read()) == 5535530
+
+
+def _add_range_callback(uri, data, etag='"v1"'):
+    requests_seen = []
+
+    def callback(request):
+        requests_seen.append(request.headers.get('Range'))
+        headers = {'Accept-Ranges': 'bytes', 'ETag': etag}
+        if 'Range' not in request.headers:
+            headers['Content-Length'] = str(len(data))
+            return (200, headers, data)
+
+        assert request.headers['If-Match'] == etag
+        first, last = request.headers['Range'][6:].split('-')
+        start, stop = int(first), int(last or len(data) - 1)
+        body = data[start:][: stop - start + 1]
+        headers['Content-Length'] = str(len(body))
+        headers['Content-Range'] = f'bytes {start}-{stop}/{len(data)}'
+        return (206, headers, body)
+
+    responses.add_callback(responses.GET, uri, callback=callback)
+    return requests_seen
+
+
+@responses.activate
+def test_open_seekable():
+    uri = 'http://example.com/example'
+    data = os.urandom(10000)
+    seen = _add_range_callback(uri, data)
+
+    config = omnio.default_config()
+    config["http"]["block_size"] = 1024
+
+    with omnio.open(uri, 'rb', config=config) as reader:
+        assert isinstance(reader, omnio.http.HTTPRangeReader)
+        assert reader.seekable()
+
+        # reading from the start is served by the initial response
+        assert reader.read(1500) == data[:1500]
+        assert seen == [None]
+
+        assert reader.seek(-100, io.SEEK_END) == 9900
+        assert reader.read() == data[-100:]
+        assert seen == [None, 'bytes=9216-9999']
+        assert reader.resp is None
+
+        reader.seek(0)
+        assert reader.read() == data
+
+
+@responses.activate
+def test_open_seekable_rtz():
+    uri = 'http://example.com/one.txt.gz'
+    with open('tests/data/one.txt.gz', 'rb') as fd:
+        _add_range_callback(uri, fd.read())
+
+    with omnio.open(uri, 'rtz') as fd:
+        assert fd.read().split() == ['one', 'two', 'three']
+
+
+@responses.activate
+def test_open_seekable_disabled():
+    uri = 'http://example.com/example'
+    _add_range_callback(uri, b'abc')
+
+    config = omnio.default_config()
+    config["http"]["seekable"] = False
+    with omnio.open(uri, 'rb', config=config) as reader:
+        assert isinstance(reader, omnio.http.HTTPReader)
+        assert reader.read() == b'abc'
+
+
+@responses.activate
+def test_open_no_range_support():
+    uri = 'http://example.com/example'
+    headers = {'Accept-Ranges': 'bytes', 'Content-Encoding': 'gzip'}
+    responses.add(responses.GET, uri, body=b'abc', headers=headers)
+
+    with omnio.open(uri, 'rb') as reader:
+        assert isinstance(reader, omnio.http.HTTPReader)
+        assert not reader.seekable()
+
+
+@responses.activate
+def test_range_ignored():
+    uri = 'http://example.com/example'
+    data = os.urandom(100)
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'Content-Length': '100',
+        'Last-Modified': 'yesterday',
+    }
+    responses.add(responses.GET, uri, body=data, headers=headers)
+
+    config = omnio.default_config()
+    config["http"]["block_size"] = 10
+
+    with omnio.open(uri, 'rb', config=config) as reader:
+        assert reader.headers == {'If-Unmodified-Since': 'yesterday'}
+        reader.seek(50)
+        with pytest.raises(OSError):
+            reader.read()
+
+    # closing again is a no-op
+    reader.close()
+
+
+def test_range_reader_short_response():
+    class Raw(io.BytesIO):
+        pass
+
+    class Response:
+        url = 'http://example.com/example'
+        headers = {}
+        raw = Raw(b'abc')
+
+        def close(self):
+            pass
+
+    # the server sent less than the advertised length
+    with omnio.http.HTTPRangeReader(None, Response(), 10, 64, 64) as reader:
+        with pytest.raises(urllib3.exceptions.IncompleteRead):
+            reader.read()
+        assert reader.tell() == 0
+        assert len(reader.blocks) == 0
+
+
+@responses.activate
+def test_range_reader_short_response_refetch():
+    uri = 'http://example.com/example'
+    data = os.urandom(10)
+    seen = _add_range_callback(uri, data)
+
+    class Response:
+        url = uri
+        headers = {'ETag': '"v1"'}
+        raw = io.BytesIO(data[:3])
+
+        def close(self):
+            pass
+
+    session = requests.Session()
+    with omnio.http.HTTPRangeReader(
+        session, Response(), 10, 64, 64, retries=1
+    ) as reader:
+        assert reader.read() == data
+    assert seen == ['bytes=0-9']
+
+
+@responses.activate
+def test_range_request_short_response():
+    uri = 'http://example.com/example'
+    data = os.urandom(100)
+    responses.add(
+        responses.GET,
+        uri,
+        body=data,
+        headers={'Accept-Ranges': 'bytes', 'ETag': '"v1"', 'Content-Length': '100'},
+    )
+    responses.add(responses.GET, uri, body=data[:5], status=206)
+
+    config = omnio.default_config()
+    config["http"]["block_size"] = 10
+    config["http"]["read_retries"] = 0
+    with omnio.open(uri, 'rb', config=config) as reader:
+        reader.seek(50)
+        with pytest.raises(urllib3.exceptions.IncompleteRead):
+            reader.read(10)
+
+
+@responses.activate
+def test_open_infer_compression():
+    # the stream isn't seekable, so the peeked bytes are pushed back
+    uri = 'http://example.com/one'
+    with open('tests/data/one.txt.gz', 'rb') as fd:
+        responses.add(responses.GET, uri, body=fd.read(), status=200)
+
+    with omnio.open(uri, 'rt', compression='infer') as fd:
+        assert isinstance(fd.buffer.fileobj, omnio.lib.PushbackReader)
+        assert fd.read().split() == ['one', 'two', 'three']
+
+
+@responses.activate
+def test_open_infer_no_compression():
+    uri = 'http://example.com/example'
+    data = os.urandom(1024)
+    responses.add(responses.GET, uri, body=data, status=200)
+
+    with omnio.open(uri, 'rb', compression='infer') as fd:
+        assert fd.readable()
+        assert fd.read(3) == data[:3]
+        buf = bytearray(10)
+        assert fd.readinto(buf) == 10
+        assert buf == data[3:13]
+        assert fd.read(10) == data[13:23]
+        assert fd.readall() == data[23:]
+
+    with omnio.open(uri, 'rb', compression='infer') as fd:
+        assert fd.read() == data
+
+    fd.close()
+    with pytest.raises(ValueError):
+        fd.read()
+
+
+@responses.activate
+def test_open_disk_cache(tmp_path):
+    uri = 'http://example.com/reference.txt'
+    body = {'data': b'version one', 'etag': '"v1"'}
+    seen = []
+
+    def callback(request):
+        seen.append(request.headers.get('If-None-Match'))
+        if request.headers.get('If-None-Match') == body['etag']:
+            return (304, {}, b'')
+        return (200, {'ETag': body['etag']}, body['data'])
+
+    responses.add_callback(responses.GET, uri, callback=callback)
+
+    config = omnio.default_config()
+    config['disk_cache']['directory'] = str(tmp_path)
+
+    for _ in range(2):
+        with omnio.open(uri, 'rb', config=config) as fd:
+            assert isinstance(fd, io.BufferedReader)
+            assert fd.read() == b'version one'
+
+    body.update(data=b'version two', etag='"v2"')
+    with omnio.open(uri, 'rt', config=config) as fd:
+        assert fd.read() == 'version two'
+
+    assert seen == [None, '"v1"', '"v1"']
+
+
+@responses.activate
+def test_open_disk_cache_last_modified(tmp_path):
+    uri = 'http://example.com/reference.txt'
+    last_modified = 'Wed, 21 Oct 2015 07:28:00 GMT'
+    seen = []
+
+    def callback(request):
+        seen.append(request.headers.get('If-Modified-Since'))
+        if request.headers.get('If-Modified-Since') == last_modified:
+            return (304, {}, b'')
+        return (200, {'Last-Modified': last_modified}, b'data')
+
+    responses.add_callback(responses.GET, uri, callback=callback)
+
+    config = omnio.default_config()
+    config['disk_cache']['directory'] = str(tmp_path)
+    for _ in range(2):
+        with omnio.open(uri, 'rb', config=config) as fd:
+            assert fd.read() == b'data'
+
+    assert seen == [None, last_modified]
+
+
+@responses.activate
+def test_open_disk_cache_error(tmp_path):
+    uri = 'http://example.com/missing.txt'
+    responses.add(responses.GET, uri, status=404, body=b'not found')
+
+    config = omnio.default_config()
+    config['disk_cache']['directory'] = str(tmp_path)
+
+    with pytest.raises(requests.HTTPError):
+        omnio.open(uri, 'rb', config=config)
+    assert os.listdir(tmp_path) == []
+
+
+@responses.activate
+def test_metrics():
+    uri = 'http://example.com/example'
+    data = os.urandom(10000)
+    _add_range_callback(uri, data)
+    omnio.metrics.reset()
+
+    config = omnio.default_config()
+    config["http"]["block_size"] = 1024
+    with omnio.open(uri, 'rb', config=config) as reader:
+        assert reader.read(1500) == data[:1500]
+        reader.seek(-100, io.SEEK_END)
+        assert reader.read() == data[-100:]
+
+    config["http"]["seekable"] = False
+    with omnio.open(uri, 'rb', config=config) as reader:
+        assert reader.read() == data
+
+    snapshot = omnio.metrics.snapshot()['http']
+    # whole blocks are fetched
+    assert snapshot['bytes_read'] == 2048 + 784 + len(data)
+    assert snapshot['requests'] == 3
+    assert snapshot['request_seconds']['count'] == 3
+    assert snapshot['first_byte_seconds']['count'] == 2
+
+
+def _flaky(content_iter, fail_at):
+    """Yield the chunks of content_iter, failing in place of chunk `fail_at`"""
+    for i, chunk in enumerate(content_iter):
+        if i == fail_at:
+            raise requests.exceptions.ChunkedEncodingError('connection broken')
+        yield chunk
+
+
+@responses.activate
+def test_read_resume():
+    uri = 'http://example.com/example.gz'
+    data = os.urandom(10000)
+    seen = _add_range_callback(uri, gzip.compress(data))
+
+    config = omnio.default_config()
+    config["http"]["seekable"] = False
+    config["http"]["read_retry_backoff"] = 0
+    omnio.metrics.reset()
+
+    with omnio.open(uri, 'rb', config=config) as reader:
+        reader.content_iter = _flaky(reader.content_iter, 3)
+
+        # the decompressor above never sees the failure
+        with gzip.GzipFile(fileobj=reader) as fd:
+            assert fd.read() == data
+
+    assert seen == [None, 'bytes=1536-']
+    assert omnio.metrics.snapshot()['http']['retries'] == 1
+
+
+@responses.activate
+def test_read_resume_exhausted():
+    uri = 'http://example.com/example'
+    _add_range_callback(uri, os.urandom(10000))
+
+    config = omnio.default_config()
+    config["http"]["seekable"] = False
+    config["http"]["read_retries"] = 0
+
+    with omnio.open(uri, 'rb', config=config) as reader:
+        reader.content_iter = _flaky(reader.content_iter, 3)
+        with pytest.raises(requests.exceptions.ChunkedEncodingError):
+            reader.read()
+
+
+@responses.activate
+def test_read_resume_error():
+    uri = 'http://example.com/example'
+    data = os.urandom(10000)
+    _add_range_callback(uri, data)
+
+    config = omnio.default_config()
+    config["http"]["seekable"] = False
+    config["http"]["read_retry_backoff"] = 0
+
+    def open_flaky(retries):
+        config["http"]["read_retries"] = retries
+        reader = omnio.open(uri, 'rb', config=config)
+        reader.content_iter = _flaky(reader.content_iter, 3)
+        resume = reader.resume
+
+        def flaky_resume(start):
+            starts.append(start)
+            if len(starts) == 1:
+                raise requests.exceptions.ConnectionError('connection refused')
+            return resume(start)
+
+        reader.resume = flaky_resume
+        return reader
+
+    # a failed request for the rest is retried too
+    starts = []
+    omnio.metrics.reset()
+    with open_flaky(retries=2) as reader:
+        assert reader.read() == data
+    assert starts == [1536, 1536]
+    assert omnio.metrics.snapshot()['http']['retries'] == 2
+
+    # from the same budget
+    starts = []
+    with open_flaky(retries=1) as reader:
+        with pytest.raises(requests.exceptions.ConnectionError):
+            reader.read()
+    assert starts == [1536]
+
+
+@responses.activate
+def test_no_resume_without_validator():
+    uri = 'http://example.com/example'
+    headers = {'Accept-Ranges': 'bytes'}
+    responses.add(responses.GET, uri, body=b'abc', headers=headers)
+
+    config = omnio.default_config()
+    config["http"]["seekable"] = False
+    with omnio.open(uri, 'rb', config=config) as reader:
+        assert reader.resume is None
+
+
+@responses.activate
+def test_no_range_reader_without_validator():
+    uri = 'http://example.com/example'
+    headers = {'Accept-Ranges': 'bytes', 'Content-Length': '3'}
+    responses.add(responses.GET, uri, body=b'abc', headers=headers)
+
+    # blocks of different versions could be mixed, so the content is streamed
+    with omnio.open(uri, 'rb') as reader:
+        assert isinstance(reader, omnio.http.HTTPReader)
+        assert not reader.seekable()
+        assert reader.read() == b'abc'
+    assert len(responses.calls) == 1
+
+
+@responses.activate
+def test_get_rest_errors():
+    uri = 'http://example.com/example'
+    session = requests.Session()
+    validators = {'If-Match': '"v1"'}
+
+    responses.add(responses.GET, uri, status=412)
+    with pytest.raises(requests.exceptions.HTTPError):
+        omnio.http._get_rest(session, uri, validators, 10)
+
+    responses.replace(responses.GET, uri, body=b'abc', status=200)
+    with pytest.raises(OSError):
+        omnio.http._get_rest(session, uri, validators, 1)
+
+
+@responses.activate
+def test_range_reader_resp_failure():
+    uri = 'http://example.com/example'
+    data = os.urandom(10000)
+    seen = _add_range_callback(uri, data)
+
+    config = omnio.default_config()
+    config["http"]["block_size"] = 1024
+    config["http"]["read_retry_backoff"] = 0
+
+    def fail(*args, **kwargs):
+        raise urllib3.exceptions.ProtocolError('connection broken')
+
+    with omnio.open(uri, 'rb', config=config) as reader:
+        assert reader.read(1500) == data[:1500]
+        reader.resp.raw.read = fail
+        # the blocks being read are requested instead
+        assert reader.read() == data[1500:]
+        assert seen == [None, 'bytes=2048-9999']
+
+    config["http"]["read_retries"] = 0
+    with omnio.open(uri, 'rb', config=config) as reader:
+        reader.resp.raw.read = fail
+        with pytest.raises(urllib3.exceptions.ProtocolError):
+            reader.read()
+
+
+@responses.activate
+def test_range_request_retry():
+    uri = 'http://example.com/example'
+    data = os.urandom(10000)
+    seen = _add_range_callback(uri, data)
+    failures = [requests.exceptions.ConnectionError('reset')]
+    callback = responses.registered()[0].callback
+
+    def flaky_callback(request):
+        if 'Range' in request.headers and failures:
+            raise failures.pop()
+        return callback(request)
+
+    responses.replace(responses.GET, uri)
+    responses.upsert(responses.CallbackResponse(responses.GET, uri, flaky_callback))
+
+    config = omnio.default_config()
+    config["http"]["block_size"] = 1024
+    config["http"]["read_retry_backoff"] = 0
+
+    with omnio.open(uri, 'rb', config=config) as reader:
+        reader.seek(5000)
+        assert reader.read(100) == data[5000:5100]
+
+    assert seen == [None, 'bytes=4096-5119']
+    assert not failures
@@ -1,3 +1,6 @@
+import subprocess
+import sys
+
 import pytest
 
 import omnio
@@ -32,6 +35,19 @@ def test_invalid_combination():
     # only one compression type allowed
     with pytest.raises(ValueError):
         omnio.open('', 'rjz')
+    with pytest.raises(ValueError):
+        omnio.open('', 'rz', compression='xz')
+
+
+def test_invalid_compression():
+    with pytest.raises(ValueError):
+        omnio.open('', 'rb', compression='zip')
+
+
+def test_missing_compression_package(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'zstandard', None)
+    with pytest.raises(ImportError, match='zstandard'):
+        omnio.open('tests/data/ascii.txt', 'rb', compression='zstd')
 
 
 def test_default_config():
@@ -41,3 +57,20 @@ def test_default_config():
         assert isinstance(config[scheme], dict)
 
     omnio.open("tests/data/ascii.txt", 'rt', config=config)
+
+
+def test_import_is_lazy():
+    # importing omnio must not load the http and s3 scheme dependencies
+    code = (
+        "import sys, omnio; "
+        "print([m for m in ('requests', 'boto3', 'botocore') if m in sys.modules])"
+    )
+    out = subprocess.check_output([sys.executable, '-c', code], text=True)
+    assert out.strip() == '[]'
+
+
+def test_scheme_modules_available():
+    assert callable(omnio.s3._open)
+    assert callable(omnio.http._open)
+    with pytest.raises(AttributeError):
+        omnio.nope
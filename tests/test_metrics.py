@@ -0,0 +1,82 @@
+import pytest
+
+from omnio import metrics
+
+
+def test_counter():
+    registry = metrics.Registry()
+    counter = registry.counter('s3', 'bytes_read')
+    assert registry.counter('s3', 'bytes_read') is counter
+    assert registry.counter('http', 'bytes_read') is not counter
+
+    counter.add(10)
+    counter.add()
+    assert registry.snapshot() == {'http': {'bytes_read': 0}, 's3': {'bytes_read': 11}}
+
+
+def test_histogram():
+    registry = metrics.Registry()
+    histogram = registry.histogram('s3', 'request_seconds')
+    for value in (0.001, 0.005, 0.3, 100):
+        histogram.observe(value)
+
+    snapshot = registry.snapshot()['s3']['request_seconds']
+    assert snapshot['count'] == 4
+    assert snapshot['sum'] == pytest.approx(100.306)
+
+    buckets = dict(snapshot['buckets'])
+    assert buckets[0.005] == 2
+    assert buckets[0.25] == 2
+    assert buckets[0.5] == 3
+    assert buckets[60.0] == 3
+    assert buckets[float('inf')] == 4
+
+
+def test_wrong_type():
+    registry = metrics.Registry()
+    registry.counter('s3', 'requests')
+    with pytest.raises(TypeError):
+        registry.histogram('s3', 'requests')
+
+
+def test_reset():
+    registry = metrics.Registry()
+    counter = registry.counter('s3', 'requests')
+    histogram = registry.histogram('s3', 'request_seconds')
+    counter.add(3)
+    histogram.observe(1)
+
+    registry.reset()
+    assert counter.value == 0
+    assert registry.snapshot()['s3']['request_seconds']['count'] == 0
+
+    # the metrics held by the hot paths keep counting
+    counter.add()
+    assert registry.snapshot()['s3']['requests'] == 1
+
+
+def test_prometheus_text():
+    registry = metrics.Registry()
+    registry.counter('s3', 'requests').add(2)
+    registry.counter('http', 'requests').add(1)
+    registry.histogram('s3', 'request_seconds').observe(0.02)
+
+    lines = registry.prometheus_text().splitlines()
+    assert lines[0] == '# TYPE omnio_request_seconds histogram'
+    assert 'omnio_request_seconds_bucket{scheme="s3",le="0.01"} 0' in lines
+    assert 'omnio_request_seconds_bucket{scheme="s3",le="0.025"} 1' in lines
+    assert 'omnio_request_seconds_bucket{scheme="s3",le="+Inf"} 1' in lines
+    assert 'omnio_request_seconds_sum{scheme="s3"} 0.02' in lines
+    assert 'omnio_request_seconds_count{scheme="s3"} 1' in lines
+    assert lines[-3:] == [
+        '# TYPE omnio_requests_total counter',
+        'omnio_requests_total{scheme="http"} 1',
+        'omnio_requests_total{scheme="s3"} 2',
+    ]
+
+
+def test_module_registry():
+    assert metrics.counter('s3', 'bytes_read') is metrics.registry.counter(
+        's3', 'bytes_read'
+    )
+    assert 's3' in metrics.snapshot()
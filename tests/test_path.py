@@ -1,9 +1,13 @@
 import bz2
 import csv
+import io
 import gzip
+import lzma
 import os
 import types
 
+import pytest
+
 import omnio
 from omnio import glob
 
@@ -131,3 +135,377 @@ def test_iglob():
     uris = list(uris)
     assert all(u.startswith("tests/test_") for u in uris)
     assert all(u.endswith(".py") for u in uris)
+
+
+@pytest.mark.parametrize('compression', ['gzip', 'bz2', 'zstd', 'lz4', 'xz'])
+def test_compression(compression):
+    if compression in ('zstd', 'lz4'):
+        pytest.importorskip({'zstd': 'zstandard', 'lz4': 'lz4.frame'}[compression])
+
+    path = f'tests/data/compression.{compression}'
+    lines = [f'line {i}\n' for i in range(10000)]
+    try:
+        with omnio.open(path, 'wt', compression=compression) as fd:
+            fd.writelines(lines)
+        with omnio.open(path, 'rt', compression=compression) as fd:
+            assert list(fd) == lines
+        with omnio.open(path, 'rb', compression=compression) as fd:
+            assert fd.read() == ''.join(lines).encode()
+        with omnio.open(path, 'rb', compression=compression) as fd:
+            assert fd.readline() == lines[0].encode()
+            assert list(fd) == [line.encode() for line in lines[1:]]
+        assert fd.closed
+    finally:
+        os.remove(path)
+
+
+def test_xz_preset():
+    path = 'tests/data/preset.xz'
+    data = b'abc' * 10000
+    config = omnio.default_config()
+    config["xz"]["preset"] = 1
+    try:
+        with omnio.open(path, 'wb', compression='xz', config=config) as fd:
+            fd.write(data)
+        with open(path, 'rb') as fd:
+            assert lzma.decompress(fd.read()) == data
+    finally:
+        os.remove(path)
+
+
+def test_zstd_long_window():
+    zstandard = pytest.importorskip('zstandard')
+    path = 'tests/data/long.zst'
+    data = os.urandom(1024**2) * 3
+    config = omnio.default_config()
+    config["zstd"].update(long=True, threads=2, window_log=28)
+    try:
+        with omnio.open(path, 'wb', compression='zstd', config=config) as fd:
+            fd.write(data)
+
+        # the long window finds the repeats, and needs a large window to read
+        assert os.path.getsize(path) < 2 * 1024**2
+        with open(path, 'rb') as fd:
+            params = zstandard.get_frame_parameters(fd.read(18))
+            assert params.window_size == 2**28
+
+        with omnio.open(path, 'rb', compression='zstd', config=config) as fd:
+            assert fd.read() == data
+    finally:
+        os.remove(path)
+
+
+def test_lz4_compression_level():
+    lz4_frame = pytest.importorskip('lz4.frame')
+    path = 'tests/data/level.lz4'
+    data = b'abc' * 10000
+    config = omnio.default_config()
+    config["lz4"]["compression_level"] = 9
+    try:
+        with omnio.open(path, 'wb', compression='lz4', config=config) as fd:
+            fd.write(data)
+        with open(path, 'rb') as fd:
+            assert lz4_frame.decompress(fd.read()) == data
+    finally:
+        os.remove(path)
+
+
+@pytest.mark.parametrize(
+    'suffix,compression',
+    [
+        ('.gz', 'gzip'),
+        ('.bz2', 'bz2'),
+        ('.zst', 'zstd'),
+        ('.lz4', 'lz4'),
+        ('.xz', 'xz'),
+        ('.txt', None),
+    ],
+)
+def test_infer_compression(suffix, compression):
+    if compression in ('zstd', 'lz4'):
+        pytest.importorskip({'zstd': 'zstandard', 'lz4': 'lz4.frame'}[compression])
+
+    path = f'tests/data/infer{suffix}'
+    data = b'some data to compress\n' * 1000
+    try:
+        with omnio.open(path, 'wb', compression='infer') as fd:
+            fd.write(data)
+
+        # the suffix picked the compression when writing
+        with omnio.open(path, 'rb', compression=compression) as fd:
+            assert fd.read() == data
+
+        # and the content is recognized when reading
+        with omnio.open(path, 'rb', compression='infer') as fd:
+            assert fd.read() == data
+    finally:
+        os.remove(path)
+
+
+def test_infer_compression_empty():
+    path = 'tests/data/empty.gz'
+    try:
+        with open(path, 'wb'):
+            pass
+        with omnio.open(path, 'rb', compression='infer') as fd:
+            assert fd.read() == b''
+    finally:
+        os.remove(path)
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    for path in [
+        'a.txt',
+        '.hidden.txt',
+        'one/b.txt',
+        'one/c.gz',
+        'one/two/d.txt',
+        'one/.three/e.txt',
+        'four/f.txt',
+    ]:
+        path = tmp_path / path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text('')
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+@pytest.mark.parametrize('recursive', [False, True])
+@pytest.mark.parametrize(
+    'pattern',
+    [
+        '*',
+        '*.txt',
+        '.*',
+        '*/*.txt',
+        '**',
+        '**/',
+        '**/*.txt',
+        'one/**',
+        'one/**/*.txt',
+        'one/.*/*',
+        '*/two/d.txt',
+        'one/b.txt',
+        'one/',
+        'missing/*',
+    ],
+)
+def test_iglob_matches_stdlib(tree, pattern, recursive, workers):
+    import glob as stdlib_glob
+
+    config = omnio.default_config()
+    config['file']['glob_workers'] = workers
+
+    expected = list(stdlib_glob.iglob(pattern, recursive=recursive))
+    assert glob.glob(pattern, recursive=recursive, config=config) == expected
+
+    expected = list(stdlib_glob.iglob(f'{tree}/{pattern}', recursive=recursive))
+    uris = glob.glob(f'file://{tree}/{pattern}', recursive=recursive, config=config)
+    assert uris == expected
+
+
+def test_iglob_recursive(tree):
+    assert sorted(glob.glob('**/*.txt', recursive=True)) == [
+        'a.txt',
+        'four/f.txt',
+        'one/b.txt',
+        'one/two/d.txt',
+    ]
+
+
+def test_iglob_close(tree):
+    config = omnio.default_config()
+    config['file']['glob_workers'] = 4
+    uris = glob.iglob('**', recursive=True, config=config)
+    assert next(uris)
+    uris.close()
+
+
+def test_iglob_prefetch_limit(tmp_path, monkeypatch):
+    for i in range(50):
+        (tmp_path / f'dir{i:02}' / 'sub').mkdir(parents=True)
+        (tmp_path / f'dir{i:02}' / 'sub' / 'file').touch()
+
+    held = []
+    submit = omnio.path._GlobWalker._submit_prefetches
+
+    def submit_prefetches(self):
+        submit(self)
+        held.append(len(self.prefetched))
+
+    monkeypatch.setattr(omnio.path._GlobWalker, '_submit_prefetches', submit_prefetches)
+    config = omnio.default_config()
+    config['file']['glob_workers'] = 3
+
+    uris = glob.glob(f'{tmp_path}/**/file', recursive=True, config=config)
+    assert len(uris) == 50
+    assert max(held) == 6
+    uris = glob.glob(f'{tmp_path}/*/*/file', config=config)
+    assert len(uris) == 50
+    assert max(held) == 6
+
+
+def test_iglob_is_dir_error(tree, monkeypatch):
+    class Entry:
+        name = 'broken'
+
+        def is_dir(self):
+            raise PermissionError
+
+    scandir = os.scandir
+
+    class Scandir:
+        def __init__(self, path):
+            self.it = scandir(path)
+
+        def __enter__(self):
+            return list(self.it) + [Entry()]
+
+        def __exit__(self, *args):
+            self.it.close()
+
+    monkeypatch.setattr(os, 'scandir', Scandir)
+    assert 'broken' in glob.glob('*')
+    assert 'broken' not in glob.glob('*/')
+
+
+def test_iglob_info(tree):
+    os.symlink('missing', 'broken.txt')
+
+    entries = list(glob.iglob_info('**/*.txt', recursive=True))
+    assert [e.uri for e in entries] == glob.glob('**/*.txt', recursive=True)
+    for entry in entries:
+        stat = os.lstat(entry.uri)
+        assert entry.size == stat.st_size
+        assert entry.mtime == stat.st_mtime
+        assert entry.etag is None
+
+    (tree / 'one' / 'b.txt').write_text('data')
+    (entry,) = glob.iglob_info('one/b.txt')
+    assert entry.size == 4
+    assert repr(entry).startswith("GlobEntry(uri='one/b.txt', size=4, mtime=")
+
+
+def test_iglob_info_removed(tree, monkeypatch):
+    def vanish(path):
+        os.remove(path)
+        return path, None
+
+    entries = [vanish(p) for p in glob.iglob('*.txt')]
+    monkeypatch.setattr(
+        omnio.path, '_iglob_entries', lambda uri, recursive, config: iter(entries)
+    )
+    assert list(glob.iglob_info('*.txt')) == []
+
+
+@pytest.fixture
+def mmap_config():
+    config = omnio.default_config()
+    config['file']['mmap'] = True
+    config['file']['madvise'] = 'sequential'
+    return config
+
+
+def test_mmap_read(mmap_config):
+    path = 'tests/data/ascii.txt'
+    with open(path, 'rb') as fd:
+        data = fd.read()
+
+    with omnio.open(path, 'rb', config=mmap_config) as fd:
+        assert isinstance(fd, omnio.path.MappedFile)
+        assert fd.seekable()
+        assert fd.read(10) == data[:10]
+        buf = bytearray(10)
+        assert fd.readinto(buf) == 10 and buf == data[10:20]
+        assert fd.tell() == 20
+        assert fd.seek(-5, io.SEEK_END) == len(data) - 5
+        assert fd.read() == data[-5:]
+        assert fd.read() == b''
+        fd.seek(10)
+        fd.seek(-5, io.SEEK_CUR)
+        assert fd.readall() == data[5:]
+        fd.seek(len(data) + 10)
+        assert fd.read(1) == b'' and fd.readline() == b''
+        assert fd.readinto(buf) == 0
+
+        # the whole file, without copies
+        assert fd.view.readonly
+        assert bytes(fd.view[100:110]) == data[100:110]
+
+        with pytest.raises(ValueError):
+            fd.seek(-1)
+        with pytest.raises(ValueError):
+            fd.seek(0, 3)
+
+
+def test_mmap_lines(mmap_config):
+    path = 'tests/data/ascii.txt'
+    with open(path, 'rb') as fd:
+        lines = fd.readlines()
+
+    with omnio.open(path, 'rb', config=mmap_config) as fd:
+        assert list(fd) == lines
+        fd.seek(0)
+        assert fd.readline(3) == lines[0][:3]
+
+    with omnio.open(path, 'rt', config=mmap_config) as fd:
+        assert fd.read() == b''.join(lines).decode('ascii')
+
+    with omnio.open('tests/data/one.txt.gz', 'rtz', config=mmap_config) as fd:
+        assert fd.read().split() == ['one', 'two', 'three']
+
+
+def test_mmap_no_final_newline(tmp_path, mmap_config):
+    path = tmp_path / 'lines.txt'
+    path.write_bytes(b'one\ntwo')
+    with omnio.open(str(path), 'rb', config=mmap_config) as fd:
+        assert fd.readlines() == [b'one\n', b'two']
+
+
+def test_mmap_empty(tmp_path, mmap_config):
+    path = tmp_path / 'empty'
+    path.write_bytes(b'')
+    with omnio.open(str(path), 'rb', config=mmap_config) as fd:
+        assert fd.read() == b''
+        assert fd.readline() == b''
+        fd.advise('random')
+        assert len(fd.view) == 0
+
+
+def test_mmap_advise(mmap_config):
+    with omnio.open('tests/data/ascii.txt', 'rb', config=mmap_config) as fd:
+        fd.advise('random')
+        fd.advise('willneed')
+        with pytest.raises(ValueError):
+            fd.advise('never')
+
+
+def test_mmap_closed(mmap_config):
+    fd = omnio.open('tests/data/ascii.txt', 'rb', config=mmap_config)
+    fd.close()
+    fd.close()
+    with pytest.raises(ValueError):
+        fd.read()
+    with pytest.raises(ValueError):
+        fd.readline()
+    with pytest.raises(ValueError):
+        fd.readinto(bytearray(1))
+    with pytest.raises(ValueError):
+        fd.tell()
+    with pytest.raises(ValueError):
+        fd.seek(0)
+    with pytest.raises(ValueError):
+        fd.advise('random')
+
+
+def test_mmap_close_with_exports(mmap_config):
+    with open('tests/data/ascii.txt', 'rb') as fd:
+        data = fd.read()
+
+    fd = omnio.open('tests/data/ascii.txt', 'rb', config=mmap_config)
+    exported = memoryview(fd.view)
+    fd.close()
+    # the mapping outlives the file while it is still referenced
+    assert bytes(exported) == data
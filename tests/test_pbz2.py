@@ -0,0 +1,172 @@
+import bz2
+import gzip
+import io
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+import omnio
+from omnio import pbz2
+
+
+class Sink(io.BytesIO):
+    def close(self):
+        self.result = self.getvalue()
+        super(Sink, self).close()
+
+
+def _sample(size):
+    with open('tests/data/flights-3m.csv.gz', 'rb') as fd:
+        return gzip.decompress(fd.read())[:size]
+
+
+def _compress(data, writes=1, **kwargs):
+    sink = Sink()
+    with pbz2.ParallelBZ2Writer(sink, **kwargs) as writer:
+        step = -(-len(data) // writes) or 1
+        for i in range(0, max(len(data), 1), step):
+            writer.write(data[i:][:step])
+    return sink.result
+
+
+def _decompress(compressed, size=-1, **kwargs):
+    reader = pbz2.ParallelBZ2Reader(io.BytesIO(compressed), **kwargs)
+    with reader:
+        chunks = []
+        while True:
+            chunk = reader.read(size)
+            if not chunk:
+                return b''.join(chunks)
+            chunks.append(chunk)
+
+
+def test_write():
+    data = _sample(1024**2)
+    compressed = _compress(data, writes=5, compresslevel=1, workers=3)
+
+    # one stream per 100k block
+    assert compressed.count(b'BZh1') == 11
+    assert bz2.decompress(compressed) == data
+
+
+def test_write_empty():
+    assert bz2.decompress(_compress(b'')) == b''
+
+
+@pytest.mark.skipif(shutil.which('bzip2') is None, reason='requires bzip2')
+def test_bzip2_command():
+    data = _sample(512 * 1024)
+    compressed = _compress(data, compresslevel=1, workers=2)
+    out = subprocess.run(['bzip2', '-dc'], input=compressed, capture_output=True)
+    assert out.returncode == 0
+    assert out.stdout == data
+
+
+def test_read_multi_stream():
+    data = _sample(1024**2)
+    compressed = _compress(data, compresslevel=1, workers=3)
+    assert _decompress(compressed, workers=3, read_size=64 * 1024) == data
+    assert _decompress(compressed, size=1000, workers=2) == data
+
+
+def test_read_single_stream():
+    # a multi-block stream is larger than a segment, so it is read serially
+    data = _sample(1024**2)
+    compressed = bz2.compress(data, 1)
+    kwargs = {'workers': 2, 'read_size': 16 * 1024, 'max_segment_size': 64 * 1024}
+    assert _decompress(compressed, **kwargs) == data
+
+
+def test_read_mixed_streams():
+    data = _sample(600 * 1024)
+    parts = [data[:1000], data[1000:500000], b'', data[500000:]]
+    compressed = b''.join(bz2.compress(p, 1) for p in parts)
+    kwargs = {'workers': 2, 'read_size': 8 * 1024, 'max_segment_size': 32 * 1024}
+    assert _decompress(compressed, **kwargs) == data
+
+
+def test_read_false_stream_start(monkeypatch):
+    data = _sample(100000)
+    compressed = bz2.compress(data, 1)
+
+    # make the bytes in the middle of the stream look like a stream start
+    fake = re.escape(compressed[5000:5010])
+    monkeypatch.setattr(pbz2, '_STREAM_START', re.compile(b'BZh1|' + fake))
+
+    assert _decompress(compressed, workers=2, read_size=1024) == data
+
+
+def test_read_truncated():
+    compressed = bz2.compress(_sample(100000), 1)
+    with pytest.raises(EOFError):
+        _decompress(compressed[:-100], workers=2, read_size=1024)
+
+
+def test_read_invalid():
+    with pytest.raises(OSError):
+        _decompress(b'BZh9\x31\x41\x59\x26\x53\x59 not really bzip2')
+
+
+def test_read_trailing_data():
+    data = _sample(100000)
+    streams = bz2.compress(data[:50000], 1) + bz2.compress(data[50000:], 1)
+    fake_start = b'BZh9\x31\x41\x59\x26\x53\x59 not really bzip2'
+
+    # trailing data is ignored after a complete stream, as bz2 does
+    for trailing in [b'\0' * 1000, fake_start, fake_start + bz2.compress(b'x')]:
+        compressed = streams + trailing
+        assert bz2.BZ2File(io.BytesIO(compressed)).read() == data
+        assert _decompress(compressed, workers=2) == data
+        kwargs = {'read_size': 1024, 'max_segment_size': 2048}
+        assert _decompress(compressed, workers=2, **kwargs) == data
+
+    # but not before one
+    with pytest.raises(OSError):
+        _decompress(b'\0' * 1000 + streams)
+
+
+def test_closed():
+    writer = pbz2.ParallelBZ2Writer(Sink())
+    assert writer.writable()
+    writer.close()
+    writer.close()
+    with pytest.raises(ValueError):
+        writer.write(b'abc')
+
+    compressed = _compress(_sample(1024**2), compresslevel=1)
+    fd = io.BytesIO(compressed)
+    reader = pbz2.ParallelBZ2Reader(fd, workers=2, read_size=1024)
+    assert reader.read(10)
+    assert reader.pending
+    reader.close()
+    reader.close()
+    assert fd.closed
+    with pytest.raises(ValueError):
+        reader.read()
+
+
+def test_open_rtj_wtj():
+    path = 'tests/data/pbz2.txt.bz2'
+    config = omnio.default_config()
+    config["bz2"]["workers"] = 3
+    config["bz2"]["compresslevel"] = 1
+    lines = [f'line {i}\n' for i in range(100000)]
+    try:
+        with omnio.open(path, 'wtj', config=config) as fd:
+            fd.writelines(lines)
+        with open(path, 'rb') as fd:
+            assert fd.read().count(b'BZh1') > 1
+        with omnio.open(path, 'rtj', config=config) as fd:
+            assert list(fd) == lines
+    finally:
+        os.remove(path)
+
+
+def test_open_rbj():
+    config = omnio.default_config()
+    config["bz2"]["workers"] = 2
+    with omnio.open('tests/data/flights-3m.csv.bz2', 'rbj', config=config) as fd:
+        assert len(fd.read()) == 5535530
@@ -0,0 +1,95 @@
+import gzip
+import io
+import os
+import shutil
+import subprocess
+
+import pytest
+
+import omnio
+from omnio import pgzip
+
+
+class Sink(io.BytesIO):
+    def close(self):
+        self.result = self.getvalue()
+        super(Sink, self).close()
+
+
+def _compressible(size):
+    with open('tests/data/flights-3m.csv.gz', 'rb') as fd:
+        return gzip.decompress(fd.read())[:size]
+
+
+def _compress(data, writes=1, **kwargs):
+    sink = Sink()
+    with pgzip.ParallelGzipWriter(sink, **kwargs) as writer:
+        step = -(-len(data) // writes) or 1
+        for i in range(0, max(len(data), 1), step):
+            writer.write(data[i:][:step])
+    return sink.result
+
+
+def test_roundtrip():
+    data = _compressible(1024**2)
+    compressed = _compress(data, writes=7, workers=4, block_size=64 * 1024)
+    assert gzip.decompress(compressed) == data
+
+
+def test_ratio():
+    # priming each block with the previous one keeps compression close to
+    # that of a single stream
+    data = _compressible(1024**2)
+    compressed = _compress(data, workers=4, block_size=64 * 1024)
+    assert len(compressed) < len(gzip.compress(data)) * 1.02
+
+
+def test_incompressible():
+    data = os.urandom(300 * 1024)
+    compressed = _compress(data, writes=3, workers=2, block_size=32 * 1024)
+    assert gzip.decompress(compressed) == data
+
+
+def test_empty():
+    assert gzip.decompress(_compress(b'')) == b''
+
+
+def test_header():
+    for level, xfl in [(1, 4), (6, 0), (9, 2)]:
+        compressed = _compress(b'abc', compresslevel=level)
+        assert compressed[:4] == b'\x1f\x8b\x08\x00'
+        assert compressed[8:10] == bytes([xfl, 255])
+
+
+@pytest.mark.skipif(shutil.which('gzip') is None, reason='requires gzip')
+def test_gzip_command():
+    data = _compressible(512 * 1024)
+    compressed = _compress(data, workers=3, block_size=16 * 1024)
+    out = subprocess.run(['gzip', '-dc'], input=compressed, capture_output=True)
+    assert out.returncode == 0
+    assert out.stdout == data
+
+
+def test_closed():
+    writer = pgzip.ParallelGzipWriter(Sink())
+    assert writer.writable()
+    writer.close()
+    writer.close()
+
+    with pytest.raises(ValueError):
+        writer.write(b'abc')
+
+
+def test_open_wtz():
+    path = 'tests/data/pgzip.txt.gz'
+    config = omnio.default_config()
+    config["gzip"]["workers"] = 4
+    config["gzip"]["block_size"] = 1024
+    lines = [f'line {i}\n' for i in range(10000)]
+    try:
+        with omnio.open(path, 'wtz', config=config) as fd:
+            fd.writelines(lines)
+        with omnio.open(path, 'rtz') as fd:
+            assert list(fd) == lines
+    finally:
+        os.remove(path)
@@ -0,0 +1,220 @@
+import io
+import os
+import random
+import threading
+import time
+
+import pytest
+
+from omnio import ranged
+
+
+class Reader(ranged.RangeReader):
+    def __init__(self, data, block_size, cache_size):
+        super(Reader, self).__init__(len(data), block_size, cache_size)
+        self.data = data
+        self.fetches = []
+
+    def _fetch_range(self, start, stop):
+        self.fetches.append((start, stop))
+        return self.data[start:stop]
+
+
+def test_read():
+    data = os.urandom(1000)
+    with Reader(data, 64, 1024) as reader:
+        assert reader.readable()
+        assert reader.seekable()
+        assert reader.read(10) == data[:10]
+        assert reader.read(100) == data[10:110]
+        assert reader.tell() == 110
+        assert reader.readall() == data[110:]
+        assert reader.read(1) == b''
+
+
+def test_read_fetches_runs():
+    data = os.urandom(1000)
+    with Reader(data, 100, 1000) as reader:
+        reader.seek(250)
+        reader.read(10)
+        assert reader.fetches == [(200, 300)]
+
+        # blocks 0-1 and 3-5 are missing, block 2 is cached
+        reader.seek(0)
+        assert reader.read(600) == data[:600]
+        assert reader.fetches == [(200, 300), (0, 200), (300, 600)]
+
+
+def test_block_cache():
+    data = os.urandom(1000)
+    with Reader(data, 100, 200) as reader:
+        reader.read(10)
+        reader.seek(0)
+        reader.read(10)
+        assert reader.fetches == [(0, 100)]
+
+        # runs are capped at the cache size and old blocks are evicted
+        reader.seek(0)
+        reader.read()
+        assert len(reader.blocks) == 2
+        assert reader.fetches[1:] == [
+            (100, 300),
+            (300, 500),
+            (500, 700),
+            (700, 900),
+            (900, 1000),
+        ]
+
+
+def test_seek():
+    data = os.urandom(1000)
+    with Reader(data, 64, 1024) as reader:
+        assert reader.seek(-10, io.SEEK_END) == 990
+        assert reader.read() == data[-10:]
+        assert reader.seek(-20, io.SEEK_CUR) == 980
+        assert reader.read(5) == data[980:985]
+        assert reader.seek(2000) == 2000
+        assert reader.read() == b''
+
+        with pytest.raises(ValueError):
+            reader.seek(-1)
+        with pytest.raises(ValueError):
+            reader.seek(0, 3)
+
+
+def test_readinto():
+    data = os.urandom(1000)
+    with Reader(data, 64, 1024) as reader:
+        buf = bytearray(600)
+        assert reader.readinto(buf) == 600
+        assert buf == data[:600]
+        assert reader.readinto(buf) == 400
+        assert buf[:400] == data[600:]
+
+
+def test_empty():
+    with Reader(b'', 64, 1024) as reader:
+        assert reader.read() == b''
+        assert reader.fetches == []
+
+
+def test_closed():
+    f = Reader(b'abc', 64, 1024)
+    f.close()
+    f.close()
+
+    with pytest.raises(ValueError):
+        f.read()
+    with pytest.raises(ValueError):
+        f.readinto(bytearray(1))
+    with pytest.raises(ValueError):
+        f.seek(0)
+    with pytest.raises(ValueError):
+        f.tell()
+
+
+class ParallelReader(ranged.ParallelRangeReader):
+    def __init__(self, data, range_size, concurrency, max_buffer):
+        super(ParallelReader, self).__init__(
+            len(data), range_size, concurrency, max_buffer
+        )
+        self.data = data
+        self.lock = threading.Lock()
+        self.fetches = []
+
+    def _fetch_range(self, start, stop):
+        # finish out of order
+        time.sleep(random.random() / 1000)
+        with self.lock:
+            self.fetches.append((start, stop))
+        return self.data[start:stop]
+
+
+def test_parallel_read():
+    data = os.urandom(10000)
+    with ParallelReader(data, 100, 4, 800) as reader:
+        assert reader.readable()
+        assert not reader.seekable()
+        assert reader.read(10) == data[:10]
+
+        # no more than max_buffer bytes are fetched ahead of the reader
+        assert len(reader.pending) <= 8
+        assert reader.next_start <= 1000
+
+        assert reader.read(1234) == data[10:1244]
+        assert reader.tell() == 1244
+        assert reader.readall() == data[1244:]
+        assert reader.read(1) == b''
+
+    assert sorted(reader.fetches) == [(i, i + 100) for i in range(0, 10000, 100)]
+
+
+def test_parallel_readinto():
+    data = os.urandom(1000)
+    with ParallelReader(data, 64, 2, 256) as reader:
+        buf = bytearray(600)
+        assert reader.readinto(buf) == 600
+        assert buf == data[:600]
+        assert reader.readinto(buf) == 400
+        assert buf[:400] == data[600:]
+
+
+def test_parallel_closed():
+    f = ParallelReader(os.urandom(1000), 10, 2, 100)
+    f.read(1)
+    f.close()
+    f.close()
+    assert not f.pending
+
+    with pytest.raises(ValueError):
+        f.read()
+    with pytest.raises(ValueError):
+        f.readinto(bytearray(1))
+    with pytest.raises(ValueError):
+        f.tell()
+
+
+def test_blocks_own_their_memory():
+    data = os.urandom(1000)
+    with Reader(data, 100, 400) as reader:
+        reader.read(400)
+        blocks = [reader.blocks.lookup(index, None) for index in range(4)]
+
+        # cached blocks of a run don't share the run's buffer, so evicting
+        # the others frees it
+        assert all(len(memoryview(block).obj) == 100 for block in blocks)
+
+
+def test_readline():
+    lines = [b'a' * 150 + b'\n', b'\n', b'b' * 30 + b'\n', b'c' * 250]
+    data = b''.join(lines)
+    with Reader(data, 100, 1000) as reader:
+        assert list(reader) == lines
+        assert reader.readline() == b''
+
+        reader.seek(10)
+        assert reader.readline(50) == data[10:60]
+        assert reader.readline(-1) == data[60:151]
+        # every block was fetched once, with no byte-sized requests
+        assert reader.fetches == [(i, min(i + 100, 433)) for i in range(0, 433, 100)]
+
+
+def test_peek():
+    data = os.urandom(250)
+    with Reader(data, 100, 1000) as reader:
+        reader.seek(30)
+        assert reader.peek() == data[30:100]
+        assert reader.tell() == 30
+        reader.seek(250)
+        assert reader.peek() == b''
+
+
+def test_short_fetch():
+    class Short(Reader):
+        def _fetch_range(self, start, stop):
+            return super(Short, self)._fetch_range(start, stop)[:-1]
+
+    with Short(os.urandom(250), 100, 1000) as reader:
+        with pytest.raises(OSError):
+            reader.read()
+        assert len(reader.blocks) == 0
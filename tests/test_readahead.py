@@ -0,0 +1,108 @@
+import io
+import os
+import threading
+
+import pytest
+
+import omnio
+from omnio import readahead
+
+
+def test_read():
+    data = os.urandom(10000)
+    with readahead.ReadAheadReader(io.BytesIO(data), 4, 1000) as reader:
+        assert reader.readable()
+        assert not reader.seekable()
+        assert reader.read(10) == data[:10]
+        assert reader.read(2500) == data[10:2510]
+        assert reader.readall() == data[2510:]
+        assert reader.read(None) == b''
+
+
+def test_readinto():
+    data = os.urandom(1000)
+    with readahead.ReadAheadReader(io.BytesIO(data), 2, 64) as reader:
+        buf = bytearray(600)
+        assert reader.readinto(buf) == 600
+        assert buf == data[:600]
+        assert reader.readinto(buf) == 400
+        assert buf[:400] == data[600:]
+        assert reader.readinto(buf) == 0
+
+
+def test_stalls():
+    gate = threading.Event()
+
+    class Slow(io.BytesIO):
+        def read(self, size):
+            gate.wait()
+            return super(Slow, self).read(size)
+
+    omnio.metrics.reset()
+    with readahead.ReadAheadReader(Slow(b'abc'), 2, 1) as reader:
+        threading.Timer(0.05, gate.set).start()
+        assert reader.read(1) == b'a'
+        assert reader.stalls == 1
+        assert reader.read() == b'bc'
+
+    snapshot = omnio.metrics.snapshot()['readahead']
+    assert snapshot['stalls'] == reader.stalls
+    assert snapshot['stall_seconds']['count'] == reader.stalls
+    assert snapshot['stall_seconds']['sum'] >= 0.04
+    assert snapshot['buffers_read'] == 3
+
+
+def test_depth():
+    data = os.urandom(1000)
+    reader = readahead.ReadAheadReader(io.BytesIO(data), 3, 10)
+    for _ in range(100):
+        if reader.queued == 3:
+            break
+        threading.Event().wait(0.01)
+    assert reader.queued == 3
+
+    omnio.metrics.reset()
+    assert reader.read(10) == data[:10]
+    snapshot = omnio.metrics.snapshot()['readahead']
+    # the mean queue depth is buffers_queued / buffers_read
+    assert snapshot['buffers_read'] == 1
+    assert snapshot['buffers_queued'] == 3
+
+    # the background thread waits for room in the full queue until closed
+    threading.Event().wait(0.15)
+    reader.close()
+
+
+def test_error():
+    class Broken(io.BytesIO):
+        def read(self, size):
+            raise TimeoutError('too slow')
+
+    with readahead.ReadAheadReader(Broken(), 2, 10) as reader:
+        with pytest.raises(TimeoutError):
+            reader.read()
+        assert reader.read() == b''
+
+
+def test_close():
+    fd = io.BytesIO(os.urandom(1000))
+    reader = readahead.ReadAheadReader(fd, 1, 10)
+    reader.read(1)
+    reader.close()
+    reader.close()
+
+    assert not reader.thread.is_alive()
+    assert fd.closed
+    with pytest.raises(ValueError):
+        reader.read()
+    with pytest.raises(ValueError):
+        reader.readinto(bytearray(1))
+
+
+def test_open_rtz():
+    config = omnio.default_config()
+    config["readahead"]["depth"] = 4
+    config["readahead"]["buffer_size"] = 64 * 1024
+
+    with omnio.open('tests/data/flights-3m.csv.gz', 'rtz', config=config) as fd:
+        assert sum(1 for _ in fd) == 231084
@@ -0,0 +1,45 @@
+import pytest
+
+from omnio import metrics, retry
+
+
+def test_backoff(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr('time.sleep', sleeps.append)
+    for attempt in range(4):
+        retry.backoff(attempt, 0.5)
+
+    for attempt, seconds in enumerate(sleeps):
+        assert 0.25 * 2**attempt <= seconds <= 0.5 * 2**attempt
+
+
+def test_call():
+    counter = metrics.Counter()
+    failures = [ValueError('one'), ValueError('two')]
+
+    def func():
+        if failures:
+            raise failures.pop()
+        return 'done'
+
+    assert retry.call(func, ValueError, 2, 0, counter) == 'done'
+    assert counter.value == 2
+
+
+def test_call_exhausted():
+    counter = metrics.Counter()
+    calls = []
+
+    def func():
+        calls.append(1)
+        raise ValueError('always')
+
+    with pytest.raises(ValueError):
+        retry.call(func, ValueError, 2, 0, counter)
+    assert len(calls) == 3
+    assert counter.value == 2
+
+    # other errors are never retried
+    with pytest.raises(KeyError):
+        retry.call(lambda: {}['key'], ValueError, 2, 0, counter)
+    assert counter.value == 2
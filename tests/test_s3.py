@@ -1,7 +1,11 @@
+import concurrent.futures
+import gzip
 import io
 import os
+import types
 
 import botocore.exceptions
+import botocore.hooks
 import botocore.response
 import botocore.stub
 import boto3
@@ -11,6 +15,16 @@ import pytest
 import omnio
 
 
+@pytest.fixture(autouse=True)
+def clear_client_cache():
+    # moto patches credentials per test, so clients must not leak across tests
+    omnio.s3.clear_client_cache()
+    omnio.s3.invalidate_list_cache()
+    yield
+    omnio.s3.clear_client_cache()
+    omnio.s3.invalidate_list_cache()
+
+
 def test_read_binary():
     data = os.urandom(1000)
     stream = io.BytesIO(data)
@@ -40,7 +54,9 @@ def test_read_timeout_error():
 def test_read_connection_error(monkeypatch):
     class Client:
         def __init__(self, *args, **kwargs):
-            pass
+            self.meta = types.SimpleNamespace(
+                events=botocore.hooks.HierarchicalEmitter()
+            )
 
         def get_object(self, Bucket=None, Key=None):
             raise botocore.exceptions.EndpointConnectionError(endpoint_url="test/")
@@ -52,6 +68,37 @@ def test_read_connection_error(monkeypatch):
             pass
 
 
+def test_client_cache():
+    config = omnio.default_config()
+    s3 = omnio.s3._client(config)
+    assert omnio.s3._client(omnio.default_config()) is s3
+
+    config["s3"]["boto_client_config_kwargs"] = {"read_timeout": 600}
+    other = omnio.s3._client(config)
+    assert other is not s3
+    assert other.meta.config.read_timeout == 600
+
+
+def test_client_cache_clear(monkeypatch):
+    closed = []
+
+    class Client:
+        def __init__(self, *args, **kwargs):
+            self.meta = types.SimpleNamespace(
+                events=botocore.hooks.HierarchicalEmitter()
+            )
+
+        def close(self):
+            closed.append(self)
+
+    monkeypatch.setattr("boto3.client", Client)
+
+    s3 = omnio.s3._client(omnio.default_config())
+    omnio.s3.clear_client_cache()
+    assert closed == [s3]
+    assert omnio.s3._client(omnio.default_config()) is not s3
+
+
 def test_iter():
     data = b'one\ntwo\nthree four'
     stream = io.BytesIO(data)
@@ -217,3 +264,732 @@ def test_iglob_recursive():
         "eleven",
         "twelve",
     }
+
+
+@moto.mock_s3
+def test_iglob_delimited():
+    bucket = "mock-bucket"
+    s3 = boto3.resource('s3')
+    s3.create_bucket(Bucket=bucket)
+
+    keys = [
+        "logs/2020/a.gz",
+        "logs/2020/b.txt",
+        "logs/2020/deep/c.gz",
+        "logs/2021/d.gz",
+        "logs/old/e.gz",
+        "logs/f.gz",
+        "other/2020/g.gz",
+    ]
+    for key in keys:
+        s3.Object(bucket, key).put(Body=b"")
+
+    requests = []
+
+    def record(params, **kwargs):
+        requests.append((params['Prefix'], params.get('Delimiter')))
+
+    client = omnio.s3._client(omnio.default_config())
+    client.meta.events.register('provide-client-params.s3.ListObjectsV2', record)
+
+    uris = omnio.glob.glob(f"s3://{bucket}/logs/20*/*.gz")
+    assert uris == [f"s3://{bucket}/logs/2020/a.gz", f"s3://{bucket}/logs/2021/d.gz"]
+
+    # the literal directory is skipped, the wildcard one listed, and only
+    # the matching directories below it
+    assert requests == [
+        ("logs/20", "/"),
+        ("logs/2020/", "/"),
+        ("logs/2021/", "/"),
+    ]
+
+    assert omnio.glob.glob(f"s3://{bucket}/logs/*.gz") == [f"s3://{bucket}/logs/f.gz"]
+    assert omnio.glob.glob(f"s3://{bucket}/*/2020/[a-g].gz") == [
+        f"s3://{bucket}/logs/2020/a.gz",
+        f"s3://{bucket}/other/2020/g.gz",
+    ]
+    assert omnio.glob.glob(f"s3://{bucket}/logs/2020/deep/c.gz") == [
+        f"s3://{bucket}/logs/2020/deep/c.gz"
+    ]
+    assert omnio.glob.glob(f"s3://{bucket}/logs/2020/deep/c") == []
+
+
+@moto.mock_s3
+def test_iglob_info():
+    bucket = "mock-bucket"
+    s3 = boto3.resource('s3')
+    s3.create_bucket(Bucket=bucket)
+    s3.Object(bucket, "one.txt").put(Body=b"one")
+    s3.Object(bucket, "dir/two.txt").put(Body=b"two!")
+
+    operations = []
+    client = omnio.s3._client(omnio.default_config())
+    client.meta.events.register(
+        'provide-client-params.s3.*',
+        lambda model, **kwargs: operations.append(model.name),
+    )
+
+    for recursive in [False, True]:
+        entries = list(
+            omnio.glob.iglob_info(f"s3://{bucket}/*.txt", recursive=recursive)
+        )
+        assert [e.uri for e in entries] == omnio.glob.glob(
+            f"s3://{bucket}/*.txt", recursive=recursive
+        )
+
+    entries = list(omnio.glob.iglob_info(f"s3://{bucket}/*/*.txt"))
+    assert len(entries) == 1
+    entry = entries[0]
+    head = client.head_object(Bucket=bucket, Key="dir/two.txt")
+    assert entry.uri == f"s3://{bucket}/dir/two.txt"
+    assert entry.size == 4
+    assert entry.mtime == head['LastModified'].timestamp()
+    assert entry.etag == head['ETag']
+
+    # the metadata came from the listings alone
+    assert set(operations) == {'ListObjectsV2', 'HeadObject'}
+    assert operations.count('HeadObject') == 1
+
+
+@moto.mock_s3
+def test_iglob_list_cache(monkeypatch):
+    bucket = "mock-bucket"
+    s3 = boto3.resource('s3')
+    s3.create_bucket(Bucket=bucket)
+    s3.Object(bucket, "logs/one.gz").put(Body=b"")
+    s3.Object(bucket, "logs/two.txt").put(Body=b"")
+
+    config = omnio.default_config()
+    config["s3"]["list_cache_ttl"] = 60
+
+    listings = []
+    client = omnio.s3._client(config)
+    client.meta.events.register(
+        'provide-client-params.s3.ListObjectsV2',
+        lambda params, **kwargs: listings.append(params['Prefix']),
+    )
+
+    def glob(pattern, recursive=False):
+        uri = f"s3://{bucket}/{pattern}"
+        return omnio.glob.glob(uri, recursive=recursive, config=config)
+
+    assert glob("logs/*.gz") == [f"s3://{bucket}/logs/one.gz"]
+    assert glob("logs/*.gz") == [f"s3://{bucket}/logs/one.gz"]
+    assert glob("logs/*.gz", recursive=True) == [f"s3://{bucket}/logs/one.gz"]
+    assert glob("logs/*.gz", recursive=True) == [f"s3://{bucket}/logs/one.gz"]
+    assert listings == ["logs/", "logs/"]  # delimited, then not
+
+    # writing a key drops the listings it would appear in
+    with omnio.open(f"s3://{bucket}/logs/three.gz", "wb", config=config) as fd:
+        fd.write(b"")
+    assert len(glob("logs/*.gz")) == 2
+    assert len(listings) == 3
+
+    # as does explicit invalidation
+    omnio.s3.invalidate_list_cache(f"s3://{bucket}/logs/")
+    assert len(glob("logs/*.gz")) == 2
+    assert len(listings) == 4
+    omnio.s3.invalidate_list_cache(f"s3://{bucket}/other/")
+    glob("logs/*.gz")
+    assert len(listings) == 4
+
+    # and the time to live running out
+    now = omnio.cache.time.monotonic() + 61
+    monkeypatch.setattr(omnio.cache.time, "monotonic", lambda: now)
+    glob("logs/*.gz")
+    assert len(listings) == 5
+
+
+@moto.mock_s3
+def test_iglob_list_cache_write_during_listing():
+    bucket = "mock-bucket"
+    s3 = boto3.resource('s3')
+    s3.create_bucket(Bucket=bucket)
+
+    config = omnio.default_config()
+    config["s3"]["list_cache_ttl"] = 60
+
+    # a listing which overlaps an invalidation may be stale, so it isn't kept
+    client = omnio.s3._client(config)
+    client.meta.events.register(
+        'provide-client-params.s3.ListObjectsV2',
+        lambda **kwargs: omnio.s3.invalidate_list_cache(),
+    )
+    omnio.glob.glob(f"s3://{bucket}/*", config=config)
+    assert len(omnio.s3._listings) == 0
+
+
+@moto.mock_s3
+def test_open_disk_cache(tmp_path):
+    bucket = "mock-bucket"
+    s3 = boto3.resource('s3')
+    s3.create_bucket(Bucket=bucket)
+    s3.Object(bucket, "reference.txt").put(Body=b"version one")
+
+    config = omnio.default_config()
+    config["disk_cache"]["directory"] = str(tmp_path)
+
+    calls = []
+    client = omnio.s3._client(config)
+    client.meta.events.register(
+        'provide-client-params.s3.GetObject',
+        lambda params, **kwargs: calls.append(params.get('IfNoneMatch')),
+    )
+
+    uri = f"s3://{bucket}/reference.txt"
+    for _ in range(2):
+        with omnio.open(uri, "rb", config=config) as fd:
+            assert isinstance(fd, io.BufferedReader)
+            assert fd.read() == b"version one"
+
+    s3.Object(bucket, "reference.txt").put(Body=b"version two")
+    with omnio.open(uri, "rb", config=config) as fd:
+        assert fd.read() == b"version two"
+
+    etag = client.head_object(Bucket=bucket, Key="reference.txt")['ETag']
+    assert calls[0] is None
+    assert calls[1] == calls[2] != etag
+
+    with pytest.raises(FileNotFoundError):
+        omnio.open(f"s3://{bucket}/missing.txt", "rb", config=config)
+    with pytest.raises(botocore.exceptions.ClientError):
+        omnio.open("s3://missing-bucket/reference.txt", "rb", config=config)
+
+
+@moto.mock_s3
+def test_copy():
+    bucket = "mock-bucket"
+    s3 = boto3.resource('s3')
+    s3.create_bucket(Bucket=bucket)
+    data = os.urandom(1024)
+    s3.Object(bucket, "src").put(Body=data)
+
+    omnio.copy(f"s3://{bucket}/src", f"s3://{bucket}/dst")
+    assert s3.Object(bucket, "dst").get()['Body'].read() == data
+
+    with pytest.raises(FileNotFoundError):
+        omnio.copy(f"s3://{bucket}/missing", f"s3://{bucket}/dst")
+
+
+@moto.mock_s3
+def test_copy_multipart():
+    bucket = "mock-bucket"
+    s3 = boto3.resource('s3')
+    s3.create_bucket(Bucket=bucket)
+    data = os.urandom(11 * 1024**2)
+    s3.Object(bucket, "src").put(
+        Body=data, ContentType="text/csv", Metadata={"origin": "test"}
+    )
+
+    config = omnio.default_config()
+    config["s3"]["copy_part_size"] = 5 * 1024**2
+
+    copies = []
+    client = omnio.s3._client(config)
+    client.meta.events.register(
+        'provide-client-params.s3.UploadPartCopy',
+        lambda params, **kwargs: copies.append(params['CopySourceRange']),
+    )
+
+    omnio.copy(f"s3://{bucket}/src", f"s3://{bucket}/dst", config=config)
+
+    dst = s3.Object(bucket, "dst")
+    assert dst.get()['Body'].read() == data
+    assert dst.content_type == "text/csv"
+    assert dst.metadata == {"origin": "test"}
+    assert sorted(copies) == [
+        "bytes=0-5242879",
+        "bytes=10485760-11534335",
+        "bytes=5242880-10485759",
+    ]
+
+
+@moto.mock_s3
+def test_copy_multipart_error():
+    bucket = "mock-bucket"
+    s3 = boto3.resource('s3')
+    s3.create_bucket(Bucket=bucket)
+    s3.Object(bucket, "src").put(Body=b"x" * (6 * 1024**2))
+
+    config = omnio.default_config()
+    config["s3"]["copy_part_size"] = 5 * 1024**2
+
+    def fail(**kwargs):
+        raise ConnectionError
+
+    client = omnio.s3._client(config)
+    client.meta.events.register('before-call.s3.UploadPartCopy', fail)
+
+    with pytest.raises(ConnectionError):
+        omnio.copy(f"s3://{bucket}/src", f"s3://{bucket}/dst", config=config)
+
+    # the upload was aborted
+    assert 'Uploads' not in client.list_multipart_uploads(Bucket=bucket)
+
+
+@moto.mock_s3
+def test_copy_to_local(tmp_path):
+    bucket = "mock-bucket"
+    s3 = boto3.resource('s3')
+    s3.create_bucket(Bucket=bucket)
+    data = os.urandom(1024)
+    s3.Object(bucket, "src").put(Body=data)
+
+    # the s3 reader has no readinto, so this copies with read
+    omnio.copy(f"s3://{bucket}/src", str(tmp_path / "dst"))
+    assert (tmp_path / "dst").read_bytes() == data
+
+
+@moto.mock_s3
+def test_open_seekable():
+    bucket = "mock-bucket"
+    s3 = boto3.resource('s3')
+    s3.create_bucket(Bucket=bucket)
+    data = os.urandom(10000)
+    s3.Object(bucket, "key").put(Body=data)
+
+    config = omnio.default_config()
+    config["s3"]["seekable"] = True
+    config["s3"]["block_size"] = 1024
+    config["s3"]["block_cache_size"] = 4096
+
+    with omnio.open(f"s3://{bucket}/key", "rb", config=config) as reader:
+        assert isinstance(reader, omnio.s3.S3RangeReader)
+        assert reader.seekable()
+        assert reader.seek(-100, io.SEEK_END) == 9900
+        assert reader.read() == data[-100:]
+        reader.seek(1000)
+        assert reader.read(2000) == data[1000:3000]
+        assert reader.tell() == 3000
+        reader.seek(0)
+        assert reader.read() == data
+
+
+@moto.mock_s3
+def test_open_seekable_missing():
+    s3 = boto3.resource('s3')
+    s3.create_bucket(Bucket="mock-bucket")
+
+    config = omnio.default_config()
+    config["s3"]["seekable"] = True
+
+    with pytest.raises(FileNotFoundError):
+        omnio.open("s3://mock-bucket/missing", "rb", config=config)
+
+
+@moto.mock_s3
+def test_open_seekable_rtz():
+    bucket = "mock-bucket"
+    s3 = boto3.resource('s3')
+    s3.create_bucket(Bucket=bucket)
+    with open("tests/data/one.txt.gz", "rb") as fd:
+        s3.Object(bucket, "one.txt.gz").put(Body=fd.read())
+
+    config = omnio.default_config()
+    config["s3"]["seekable"] = True
+
+    with omnio.open(f"s3://{bucket}/one.txt.gz", "rtz", config=config) as fd:
+        assert fd.read().split() == ["one", "two", "three"]
+
+
+@moto.mock_s3
+def test_open_no_such_bucket():
+    with pytest.raises(botocore.exceptions.ClientError):
+        omnio.open("s3://missing-bucket/key", "rb")
+
+
+def test_range_read_timeout_error():
+    class Body:
+        def read(self):
+            raise botocore.exceptions.ReadTimeoutError(endpoint_url="test/")
+
+    class Client:
+        def get_object(self, **kwargs):
+            assert kwargs['Range'] == 'bytes=0-9'
+            assert kwargs['IfMatch'] == '"etag"'
+            return {'Body': Body()}
+
+    reader = omnio.s3.S3RangeReader(Client(), 'bucket', 'key', 10, '"etag"', 64, 64)
+    with reader:
+        with pytest.raises(TimeoutError):
+            reader.read()
+
+
+@moto.mock_s3
+def test_write_multipart():
+    bucket = "mock-bucket"
+    s3 = boto3.resource('s3')
+    s3.create_bucket(Bucket=bucket)
+    data = os.urandom(12 * 1024**2)
+
+    config = omnio.default_config()
+    config["s3"]["upload_concurrency"] = 3
+    config["s3"]["max_inflight_parts"] = 2
+
+    with omnio.open(f"s3://{bucket}/key", "wb", config=config) as writer:
+        # write in pieces smaller and larger than a part
+        writer.write(data[:1024])
+        writer.write(data[1024:])
+        assert len(writer.parts) == 2
+
+    assert [part.result()['PartNumber'] for part in writer.parts] == [1, 2, 3]
+    assert s3.Object(bucket, "key").get()['Body'].read() == data
+
+
+class MultipartClient:
+    def __init__(self, fail_part=None):
+        self.fail_part = fail_part
+        self.calls = []
+
+    def create_multipart_upload(self, **kwargs):
+        self.calls.append('create')
+        return {'UploadId': 'upload-id'}
+
+    def upload_part(self, **kwargs):
+        if kwargs['PartNumber'] == self.fail_part:
+            raise botocore.exceptions.EndpointConnectionError(endpoint_url="test/")
+        return {'ETag': str(kwargs['PartNumber'])}
+
+    def complete_multipart_upload(self, **kwargs):
+        self.calls.append(('complete', kwargs['MultipartUpload']))
+
+    def abort_multipart_upload(self, **kwargs):
+        self.calls.append('abort')
+
+
+def test_write_multipart_complete():
+    s3 = MultipartClient()
+    with omnio.s3.S3Writer(s3, 'bucket', 'key', 4, 2, 2) as writer:
+        writer.write(b'0123456789')
+
+    parts = [{'PartNumber': 1, 'ETag': '1'}, {'PartNumber': 2, 'ETag': '2'}]
+    parts.append({'PartNumber': 3, 'ETag': '3'})
+    assert s3.calls == ['create', ('complete', {'Parts': parts})]
+
+
+def test_write_multipart_error_on_close():
+    s3 = MultipartClient(fail_part=3)
+    with pytest.raises(botocore.exceptions.EndpointConnectionError):
+        with omnio.s3.S3Writer(s3, 'bucket', 'key', 4, 2, 2) as writer:
+            writer.write(b'0123456789')
+
+    assert s3.calls == ['create', 'abort']
+
+
+def test_write_multipart_error_on_write():
+    s3 = MultipartClient(fail_part=1)
+    writer = omnio.s3.S3Writer(s3, 'bucket', 'key', 4, 1, 1)
+    writer.write(b'0123456789')
+    concurrent.futures.wait(writer.parts)
+
+    with pytest.raises(botocore.exceptions.EndpointConnectionError):
+        writer.write(b'more')
+
+    assert writer.closed
+    assert s3.calls == ['create', 'abort']
+
+    # closing again is a no-op
+    writer.close()
+    assert s3.calls == ['create', 'abort']
+
+
+@moto.mock_s3
+def test_open_parallel():
+    bucket = "mock-bucket"
+    s3 = boto3.resource('s3')
+    s3.create_bucket(Bucket=bucket)
+    data = os.urandom(100000)
+    s3.Object(bucket, "key").put(Body=data)
+
+    config = omnio.default_config()
+    config["s3"]["download_concurrency"] = 4
+    config["s3"]["download_range_size"] = 4096
+    config["s3"]["download_max_buffer"] = 16384
+
+    with omnio.open(f"s3://{bucket}/key", "rb", config=config) as reader:
+        assert isinstance(reader, omnio.s3.S3ParallelReader)
+        assert reader.read(10) == data[:10]
+        assert reader.read() == data[10:]
+
+
+@moto.mock_s3
+def test_open_parallel_rtz():
+    bucket = "mock-bucket"
+    s3 = boto3.resource('s3')
+    s3.create_bucket(Bucket=bucket)
+    with open("tests/data/flights-3m.csv.gz", "rb") as fd:
+        s3.Object(bucket, "flights.csv.gz").put(Body=fd.read())
+
+    config = omnio.default_config()
+    config["s3"]["download_concurrency"] = 4
+    config["s3"]["download_range_size"] = 256 * 1024
+
+    uri = f"s3://{bucket}/flights.csv.gz"
+    with omnio.open(uri, "rtz", config=config) as fd:
+        assert sum(1 for _ in fd) == 231084
+
+
+@moto.mock_s3
+def test_metrics():
+    bucket = "mock-bucket"
+    boto3.resource('s3').create_bucket(Bucket=bucket)
+    data = os.urandom(12 * 1024**2)
+    omnio.metrics.reset()
+
+    with omnio.open(f"s3://{bucket}/key", "wb") as writer:
+        writer.write(data)
+
+    config = omnio.default_config()
+    config["s3"]["seekable"] = False
+    with omnio.open(f"s3://{bucket}/key", "rb", config=config) as reader:
+        assert reader.read() == data
+
+    snapshot = omnio.metrics.snapshot()['s3']
+    assert snapshot['bytes_written'] == len(data)
+    assert snapshot['bytes_read'] == len(data)
+    assert snapshot['parts_uploaded'] == len(writer.parts)
+    assert snapshot['part_upload_seconds']['count'] == len(writer.parts)
+    # create, parts, complete and get
+    assert snapshot['requests'] == len(writer.parts) + 3
+    assert snapshot['request_seconds']['count'] == snapshot['requests']
+    assert snapshot['retries'] == 0
+    assert snapshot['first_byte_seconds']['count'] == 1
+
+
+@moto.mock_s3
+def test_metrics_failed_request():
+    omnio.metrics.reset()
+    s3 = omnio.s3._client(omnio.default_config())
+
+    def fail(request, **kwargs):
+        raise botocore.exceptions.EndpointConnectionError(endpoint_url="test/")
+
+    s3.meta.events.register('before-sign.s3', fail)
+    with pytest.raises(botocore.exceptions.EndpointConnectionError):
+        s3.head_object(Bucket='bucket', Key='key')
+
+    assert omnio.metrics.snapshot()['s3']['requests'] == 1
+
+
+class FlakyStream:
+    """Stream which fails with `error` on the read which passes `fail_at` bytes"""
+
+    def __init__(self, stream, fail_at, error):
+        self.stream = stream
+        self.fail_at = fail_at
+        self.error = error
+        self.position = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.position += len(data)
+        if self.position > self.fail_at:
+            raise self.error
+        return data
+
+    def close(self):
+        self.stream.close()
+
+
+@moto.mock_s3
+def test_read_resume():
+    bucket = "mock-bucket"
+    s3 = boto3.resource('s3')
+    s3.create_bucket(Bucket=bucket)
+    data = os.urandom(100000)
+    s3.Object(bucket, "key.gz").put(Body=gzip.compress(data))
+
+    config = omnio.default_config()
+    config["s3"]["read_retry_backoff"] = 0
+    omnio.metrics.reset()
+
+    with omnio.open(f"s3://{bucket}/key.gz", "rb", config=config) as reader:
+        error = botocore.exceptions.ReadTimeoutError(endpoint_url="test/")
+        reader.stream = FlakyStream(reader.stream, 50000, error)
+
+        # the decompressor above never sees the failure
+        with gzip.GzipFile(fileobj=reader) as fd:
+            assert fd.read(1000) == data[:1000]
+            assert fd.read() == data[1000:]
+
+    assert omnio.metrics.snapshot()['s3']['retries'] == 1
+
+
+def test_read_resume_exhausted():
+    data = b'0123456789' * 10
+    error = botocore.exceptions.ReadTimeoutError(endpoint_url="test/")
+    offsets = []
+
+    def resume(offset):
+        offsets.append(offset)
+        return FlakyStream(io.BytesIO(data[offset:]), 10, error)
+
+    stream = FlakyStream(io.BytesIO(data), 30, error)
+    with omnio.s3.S3Reader(stream, resume=resume, retries=2) as reader:
+        assert reader.read(20) == data[:20]
+        assert reader.read(5) == data[20:25]
+        assert reader.read(10) == data[25:35]
+        # every read may be retried `retries` times
+        with pytest.raises(TimeoutError):
+            reader.read()
+
+    assert offsets == [25, 35, 35]
+
+
+def test_read_resume_error():
+    data = b'0123456789' * 10
+    error = botocore.exceptions.ReadTimeoutError(endpoint_url="test/")
+    offsets = []
+
+    def resume(offset):
+        offsets.append(offset)
+        if len(offsets) == 1:
+            raise error
+        return io.BytesIO(data[offset:])
+
+    # a failed request for the rest is retried too
+    stream = FlakyStream(io.BytesIO(data), 30, error)
+    with omnio.s3.S3Reader(stream, resume=resume, retries=2) as reader:
+        assert reader.read(20) == data[:20]
+        assert reader.read() == data[20:]
+    assert offsets == [20, 20]
+
+    # from the same budget
+    offsets.clear()
+    stream = FlakyStream(io.BytesIO(data), 30, error)
+    with omnio.s3.S3Reader(stream, resume=resume, retries=1) as reader:
+        assert reader.read(20) == data[:20]
+        with pytest.raises(TimeoutError):
+            reader.read()
+    assert offsets == [20]
+
+
+def test_read_error_without_resume():
+    error = botocore.exceptions.IncompleteReadError(actual_bytes=1, expected_bytes=2)
+    stream = FlakyStream(io.BytesIO(b'ab'), 0, error)
+    with omnio.s3.S3Reader(stream) as reader:
+        with pytest.raises(botocore.exceptions.IncompleteReadError):
+            reader.read()
+
+
+@moto.mock_s3
+def test_get_rest():
+    bucket = "mock-bucket"
+    s3 = boto3.resource('s3')
+    s3.create_bucket(Bucket=bucket)
+    etag = s3.Object(bucket, "key").put(Body=b'0123456789')['ETag']
+    client = omnio.s3._client(omnio.default_config())
+
+    stream = omnio.s3._get_rest(client, bucket, "key", etag, 10, 4)
+    assert stream.read() == b'456789'
+    assert omnio.s3._get_rest(client, bucket, "key", etag, 10, 10).read() == b''
+
+    # the rest of another version of the object is never returned
+    s3.Object(bucket, "key").put(Body=b'abcdefghij')
+    with pytest.raises(botocore.exceptions.ClientError) as e:
+        omnio.s3._get_rest(client, bucket, "key", etag, 10, 4)
+    assert e.value.response['Error']['Code'] == 'PreconditionFailed'
+
+
+class RangeClient:
+    """s3 client whose first `failures` range bodies time out"""
+
+    def __init__(self, data, failures):
+        self.data = data
+        self.failures = failures
+
+    def get_object(self, Bucket=None, Key=None, Range=None, IfMatch=None):
+        start, stop = map(int, Range.partition('=')[2].split('-'))
+        body = io.BytesIO(self.data[start:][: stop + 1 - start])
+        if self.failures:
+            self.failures -= 1
+            error = botocore.exceptions.ReadTimeoutError(endpoint_url="test/")
+            body = FlakyStream(body, 0, error)
+        return {'Body': body}
+
+
+def test_get_range_retry():
+    data = os.urandom(100)
+    s3 = RangeClient(data, failures=2)
+    assert omnio.s3._get_range(s3, 'bucket', 'key', '"1"', 10, 20, 2) == data[10:20]
+
+    s3 = RangeClient(data, failures=3)
+    with pytest.raises(TimeoutError):
+        omnio.s3._get_range(s3, 'bucket', 'key', '"1"', 10, 20, 2)
+
+
+@moto.mock_s3
+def test_open_parallel_small():
+    bucket = "mock-bucket"
+    s3 = boto3.resource('s3')
+    s3.create_bucket(Bucket=bucket)
+    s3.Object(bucket, "small").put(Body=b'0123456789')
+    s3.Object(bucket, "empty").put(Body=b'')
+
+    config = omnio.default_config()
+    config["s3"]["download_concurrency"] = 4
+    config["s3"]["download_range_size"] = 10
+
+    calls = []
+    client = omnio.s3._client(config)
+    client.meta.events.register(
+        'provide-client-params.s3',
+        lambda params, model, **kwargs: calls.append((model.name, params.get('Range'))),
+    )
+
+    # objects within one range are read from the response to its request
+    with omnio.open(f"s3://{bucket}/small", "rb", config=config) as reader:
+        assert isinstance(reader, omnio.s3.S3Reader)
+        assert reader.read() == b'0123456789'
+    assert calls == [('GetObject', 'bytes=0-9')]
+
+    del calls[:]
+    with omnio.open(f"s3://{bucket}/empty", "rb", config=config) as reader:
+        assert reader.read() == b''
+    assert calls == [('GetObject', 'bytes=0-9'), ('GetObject', None)]
+
+
+@moto.mock_s3
+def test_open_parallel_first_range():
+    bucket = "mock-bucket"
+    s3 = boto3.resource('s3')
+    s3.create_bucket(Bucket=bucket)
+    data = os.urandom(100)
+    s3.Object(bucket, "key").put(Body=data)
+
+    config = omnio.default_config()
+    config["s3"]["download_concurrency"] = 2
+    config["s3"]["download_range_size"] = 30
+
+    calls = []
+    client = omnio.s3._client(config)
+    client.meta.events.register(
+        'provide-client-params.s3',
+        lambda params, model, **kwargs: calls.append(params.get('Range')),
+    )
+
+    # the first range is read from the response which gave the size
+    with omnio.open(f"s3://{bucket}/key", "rb", config=config) as reader:
+        assert isinstance(reader, omnio.s3.S3ParallelReader)
+        assert reader.read() == data
+    assert sorted(calls) == ['bytes=0-29', 'bytes=30-59', 'bytes=60-89', 'bytes=90-99']
+
+    # and requested again if that response fails
+    omnio.metrics.reset()
+    error = botocore.exceptions.ReadTimeoutError(endpoint_url="test/")
+    with omnio.open(f"s3://{bucket}/key", "rb", config=config) as reader:
+        reader.first.close()
+        reader.first = FlakyStream(io.BytesIO(data[:30]), 0, error)
+        assert reader.read() == data
+    assert omnio.metrics.snapshot()['s3']['retries'] == 1
+
+    # an unread first range is closed with the reader
+    first = io.BytesIO(data[:30])
+    reader = omnio.s3.S3ParallelReader(client, bucket, "key", 100, '"1"', 30, 2, 30)
+    reader.first = first
+    reader.close()
+    reader.close()
+    assert first.closed
+
+    with pytest.raises(FileNotFoundError):
+        omnio.open(f"s3://{bucket}/missing", "rb", config=config)
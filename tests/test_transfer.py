@@ -0,0 +1,80 @@
+import errno
+import gzip
+import os
+import shutil
+
+import pytest
+import responses
+
+import omnio
+
+
+@pytest.fixture
+def src(tmp_path):
+    path = tmp_path / 'src.bin'
+    path.write_bytes(os.urandom(3 * 1024**2 + 7))
+    return path
+
+
+def test_copy_local(src, tmp_path):
+    dst = tmp_path / 'dst.bin'
+    assert omnio.copy(str(src), f'file://{dst}') == f'file://{dst}'
+    assert dst.read_bytes() == src.read_bytes()
+
+
+@pytest.mark.skipif(not hasattr(os, 'copy_file_range'), reason='linux only')
+@pytest.mark.parametrize('error', [errno.EXDEV, errno.ENOSYS])
+def test_copy_local_fallback(src, tmp_path, monkeypatch, error):
+    def copy_file_range(*args):
+        raise OSError(error, os.strerror(error))
+
+    monkeypatch.setattr(os, 'copy_file_range', copy_file_range)
+    dst = tmp_path / 'dst.bin'
+    omnio.copy(str(src), str(dst))
+    assert dst.read_bytes() == src.read_bytes()
+
+
+@pytest.mark.skipif(not hasattr(os, 'copy_file_range'), reason='linux only')
+def test_copy_local_error(src, tmp_path, monkeypatch):
+    def copy_file_range(*args):
+        raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+
+    monkeypatch.setattr(os, 'copy_file_range', copy_file_range)
+    with pytest.raises(OSError):
+        omnio.copy(str(src), str(tmp_path / 'dst.bin'))
+
+
+def test_copy_local_same_file(src):
+    with pytest.raises(shutil.SameFileError):
+        omnio.copy(str(src), str(src))
+    assert os.path.getsize(src) == 3 * 1024**2 + 7
+
+
+def test_copy_transcode(tmp_path):
+    src = tmp_path / 'src.gz'
+    dst = tmp_path / 'dst.bz2'
+    data = b'line\n' * 100000
+    src.write_bytes(gzip.compress(data))
+
+    config = omnio.default_config()
+    config['copy']['buffer_size'] = 4096
+    omnio.copy(
+        str(src),
+        str(dst),
+        config=config,
+        src_compression='gzip',
+        dst_compression='bz2',
+    )
+    with omnio.open(str(dst), 'rbj') as fd:
+        assert fd.read() == data
+
+
+@responses.activate
+def test_copy_stream(tmp_path):
+    uri = 'http://example.com/data.bin'
+    data = os.urandom(100000)
+    responses.add(responses.GET, uri, body=data, status=200)
+
+    dst = tmp_path / 'data.bin'
+    omnio.copy(uri, str(dst))
+    assert dst.read_bytes() == data